@@ -0,0 +1,84 @@
+"""Compare ``AsyncRepository.list`` + ``to_schema`` with ``AsyncRepository.list_as``.
+
+Usage::
+
+    python benchmarks/list_as.py --rows 20000 --rounds 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("FIMBU_SETTINGS_MODULE", "fimbu.conf.global_settings")
+
+import msgspec
+
+from fimbu.db import Database, Model, Registry, fields, to_schema
+from fimbu.db.repository import AsyncRepository
+
+
+database = Database(f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db")
+registry = Registry(database=database)
+
+
+class Article(Model):
+    title: str = fields.CharField(max_length=255)
+    body: str = fields.TextField()
+    views: int = fields.IntegerField()
+    published_at: datetime = fields.DateTimeField()
+
+    class Meta:
+        registry = registry
+
+
+class ArticleStruct(msgspec.Struct):
+    id: int
+    title: str
+    views: int
+    published_at: datetime
+
+
+async def _timeit(label: str, rounds: int, func) -> None:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await func()
+        timings.append(time.perf_counter() - start)
+    print(f"{label:<32} best {min(timings) * 1000:8.1f} ms   mean {sum(timings) / rounds * 1000:8.1f} ms")
+
+
+async def main(rows: int, rounds: int) -> None:
+    async with database:
+        await registry.create_all()
+        now = datetime.now()
+        await database.execute_many(
+            Article.table.insert(),
+            [{"id": i + 1, "title": f"title {i}", "body": "lorem " * 20, "views": i, "published_at": now} for i in range(rows)],
+        )
+        repository = AsyncRepository(Article)
+
+        async def model_path() -> None:
+            to_schema(await repository.list(), schema_type=ArticleStruct)
+
+        async def struct_path() -> None:
+            await repository.list_as(schema_type=ArticleStruct)
+
+        async def generated_struct_path() -> None:
+            await repository.list_as()
+
+        print(f"{rows} rows, {rounds} rounds")
+        await _timeit("list + to_schema", rounds, model_path)
+        await _timeit("list_as(schema_type=ArticleStruct)", rounds, struct_path)
+        await _timeit("list_as() generated struct", rounds, generated_struct_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.rounds))
@@ -0,0 +1,88 @@
+"""Compare building the user service per request with the app scoped one.
+
+Each request of a bare Litestar app resolves the user service through DI,
+either constructed from the auth configuration as ``provide_user_service``
+used to, or the instance built once by the ``AuthPlugin``.
+
+Usage::
+
+    python benchmarks/user_service_di.py --requests 2000 --rounds 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("FIMBU_SETTINGS_MODULE", "fimbu.conf.global_settings")
+
+from litestar import Litestar, get
+from litestar.datastructures import State
+from litestar.di import Provide
+from litestar.testing import AsyncTestClient
+
+from fimbu.contrib.auth.dependencies import provide_user_service
+from fimbu.contrib.auth.models import User
+from fimbu.contrib.auth.repository import UserRepository
+from fimbu.contrib.auth.service import UserService
+from fimbu.contrib.auth.utils import USER_SERVICE_STATE_KEY, build_user_service
+
+
+config = SimpleNamespace(
+    user_model=User,
+    user_repository_class=UserRepository,
+    user_service_class=UserService,
+    secret="s" * 32,
+    hash_schemes=["argon2"],
+)
+
+
+async def provide_per_request(state: State) -> UserService:
+    return build_user_service(state["auth_config"])
+
+
+@get("/", sync_to_thread=False)
+def handler(service: UserService) -> str:
+    return "ok"
+
+
+def create_app(provider: Provide) -> Litestar:
+    return Litestar(
+        route_handlers=[handler],
+        dependencies={"service": provider},
+        state=State({"auth_config": config, USER_SERVICE_STATE_KEY: build_user_service(config)}),
+        logging_config=None,
+    )
+
+
+async def _timeit(label: str, app: Litestar, requests: int, rounds: int) -> None:
+    timings = []
+    async with AsyncTestClient(app) as client:
+        await client.get("/")
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(requests):
+                await client.get("/")
+            timings.append((time.perf_counter() - start) / requests)
+    print(f"{label:<32} best {min(timings) * 1e6:8.1f} us   mean {sum(timings) / rounds * 1e6:8.1f} us   per request")
+
+
+async def main(requests: int, rounds: int) -> None:
+    print(f"{requests} requests, {rounds} rounds")
+    await _timeit("built per request", create_app(Provide(provide_per_request)), requests, rounds)
+    await _timeit(
+        "app scoped, use_cache",
+        create_app(Provide(provide_user_service, use_cache=True, sync_to_thread=False)),
+        requests,
+        rounds,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds))
@@ -41,8 +41,8 @@ from fimbu.middleware.builtins import (
 
 from .utils import get_template_config, get_static_file_config, get_middleware
 
-from fimbu.db import Migrate
-from fimbu.db import get_db_connection
+from fimbu.db import Migrate, Model
+from fimbu.db import get_db_connection, encode_model
 from fimbu.core.exceptions import FimbuException
 from edgy.exceptions import EdgyException
 
@@ -281,8 +281,8 @@ class Application:
         if cls.lifespan:
             app_config["lifespan"] = cls.lifespan
 
-        if cls.type_encoders:
-            app_config["type_encoders"] = cls.type_encoders
+        # a new map per app, encoders registered on one app do not leak into others
+        app_config["type_encoders"] = {Model: encode_model, **(cls.type_encoders or {})}
 
         if cls.type_decoders:
             app_config["type_decoders"] = cls.type_decoders
@@ -26,6 +26,7 @@ from edgy.cli.operations import (
 )
 
 from fimbu.db.utils import get_db_registry
+from fimbu.db.cli import database_group
 
 from .commands import start_app, start_project, shell, inspect_db
 
@@ -34,7 +35,7 @@ from fimbu.core.utils import setup_fimbu
 
 setup_fimbu() # setup fimbu cli
 
-from fimbu.cli._utils import FimbuExtensionGroup, FimbuGroup
+from fimbu.cli._utils import FimbuExtensionGroup, FimbuGroup, _wrap_commands
 from fimbu.cli.env import FimbuEnv
 from fimbu.conf import settings
 
@@ -116,3 +117,7 @@ fimbu_cli.add_command(stamp, name="stamp")
 fimbu_cli.add_command(check, name="check")
 fimbu_cli.add_command(shell, name="shell")
 fimbu_cli.add_command(inspect_db, name="inspectdb")
+# fimbu.db.cli cannot import FimbuGroup without importing this package back,
+# its commands are wrapped like the ones of the extensions
+_wrap_commands([database_group])
+fimbu_cli.add_command(database_group)
@@ -16,6 +16,7 @@ if TYPE_CHECKING:
 
 BASE_DIR: Path = Path.cwd()
 SECRET: str = 'fimbu_secret_key'
+SECRET_KEY_FALLBACKS: list[str] = []
 DEBUG: bool = True
 APP_NAME: str = "fimbu"
 LANGUAGE_CODE: str = 'en-us'
@@ -146,11 +147,15 @@ EMAIL_SUBJECT_PREFIX = "[Fimbu ] "
 
 #### -------------------------------------- AUTHENTICATION ---------------------------- ###########
 
-AUTH_BACKEND_CLASS = 'litestar.contrib.jwt.JWTCookieAuth'
+AUTH_BACKEND_CLASS = 'fimbu.contrib.auth.backends.jwt.JWTCookieAuth'
 SESSION_BACKEND_CONFIG = 'litestar.middleware.session.server_side.ServerSideSessionConfig'
 USER_MODEL = 'fimbu.contrib.auth.models.User'
 
 HASH_SCHEMES = ["argon2"]
+PASSWORD_HASHER_PROCESSES: int | None = None
+"""Processes hashing passwords, defaults to the number of cores, ``0`` hashes in threads."""
+PASSWORD_HASHER_MAX_QUEUE: int | None = None
+"""Password checks waiting for a worker before new ones get a ``429``, defaults to 4 per worker."""
 AUTH_GUARDS = []
 AUTH_CHECK_VERIFIED = True
 AUTH_TAGS = []
@@ -160,6 +165,36 @@ AUTH_EXCLUDE_PATHS = ['/schema',]
 USER_SERVICE_CLASS = 'fimbu.contrib.auth.service.UserService'
 USERS_REPOSITORY = 'fimbu.contrib.auth.adapters.repository.UserRepository'
 USER_DEFAULT_ROLE = "Application Access"
+AUTH_USER_CACHE_SIZE: int = 1024
+"""Users kept in the per process cache."""
+AUTH_USER_CACHE_TTL: int = 300
+"""Seconds a user stays cached in the ``auth_store``."""
+AUTH_USER_CACHE_LOCAL_TTL: float = 5.0
+"""Seconds a user stays cached in process, bounds staleness when an invalidation is missed."""
+AUTH_USER_CACHE_NEGATIVE_TTL: int = 30
+"""Seconds an unknown user ID stays cached."""
+AUTH_DEFAULT_SCOPES_TTL: float = 60.0
+"""Seconds the default permission scopes stay cached in process."""
+AUTH_EMBED_PERMISSIONS: bool = False
+"""Carry the user's permission bitmasks in the JWT ``perms`` claim.
+
+Guards then need no lookup at all, but permission changes only apply to
+tokens issued afterwards.
+"""
+AUTH_TOKEN_CACHE_SIZE: int = 4096
+"""Verified JWTs kept per process, their signature is not checked again until they expire."""
+
+AUTH_REVOCATION_SYNC_INTERVAL: float = 5.0
+"""Seconds between two syncs of the per process filter of revoked JWTs, a revocation applies to other workers within it."""
+
+AUTH_REVOCATION_CAPACITY: int = 10_000
+"""Revoked JWTs the filter is sized for, it grows beyond when needed."""
+
+AUTH_REVOCATION_ERROR_RATE: float = 0.001
+"""False positive rate of the revocation filter, each false positive costs a Redis lookup."""
+
+AUTH_REVOCATION_USER_TTL: int = 86_400
+"""Seconds the revocation of every token of a user lasts, at least the longest token lifetime."""
 
 # ----------------------------- SYSTEM HEALTH -----------------------------------------
 
@@ -246,6 +281,54 @@ REDIS_HEALTH_CHECK_INTERVAL: int = 5
 REDIS_SOCKET_KEEPALIVE: bool = True
 """Length of time to wait (in seconds) between keepalive commands."""
 
+# ----------------------------- WRITE BEHIND ----------------------------------
+
+WRITE_BEHIND_BACKEND: str = "memory"
+"""Where write-behind counters and touch fields are buffered, ``memory`` or ``redis``."""
+WRITE_BEHIND_FLUSH_INTERVAL: float = 5.0
+"""Maximum number of seconds a buffered write waits before being flushed."""
+WRITE_BEHIND_MAX_PENDING: int = 10_000
+"""Number of buffered writes that triggers an early flush."""
+
+# ----------------------------- INDEX ADVISOR ---------------------------------
+
+DB_ADVISOR_ENABLED: bool = False
+"""Record the filter shapes and latency of repository reads for ``fimbu db advise``."""
+DB_ADVISOR_FLUSH_INTERVAL: float = 30.0
+"""Seconds between two writes of the recorded filter shapes to the database."""
+
+# ----------------------------- DEADLINES -------------------------------------
+
+REQUEST_DEADLINE: float | None = None
+"""Default deadline of a request in seconds, enforced by ``fimbu.middleware.deadline.DeadlineMiddleware``.
+
+Routes override it with ``opt={"deadline": seconds}``."""
+REQUEST_DEADLINE_HEADER: str | None = "x-request-timeout"
+"""Header clients use to shorten the deadline, in seconds. ``None`` ignores it."""
+REQUEST_DEADLINE_MAX: float = 60.0
+"""Upper bound for a deadline set from the header."""
+DB_STATEMENT_TIMEOUT: float | None = None
+"""Server side ``statement_timeout`` of every PostgreSQL connection, in seconds."""
+
+# ----------------------------- QUERY INSTRUMENTATION -------------------------
+
+DB_SLOW_QUERY_MS: float = 200.0
+"""Statements slower than this many milliseconds are logged, with the types of their parameters."""
+DB_N_PLUS_ONE_THRESHOLD: int = 10
+"""Times a statement fingerprint may repeat in one request before it is reported as N+1."""
+
+# ------------------------------ ONLINE MIGRATIONS ----------------------------
+
+DB_ONLINE_MIGRATIONS: bool = True
+"""Rewrite autogenerated PostgreSQL migrations into their non-blocking form.
+
+Indexes on existing tables are built and dropped concurrently, foreign keys
+and checks are added ``NOT VALID`` and validated in a separate step, and
+columns with a volatile server default are backfilled in batches.
+"""
+DB_BACKFILL_BATCH_SIZE: int = 1_000
+"""Rows updated per statement by ``op.add_column_backfilled``."""
+
 # ------------------------------- REDIS -----------------------------------------
 
 SAQ_PROCESSES: int = 1
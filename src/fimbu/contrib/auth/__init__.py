@@ -7,21 +7,26 @@ from litestar.config.app import AppConfig
 from litestar.plugins import CLIPluginProtocol, InitPluginProtocol
 from litestar.types import ExceptionHandlersMap
 from fimbu.contrib.auth.config import AuthConfig
-from fimbu.contrib.auth.utils import get_auth_config, get_user_model
+from fimbu.contrib.auth.cache import get_user_cache
+from fimbu.contrib.auth.revocation import get_revocation_list
+from fimbu.contrib.auth.tokens import get_token_cache
+from fimbu.contrib.auth.utils import USER_SERVICE_STATE_KEY, build_user_service, get_auth_config, get_user_model
 from fimbu.db.exceptions import RepositoryError
 
 from fimbu.conf import settings
 from fimbu.core.types import ApplicationType
+from fimbu.utils.crypto import get_password_hasher
 from fimbu.contrib.auth.exceptions import (
     TokenException,
     repository_exception_to_http_response,
     token_exception_handler
 )
 
-from fimbu.contrib.auth.backends.base import AuthenticationMiddleware
+from fimbu.contrib.auth.backends.base import AuthenticationMiddleware, get_connection_backend
 
 if TYPE_CHECKING:
-    from fimbu.contrib.auth.backends.base import AuthenticationBackend
+    from litestar.connection import ASGIConnection
+    from fimbu.contrib.auth.backends.base import AbstractAuthenticationBackend
 
 
 __all__ = ["AuthPlugin", "AuthConfig", "install_auth_plugin"]
@@ -33,7 +38,6 @@ class AuthPlugin(InitPluginProtocol, CLIPluginProtocol):
     def __init__(self, config: AuthConfig) -> None:
         """Construct a LitestarUsers instance."""
         self._config = config
-        self._auth_manager : AuthenticationMiddleware | None = None
         self._init()
 
 
@@ -50,7 +54,7 @@ class AuthPlugin(InitPluginProtocol, CLIPluginProtocol):
 
         app_config.middleware.insert(
             0, AuthenticationMiddleware.build_middleware(
-                default_backend=self._config.auth_backend,
+                default_backend=self._config.default_auth_backend,
                 backends=self._config.auth_backends 
             )
         )
@@ -60,10 +64,27 @@ class AuthPlugin(InitPluginProtocol, CLIPluginProtocol):
             TokenException: token_exception_handler,  # type: ignore[dict-item]
         }
         app_config.exception_handlers.update(exception_handlers)
-        app_config.state.update({"auth_config": self._config})
+        app_config.state.update(
+            {"auth_config": self._config, USER_SERVICE_STATE_KEY: build_user_service(self._config)}
+        )
 
         self._config.auth_store = app_config.stores.get(settings.AUTH_STORE_KEY)
 
+        user_cache = get_user_cache()
+        user_cache.store = self._config.auth_store
+        app_config.on_startup.append(user_cache.start)
+        app_config.on_shutdown.append(user_cache.stop)
+
+        revocation_list = get_revocation_list()
+        revocation_list.store = self._config.auth_store
+        get_token_cache().revoked = revocation_list.is_revoked
+        app_config.on_startup.append(revocation_list.start)
+        app_config.on_shutdown.append(revocation_list.stop)
+
+        password_hasher = get_password_hasher(tuple(self._config.hash_schemes or ["argon2"]))
+        app_config.on_startup.append(password_hasher.start)
+        app_config.on_shutdown.append(password_hasher.shutdown)
+
         return app_config
 
 
@@ -74,12 +95,12 @@ class AuthPlugin(InitPluginProtocol, CLIPluginProtocol):
         return super().on_cli_init(cli)
 
 
-    def get_auth_backend(self) -> AuthenticationBackend | None:
+    def get_auth_backend(self, connection: ASGIConnection) -> AbstractAuthenticationBackend | None:
         """
         Returns:
-            The authentication backend to use.
+            The authentication backend that authenticated the connection.
         """
-        return self._auth_manager.backend
+        return get_connection_backend(connection)
 
 
 
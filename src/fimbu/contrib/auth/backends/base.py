@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any, Coroutine, Sequence, TYPE_CHECKING, Self
+from typing import Sequence, TYPE_CHECKING, Self
 from litestar.connection import ASGIConnection
 from litestar.config.app import AppConfig
 from litestar.middleware import DefineMiddleware
@@ -11,9 +11,6 @@ from litestar.middleware.authentication import (
 )
 from litestar import Request
 from litestar.exceptions import NotAuthorizedException
-from litestar.middleware._utils import (
-    should_bypass_middleware,
-)
 
 from fimbu.contrib.auth.protocols import UserT
 from fimbu.core.exceptions import ImproperlyConfigured
@@ -23,11 +20,22 @@ from fimbu.contrib.auth.schemas import AccountLogin
 
 if TYPE_CHECKING:
     from typing import Callable
-    from litestar.types import Send, Scope, Receive
 
 
 
-__all__ = ["AbstractAuthenticationBackend"]
+__all__ = ["AUTH_BACKEND_KEY", "AbstractAuthenticationBackend", "AuthenticationMiddleware", "get_connection_backend"]
+
+
+AUTH_BACKEND_KEY = "fimbu_auth_backend"
+"""Scope key of the backend that authenticated the connection."""
+
+BACKEND_QUERY_PARAM = "auth_backend"
+"""Query parameter selecting a backend, e.g ``?auth_backend=session``."""
+
+
+def get_connection_backend(connection: ASGIConnection) -> AbstractAuthenticationBackend | None:
+    """Return the backend that authenticated ``connection``, if any."""
+    return connection.scope.get(AUTH_BACKEND_KEY)  # type: ignore[return-value]
 
 
 
@@ -37,10 +45,31 @@ class AbstractAuthenticationBackend(ABC):
         self._app = app
         self._name : str = name
         self._middleware: AbstractAuthenticationMiddleware = middleware
+        self._auth_header: str | None = getattr(middleware, "auth_header", None)
+        self._auth_cookie_key: str | None = getattr(middleware, "auth_cookie_key", None)
+
+
+    def get_name(self) -> str:
+        return self._name
+
+
+    def is_requested_backend(self, request: ASGIConnection) -> bool:
+        return request.query_params.get(BACKEND_QUERY_PARAM) == self._name
+
 
-    @property
-    def is_requested_backend(self, request: Request) -> bool:
-        return request.query_params.get("auth_backend") == self._name
+    def can_authenticate(self, connection: ASGIConnection) -> bool:
+        """Cheap check that the connection carries credentials for this backend.
+
+        The header and cookie of the wrapped middleware are looked up, a
+        backend reading neither is always tried. Override it for other
+        credentials.
+        """
+        if self._auth_header is None and self._auth_cookie_key is None:
+            return True
+        return bool(
+            (self._auth_header and self._auth_header in connection.headers)
+            or (self._auth_cookie_key and self._auth_cookie_key in connection.cookies)
+        )
     
 
     @abstractmethod
@@ -74,8 +103,13 @@ class AbstractAuthenticationBackend(ABC):
         raise NotImplementedError
 
 
-    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
-        return self._middleware(scope, receive, send)
+    async def authenticate(self, connection: ASGIConnection) -> AuthenticationResult:
+        """
+        Authenticates a connection with the wrapped middleware.
+
+        Raises: NotAuthorizedException
+        """
+        return await self._middleware.authenticate_request(connection)
 
 
     def on_app_init(self, app_config: AppConfig) -> AppConfig:
@@ -84,28 +118,45 @@ class AbstractAuthenticationBackend(ABC):
 
 
 class AuthenticationMiddleware(AbstractAuthenticationMiddleware):
+    """Authenticate requests with the first matching of several backends.
+
+    Backends are indexed by name once. Each request only tries the backend
+    it asks for, or the backends whose credentials it carries, the default
+    one first. The backend that authenticated a request is kept in its
+    scope, the middleware itself holds no per request state.
+    """
+
     def __init__(
             self, app: Callable, 
             default_backend: str | None = None,
             backends: Sequence[AbstractAuthenticationBackend] | None = None
             , **kwargs) -> None:
         super().__init__(app, **kwargs)
-        self._backends: list[AbstractAuthenticationBackend] | None = backends
-        self._backend: AbstractAuthenticationBackend | None= None
-        self._default_backend: str | None = None
+        self._backends: dict[str, AbstractAuthenticationBackend] = {
+            backend.get_name(): backend for backend in backends or ()
+        }
+        self._default_backend: str | None = default_backend
         """The authentication backend, can be set as a query parameter.
         e.g ?auth_backend=session"""
 
         self.checks()   # Checks the correct configuration of the middleware.
+        self._candidates = self._order_backends()
+
+
+    def _order_backends(self) -> tuple[AbstractAuthenticationBackend, ...]:
+        default = self.get_default_backend()
+        others = tuple(backend for backend in self._backends.values() if backend is not default)
+        return (default, *others) if default is not None else others
 
 
     def add_backend(self, backend: AbstractAuthenticationBackend, as_default: bool = False) -> None:
         """
         Adds an authentication backend.
         """
-        self._backends.append(backend)
+        self._backends[backend.get_name()] = backend
         if as_default:
             self._default_backend = backend.get_name()
+        self._candidates = self._order_backends()
 
 
     def checks(self):
@@ -137,13 +188,8 @@ class AuthenticationMiddleware(AbstractAuthenticationMiddleware):
         """
         Returns all authentication backends.
         """
-        return self._backends
-    
+        return tuple(self._backends.values())
 
-    @property
-    def backend(self):
-        return self._backend
-    
 
     def get_default_backend(self) -> AbstractAuthenticationBackend | None:
         """
@@ -157,18 +203,28 @@ class AuthenticationMiddleware(AbstractAuthenticationMiddleware):
         """
         Returns an authentication backend by name.
         """
-        for backend in self._backends:
-            if backend.get_name() == name:
-                return backend
+        return self._backends.get(name)
             
 
-    def get_requested_backend(self, request: Request) -> AbstractAuthenticationBackend | None:
+    def get_requested_backend(self, request: ASGIConnection) -> AbstractAuthenticationBackend | None:
         """
         Returns the requested authentication backend.
         """
-        for backend in self._backends:
-            if backend.is_requested_backend(request):
-                return backend
+        name = request.query_params.get(BACKEND_QUERY_PARAM)
+        return self._backends.get(name) if name else None
+
+
+    def select_backends(self, connection: ASGIConnection) -> Sequence[AbstractAuthenticationBackend]:
+        """
+        Returns the backends to try for a connection, in order.
+
+        Only the requested backend if the connection asks for one, the
+        backends whose credentials it carries otherwise.
+        """
+        if BACKEND_QUERY_PARAM in connection.query_params:
+            requested = self.get_requested_backend(connection)
+            return (requested,) if requested is not None else ()
+        return [backend for backend in self._candidates if backend.can_authenticate(connection)]
 
 
     async def login(self, request: Request, data: AccountLogin, service: UserServiceType):
@@ -179,16 +235,9 @@ class AuthenticationMiddleware(AbstractAuthenticationMiddleware):
 
         Raises: NotAuthorizedException
         """
-        self._backend = self.get_requested_backend(request)
-
-        if self._backend:
-            return await self._backend.login(request, data, service)
-        
-
-        if self._default_backend:
-            self._backend = self.get_backend(self._default_backend)
-            if self._backend:
-                return await self._backend.login(request, data, service)
+        backend = self.get_requested_backend(request) or self.get_default_backend()
+        if backend:
+            return await backend.login(request, data, service)
             
         raise NotAuthorizedException(detail="login failed, invalid input")
 
@@ -197,77 +246,36 @@ class AuthenticationMiddleware(AbstractAuthenticationMiddleware):
         """
         Logs out a user.
 
-        If no backend is set, the default backend is used.
+        If no backend authenticated the request, the default backend is used.
         """
-
-        self._backend = self._backend if self._backend else self.get_default_backend()
-
-        if self._backend:
-            await self._backend.logout(request, **kwargs)
+        backend = get_connection_backend(request) or self.get_default_backend()
+        if backend:
+            await backend.logout(request, **kwargs)
 
 
     async def retrieve_user(self, connection: ASGIConnection, **kwargs) -> UserT | None:
         """
         Retrieves a user.
 
-        If no backend is set, the default backend is used.
+        If no backend authenticated the connection, the default backend is used.
         """
+        backend = get_connection_backend(connection) or self.get_default_backend()
+        if backend:
+            return await backend.retrieve_user(connection, **kwargs)
 
-        self._backend = self._backend if self._backend else self.get_default_backend()
-        if self._backend:
-            return await self._backend.retrieve_user(connection, **kwargs)
-        
-
-    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
-        """ASGI callable.
 
-        Args:
-            scope: The ASGI connection scope.
-            receive: The ASGI receive function.
-            send: The ASGI send function.
-
-        Returns:
-            None
-        """
-        if not should_bypass_middleware(
-            exclude_http_methods=self.exclude_http_methods,
-            exclude_opt_key=self.exclude_opt_key,
-            exclude_path_pattern=self.exclude,
-            scope=scope,
-            scopes=self.scopes,
-        ):
-            auth_result = await self.authenticate_request(scope, receive, send)
-            scope["user"] = auth_result.user
-            scope["auth"] = auth_result.auth
-        await self.app(scope, receive, send)
-
-
-    async def authenticate_request(self, scope: Scope, receive: Receive, send: Send) -> Coroutine[Any, Any, AuthenticationResult]:
+    async def authenticate_request(self, connection: ASGIConnection) -> AuthenticationResult:
         """
-        Authenticates a request.
+        Authenticates a request with the first selected backend accepting it.
+
+        Raises: NotAuthorizedException
         """
-        try:
-            if self._default_backend:
-                self._backend = self.get_backend(self._default_backend)
-                await self._backend(scope, receive, send)
-                return AuthenticationResult(
-                    user=scope["user"], 
-                    auth=scope["auth"]
-                )
-        except NotAuthorizedException as exc:
-            
-            for backend in self._backends:
-                if backend.get_name() == self._default_backend:
-                    continue
-                
-                try:
-                    self._backend = backend
-                    await self._backend(scope, receive, send)
-                    return AuthenticationResult(
-                        user=scope["user"], 
-                        auth=scope["auth"]
-                    )
-                except NotAuthorizedException:
-                    continue
-
-        raise NotAuthorizedException() from exc
+        for backend in self.select_backends(connection):
+            try:
+                result = await backend.authenticate(connection)
+            except NotAuthorizedException:
+                continue
+            connection.scope[AUTH_BACKEND_KEY] = backend  # type: ignore[literal-required]
+            return result
+
+        raise NotAuthorizedException("No valid credentials found in request")
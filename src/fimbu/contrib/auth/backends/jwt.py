@@ -1 +1,95 @@
-from litestar.security.jwt import JWTAuth, Token
\ No newline at end of file
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from litestar.exceptions import NotAuthorizedException
+from litestar.middleware.authentication import AuthenticationResult
+from litestar.security.jwt import JWTAuth as _JWTAuth
+from litestar.security.jwt import JWTCookieAuth as _JWTCookieAuth
+from litestar.security.jwt import OAuth2PasswordBearerAuth as _OAuth2PasswordBearerAuth
+from litestar.security.jwt import Token
+from litestar.security.jwt.middleware import JWTAuthenticationMiddleware, JWTCookieAuthenticationMiddleware
+
+from fimbu.contrib.auth.tokens import get_token_cache
+
+if TYPE_CHECKING:
+    from litestar.connection import ASGIConnection
+
+
+__all__ = [
+    "CachedJWTAuthenticationMiddleware",
+    "CachedJWTCookieAuthenticationMiddleware",
+    "JWTAuth",
+    "JWTCookieAuth",
+    "OAuth2PasswordBearerAuth",
+    "Token",
+]
+
+
+class _CachedTokenMixin:
+    """Decode the request token through the :class:`fimbu.contrib.auth.tokens.TokenCache`."""
+
+    __slots__ = ()
+
+    async def authenticate_token(
+        self: Any, encoded_token: str, connection: ASGIConnection[Any, Any, Any, Any]
+    ) -> AuthenticationResult:
+        token = await get_token_cache().decode(
+            encoded_token=encoded_token,
+            secret=self.token_secret,
+            algorithm=self.algorithm,
+            token_cls=self.token_cls,
+            audience=self.token_audience,
+            issuer=self.token_issuer,
+            require_claims=self.require_claims,
+            verify_exp=self.verify_expiry,
+            verify_nbf=self.verify_not_before,
+            strict_audience=self.strict_audience,
+        )
+
+        user = await self.retrieve_user_handler(token, connection)
+
+        if not user:
+            raise NotAuthorizedException()
+
+        return AuthenticationResult(user=user, auth=token)
+
+
+class CachedJWTAuthenticationMiddleware(_CachedTokenMixin, JWTAuthenticationMiddleware):
+    """Header JWT middleware verifying each token once per worker."""
+
+    __slots__ = ()
+
+
+class CachedJWTCookieAuthenticationMiddleware(_CachedTokenMixin, JWTCookieAuthenticationMiddleware):
+    """Header or cookie JWT middleware verifying each token once per worker."""
+
+    __slots__ = ()
+
+
+@dataclass
+class JWTAuth(_JWTAuth):
+    """:class:`litestar.security.jwt.JWTAuth` with verified tokens cached."""
+
+    authentication_middleware_class: type[JWTAuthenticationMiddleware] = field(
+        default=CachedJWTAuthenticationMiddleware
+    )
+
+
+@dataclass
+class JWTCookieAuth(_JWTCookieAuth):
+    """:class:`litestar.security.jwt.JWTCookieAuth` with verified tokens cached."""
+
+    authentication_middleware_class: type[JWTCookieAuthenticationMiddleware] = field(  # pyright: ignore
+        default=CachedJWTCookieAuthenticationMiddleware
+    )
+
+
+@dataclass
+class OAuth2PasswordBearerAuth(_OAuth2PasswordBearerAuth):
+    """:class:`litestar.security.jwt.OAuth2PasswordBearerAuth` with verified tokens cached."""
+
+    authentication_middleware_class: type[JWTCookieAuthenticationMiddleware] = field(  # pyright: ignore
+        default=CachedJWTCookieAuthenticationMiddleware
+    )
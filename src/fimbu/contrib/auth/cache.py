@@ -1,55 +1,295 @@
+"""Cache of the authenticated users.
+
+Every authenticated request loads its user, and ``requires_scope`` guards its
+permission bitmasks. :class:`UserCache` keeps both in a per-process LRU in
+front of the ``auth_store``, Redis when the stores come from
+:class:`fimbu.contrib.redis.RedisFactory`, read with a single ``GET``.
+Entries live ``AUTH_USER_CACHE_TTL`` seconds in the store and
+``AUTH_USER_CACHE_LOCAL_TTL`` seconds in process. Unknown IDs are cached for
+``AUTH_USER_CACHE_NEGATIVE_TTL`` seconds, so the tokens of a deleted user do
+not reach the database on every request.
+
+``UserService`` invalidates the entries of the users it changes. With
+a Redis store the invalidation is published and every worker drops its local
+copy.
+
+:class:`DefaultScopesCache` keeps the permission scopes granted to every new
+user, saving a ``PermissionScope`` drops it.
+"""
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
 
-from pydantic_core import from_json
+from msgspec import msgpack
+from structlog import get_logger
 
-from fimbu.contrib.auth.models import User, PermissionScope, Permission
+from fimbu.conf import settings
 from fimbu.contrib.auth.utils import get_user_model
+from fimbu.db.exceptions import ObjectNotFound
+from fimbu.utils.text import slugify
 
 if TYPE_CHECKING:
     from uuid import UUID
-    from typing import Any
+    from litestar.stores.base import Store
     from fimbu.contrib.auth.protocols import UserT
     from fimbu.contrib.auth.config import AuthConfig
-    from pydantic import BaseModel
+    from fimbu.contrib.auth.models import PermissionScope
+    from fimbu.contrib.auth.permissions import ScopeMasks
+
+
+__all__ = [
+    "DefaultScopesCache",
+    "UserCache",
+    "decode_user",
+    "encode_user",
+    "get_default_scopes_cache",
+    "get_user_cache",
+    "retrieve_user_from_cache",
+]
+
+
+logger = get_logger()
+
+UserModel: type[UserT] = get_user_model()
+
+REDACTED = "******"
+"""Stored in place of the password hash, which never leaves the database."""
+
+MISSING = msgpack.encode(None)
+"""Payload of a negative entry."""
+
+_encoder = msgpack.Encoder()
+
+
+def encode_user(user: UserT | None) -> bytes:
+    """Encode a user, or its absence, into a compact msgpack payload."""
+    if user is None:
+        return MISSING
+    data = user.model_dump()
+    data["password_hash"] = REDACTED
+    return _encoder.encode(data)
+
+
+def decode_user(payload: bytes) -> UserT | None:
+    """Decode a payload written by :func:`encode_user`."""
+    data = msgpack.decode(payload)
+    return None if data is None else UserModel.model_validate(data)
+
+
+class UserCache:
+    """Two tier cache of users and their permission bitmasks, a process local LRU in front of a store."""
+
+    def __init__(
+        self,
+        store: Store | None = None,
+        maxsize: int = 1024,
+        ttl: int = 300,
+        local_ttl: float = 5.0,
+        negative_ttl: int = 30,
+        channel: str = "auth:user-invalidate",
+    ) -> None:
+        """Construct a cache.
+
+        Args:
+            store: Shared store, only the local tier is used without it.
+            maxsize: Number of users kept in process.
+            ttl: Seconds an entry lives in the store.
+            local_ttl: Seconds an entry lives in process, bounds staleness if an invalidation is missed.
+            negative_ttl: Seconds an unknown ID stays cached.
+            channel: Redis channel invalidations are published on.
+        """
+        self.store = store
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.negative_ttl = negative_ttl
+        self.channel = channel
+        self._local: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._task: asyncio.Task[None] | None = None
+
+    @staticmethod
+    def key(user_id: UUID | str) -> str:
+        return f"user:{user_id}"
+
+    @staticmethod
+    def masks_key(user_id: UUID | str) -> str:
+        return f"perms:{user_id}"
+
+    async def get(self, user_id: UUID, loader: Callable[[UUID], Awaitable[UserT]]) -> UserT:
+        """Get a user, calling ``loader`` on a miss of both tiers.
+
+        The returned instance is a copy, changing it leaves the cached one untouched.
 
+        Raises:
+            ObjectNotFound: If the user does not exist, cached or not.
+        """
 
+        async def load() -> bytes:
+            try:
+                return encode_user(await loader(user_id))
+            except ObjectNotFound:
+                return MISSING
 
-UserModel: BaseModel = get_user_model()
+        # decoded from the payload on a miss too, both tiers hold the same redacted user
+        user = await self._get(self.key(user_id), load, decode_user)
+        if user is None:
+            raise ObjectNotFound(f"No user found with id {user_id}.")
+        return copy.copy(user)
 
+    async def get_scope_masks(self, user_id: UUID, loader: Callable[[UUID], Awaitable[ScopeMasks]]) -> ScopeMasks:
+        """Get the permission bitmasks of a user, calling ``loader`` on a miss of both tiers.
 
-def encode_user(user: UserT | BaseModel) -> str:
-    """Encode a user into a dictionary."""
-    user.password_hash = '******'
-    return user.model_dump_json()
+        The mapping is shared, do not change it.
+        """
 
+        async def load() -> bytes:
+            return _encoder.encode(await loader(user_id))
 
+        return await self._get(self.masks_key(user_id), load, msgpack.decode)
 
-def decode_user(user: str) -> UserT:
-    """Decode a user from a JSON string."""
-    return UserModel.model_validate(from_json(user))
+    async def _get(self, key: str, load: Callable[[], Awaitable[bytes]], decode: Callable[[bytes], Any]) -> Any:
+        entry = self._local.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._local.move_to_end(key)
+            return entry[1]
 
+        payload = await self.store.get(key) if self.store is not None else None
+        if payload is None:
+            payload = await load()
+            if self.store is not None:
+                await self.store.set(key, payload, expires_in=self.ttl if payload != MISSING else self.negative_ttl)
+        value = decode(payload)
 
+        local_ttl = self.local_ttl if payload != MISSING else min(self.local_ttl, self.negative_ttl)
+        self._local[key] = (time.monotonic() + local_ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+        return value
 
-async def retrieve_user_from_cache(self, user_id: UUID, config: AuthConfig) -> UserT:
+    def evict(self, user_id: UUID | str) -> None:
+        """Drop the local copies of a user and its permissions."""
+        self._local.pop(self.key(user_id), None)
+        self._local.pop(self.masks_key(user_id), None)
+
+    def clear(self) -> None:
+        """Drop every local copy."""
+        self._local.clear()
+
+    @property
+    def _redis(self) -> Any:
+        # only a RedisStore has a client, redis is an optional dependency
+        return getattr(self.store, "_redis", None)
+
+    async def invalidate(self, user_id: UUID | str) -> None:
+        """Drop a user and its permissions from both tiers and from the local tier of the other workers."""
+        self.evict(user_id)
+        if self.store is not None:
+            await self.store.delete(self.key(user_id))
+            await self.store.delete(self.masks_key(user_id))
+        if self._redis is not None:
+            await self._redis.publish(self.channel, str(user_id))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # invalidations published while unsubscribed were missed
+                    self.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.evict(message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await logger.aexception("User cache invalidation listener failed, retrying.")
+                await asyncio.sleep(1.0)
+
+    async def start(self) -> None:
+        """Listen to the invalidations of the other workers."""
+        if self._task is None and self._redis is not None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Stop listening to invalidations."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+@lru_cache
+def get_user_cache() -> UserCache:
+    """Get the user cache configured by the settings, its store is bound by the ``AuthPlugin``."""
+    return UserCache(
+        maxsize=settings.AUTH_USER_CACHE_SIZE,
+        ttl=settings.AUTH_USER_CACHE_TTL,
+        local_ttl=settings.AUTH_USER_CACHE_LOCAL_TTL,
+        negative_ttl=settings.AUTH_USER_CACHE_NEGATIVE_TTL,
+        channel=f"{slugify(settings.APP_NAME)}:auth:user-invalidate",
+    )
+
+
+class DefaultScopesCache:
+    """Process local cache of the default permission scopes.
+
+    The set is small and read by every registration. Saving or deleting a
+    scope invalidates it in the process, the TTL bounds staleness in the
+    other workers.
+    """
+
+    def __init__(self, ttl: float = 60.0) -> None:
+        self.ttl = ttl
+        self._scopes: list[PermissionScope] | None = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, loader: Callable[[], Awaitable[list[PermissionScope]]]) -> list[PermissionScope]:
+        """Get the default scopes, calling ``loader`` once for concurrent misses.
+
+        The list and its scopes are shared, do not change them.
+        """
+        if self._scopes is not None and self._expires_at > time.monotonic():
+            return self._scopes
+        async with self._lock:
+            if self._scopes is None or self._expires_at <= time.monotonic():
+                self._scopes = await loader()
+                self._expires_at = time.monotonic() + self.ttl
+        return self._scopes
+
+    def invalidate(self) -> None:
+        """Drop the cached scopes."""
+        self._scopes = None
+
+
+@lru_cache
+def get_default_scopes_cache() -> DefaultScopesCache:
+    """Get the default scopes cache of the process."""
+    return DefaultScopesCache(ttl=settings.AUTH_DEFAULT_SCOPES_TTL)
+
+
+async def retrieve_user_from_cache(user_id: UUID, config: AuthConfig) -> UserT:
     """Get a user from the cache.
 
     Args:
         user_id: The user ID.
+        config: The auth configuration, its repository loads the user on a miss.
+
+    Raises:
+        ObjectNotFound: If the user does not exist.
     """
 
-    user_key = f"user:{user_id}"
-    exists = await config.auth_store.exists(user_key)
-
-    if not exists:
-        repository = config.user_repository_class(
-            model_type=config.user_model
-        )
-        user = await repository.get(user_id)
-        await config.auth_store.set(user_key, encode_user(user))
-        return user
-    
-    else:
-        user_json = await config.auth_store.get(user_key)
-        return decode_user(user_json)
+    async def load(user_id: UUID) -> UserT:
+        repository = config.user_repository_class(model_type=config.user_model)
+        return await repository.get(user_id)
+
+    return await get_user_cache().get(user_id, load)
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
 import sys
+from pathlib import Path
 from typing import TYPE_CHECKING, cast
 
 import anyio
 from fimbu.core.utils import get_pydantic_fields
 from fimbu.db.exceptions import DuplicateRecordError, ObjectNotFound
-from click import echo, group, option, prompt
+from click import Choice, echo, group, option, prompt
+from click import Path as PathType
+from click import argument
 from fimbu.cli._utils import FimbuGroup
 
+from fimbu.contrib.auth.importer import RejectWriter, import_users, read_records
 from fimbu.contrib.auth.utils import get_auth_plugin, get_user_service
+from fimbu.utils.crypto import PasswordHasher
 from fimbu.db.utils import get_db_connection
 
 db,_ = get_db_connection()
@@ -74,6 +79,64 @@ def create_user(
     anyio.run(_create_user)
 
 
+@user_management_group.command(name="import", help="Import users from a CSV or NDJSON file.")
+@argument("path", type=PathType(exists=True, dir_okay=False, path_type=Path))
+@option("--format", "format_", type=Choice(["csv", "ndjson"]), default=None, help="Defaults to the file extension.")
+@option("--batch-size", default=1000, show_default=True, help="Records per transaction.")
+@option("--workers", type=int, default=None, help="Password hashing processes, defaults to the number of cores.")
+@option("--rejects", type=PathType(dir_okay=False, path_type=Path), default=None, help="Defaults to PATH.rejects.ndjson.")
+@option("--verify/--no-verify", default=False, show_default=True, help="Mark the users verified.")
+@option("--activate/--no-activate", default=True, show_default=True, help="Mark the users active.")
+def import_users_command(
+    app: Litestar,
+    path: Path,
+    format_: str | None,
+    batch_size: int,
+    workers: int | None,
+    rejects: Path | None,
+    verify: bool,
+    activate: bool,
+) -> None:
+    """Import users from a CSV or NDJSON file.
+
+    Records need an ``email`` and either a ``password``, hashed on import, or
+    an already hashed ``password_hash``. Other columns are user fields.
+    """
+    auth_config = get_auth_plugin(app)._config
+    rejects = rejects or path.with_name(f"{path.name}.rejects.ndjson")
+
+    def _progress(report) -> None:
+        echo(
+            f"{report.read} read, {report.imported} imported, {report.existing} existing, "
+            f"{report.rejected} rejected, {report.rate:.0f} records/s"
+        )
+
+    async def _import() -> None:
+        hasher = PasswordHasher(auth_config.hash_schemes, processes=workers, max_queue=batch_size)
+        await hasher.start()
+        try:
+            async with db:
+                with RejectWriter(rejects) as on_reject:
+                    report = await import_users(
+                        read_records(path, format_),
+                        get_user_service(app),
+                        hasher,
+                        batch_size=batch_size,
+                        verify=verify,
+                        activate=activate,
+                        on_reject=on_reject,
+                        on_progress=_progress,
+                    )
+        finally:
+            await hasher.shutdown()
+
+        echo(f"Imported {report.imported} users in {report.seconds:.1f}s, {report.rate:.0f} records/s.")
+        if report.existing or report.rejected:
+            echo(f"{report.existing + report.rejected} records not imported, see {rejects}.")
+
+    anyio.run(_import)
+
+
 @user_management_group.command(name="create-role", help="Create a new role in the database.")
 @option("--name")
 @option("--description")
@@ -27,8 +27,6 @@ if TYPE_CHECKING:
 class AuthConfig(Generic[UserT]):
     """Configuration class for LitestarUsers."""
 
-    auth_backend: str
-    """The authentication backend to use by default."""
     auth_backends : list[AbstractAuthenticationBackend]
     """List of authentication backends."""
     secret: str
@@ -42,6 +40,8 @@ class AuthConfig(Generic[UserT]):
     """The user repository class to use."""
     auth_exclude_paths: list[str] = field(default_factory=lambda: ["/schema"])
     """Paths to be excluded from authentication checks."""
+    default_auth_backend: str | None = None
+    """Name of the authentication backend to use by default."""
     auth_backend: type[JWTAuth | JWTCookieAuth | SessionAuth] | None = None
     """Authentication backend"""
     auth_store : RedisStore | None = None
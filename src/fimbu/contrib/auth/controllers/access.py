@@ -3,21 +3,23 @@
 from __future__ import annotations
 
 from typing import Annotated, Any, cast
+from uuid import uuid4
 
 from litestar import Controller, Request, Response, get, post
-from litestar.di import Provide
 from litestar.enums import RequestEncodingType
 from litestar.params import Body
 from litestar.security.session_auth import SessionAuth
-from litestar.security.jwt import OAuth2Login
+from litestar.security.jwt import BaseJWTAuth, OAuth2Login
 from litestar.contrib.jwt import JWTAuth, JWTCookieAuth, OAuth2PasswordBearerAuth
 from litestar.exceptions import NotAuthorizedException, PermissionDeniedException
 
 from fimbu.conf import settings
-from fimbu.contrib.auth.dependencies import provide_user_service
+from fimbu.contrib.auth.dependencies import user_service_dependency
 from fimbu.contrib.auth.guards import requires_active_user
+from fimbu.contrib.auth.permissions import PERMISSIONS_CLAIM
 from fimbu.contrib.auth.schemas import AccountLogin, AccountRegister, User
 from fimbu.contrib.auth.protocols import UserT, UserProtocol
+from fimbu.contrib.auth.revocation import revoke_request_token
 from fimbu.core.exceptions import ImproperlyConfiguredException
 from fimbu.contrib.auth.service import UserService, UserServiceType
 from fimbu.contrib.base import Message
@@ -37,7 +39,7 @@ class AccessController(Controller):
     """User login and registration."""
 
     tags = ["Auth - Access"]
-    dependencies = {"service": Provide(provide_user_service)}
+    dependencies = {"service": user_service_dependency}
     signature_namespace = {
         "UserService": UserService,
         "OAuth2Login": OAuth2Login,
@@ -86,7 +88,11 @@ class AccessController(Controller):
     ) -> Response[Message]:
         """Account Logout"""
         auth = get_auth_backend(request.app)
-        request.cookies.pop(auth.key, None)
+        if isinstance(auth, BaseJWTAuth):
+            await revoke_request_token(request, auth)
+        key = getattr(auth, "key", None)
+        if key is not None:
+            request.cookies.pop(key, None)
         request.clear_session()
 
         response = Response(
@@ -94,7 +100,8 @@ class AccessController(Controller):
         status_code=200,
 
         )
-        response.delete_cookie(auth.key)
+        if key is not None:
+            response.delete_cookie(key)
 
         return response
 
@@ -153,7 +160,15 @@ class AccessController(Controller):
         if user.is_active is False:
             raise PermissionDeniedException(detail="User not active")
         
-        return auth_backend.login(identifier=str(user.id), send_token_as_response_body=True)
+        token_extras = None
+        if settings.AUTH_EMBED_PERMISSIONS:
+            token_extras = {PERMISSIONS_CLAIM: await service.get_scope_masks(user.id)}
+        return auth_backend.login(
+            identifier=str(user.id),
+            token_unique_jwt_id=uuid4().hex,
+            token_extras=token_extras,
+            send_token_as_response_body=True,
+        )
     
 
     async def login_session(self,
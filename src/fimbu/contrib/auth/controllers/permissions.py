@@ -4,12 +4,11 @@ from __future__ import annotations
 from uuid import UUID
 
 from litestar import Controller, get, put, post, delete
-from litestar.di import Provide
 from litestar.params import Parameter
 from litestar.repository.exceptions import ConflictError
 
 from fimbu.conf import settings
-from fimbu.contrib.auth.dependencies import provide_user_service
+from fimbu.contrib.auth.dependencies import user_service_dependency
 from fimbu.contrib.auth.guards import requires_superuser
 from fimbu.contrib.auth.service import UserService, UserServiceType
 from fimbu.contrib.auth.utils import get_path
@@ -28,7 +27,7 @@ class PermissionController(Controller):
     tags = ["Auth - Permissions"]
     guards = [requires_superuser]
     dependencies = {
-        "service": Provide(provide_user_service),
+        "service": user_service_dependency,
     }
     signature_namespace = {"BaseUserService": UserService}
 
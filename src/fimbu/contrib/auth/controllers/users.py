@@ -5,14 +5,13 @@ from __future__ import annotations
 from typing import Annotated
 
 from litestar import Controller, delete, get, patch, post
-from litestar.di import Provide
 from litestar.params import Dependency, Parameter
 from litestar.pagination import OffsetPagination
 from litestar.dto import DTOData
 from uuid import UUID
 
 from fimbu.conf import settings
-from fimbu.contrib.auth.dependencies import provide_user_service
+from fimbu.contrib.auth.dependencies import user_service_dependency
 from fimbu.contrib.auth.protocols import UserProtocol
 from fimbu.contrib.auth.guards import requires_superuser
 from fimbu.contrib.auth.schemas import User
@@ -31,7 +30,7 @@ class UserController(Controller):
 
     tags = ["Auth - Users"]
     # guards = [requires_superuser]
-    dependencies = {"users_service": Provide(provide_user_service)}
+    dependencies = {"users_service": user_service_dependency}
     signature_namespace = {"UserService": UserServiceType}
     dto = None
     return_dto = None
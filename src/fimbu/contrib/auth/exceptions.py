@@ -10,7 +10,8 @@ from litestar.exceptions import (
 from litestar.middleware.exceptions._debug_response import create_debug_response
 from litestar.middleware.exceptions.middleware import create_exception_response
 
-from  fimbu.db.exceptions import ObjectNotFound, DuplicateRecordError, RepositoryError
+from fimbu.core.exceptions import _HTTPGatewayTimeoutException
+from  fimbu.db.exceptions import DeadlineExceeded, ObjectNotFound, DuplicateRecordError, RepositoryError
 
 __all__ = [
     "ExpiredTokenException",
@@ -74,8 +75,11 @@ def repository_exception_to_http_response(request: Request, exception: Repositor
         http_exception = NotFoundException
     elif isinstance(exception, DuplicateRecordError):
         http_exception = ConflictException
+    elif isinstance(exception, DeadlineExceeded):
+        http_exception = _HTTPGatewayTimeoutException
     else:
         http_exception = InternalServerException
-    if request.app.debug and not request.app.state.get("testing"):
+    # a deadline is not a server error, it answers 504 in debug too
+    if request.app.debug and not request.app.state.get("testing") and http_exception is not _HTTPGatewayTimeoutException:
         return create_debug_response(request, exception)
     return create_exception_response(request=request, exc=http_exception(detail=str(exception)))
@@ -4,10 +4,13 @@ from typing import TYPE_CHECKING
 
 from litestar.exceptions import NotAuthorizedException, PermissionDeniedException
 
+from fimbu.contrib.auth.permissions import get_scope_masks, has_permissions, parse_permissions
+
 __all__ = [
     "roles_accepted", 
     "roles_required",
     "requires_active_user",
+    "requires_scope",
     "requires_superuser",
     "requires_verified_user",
 ]
@@ -29,9 +32,11 @@ def roles_accepted(*roles: str) -> Guard:
         Litestar [Guard][litestar.types.callable_types.Guard] callable
     """
 
+    accepted = frozenset(roles)
+
     def roles_accepted_guard(connection: ASGIConnection, _: BaseRouteHandler) -> None:
         """Authorize a request if any of the user's roles matches any of the supplied roles."""
-        if any(role.name in roles for role in connection.user.roles):
+        if any(role.name in accepted for role in connection.user.roles):
             return
         raise NotAuthorizedException()
 
@@ -45,16 +50,41 @@ def roles_required(*roles: str) -> Guard:
         roles: Iterable of authorized role names.
     """
 
+    required = frozenset(roles)
+
     def roles_required_guard(connection: ASGIConnection, _: BaseRouteHandler) -> None:
         """Authorize a request if the user's roles matches all of the supplied roles."""
-        user_role_names = [role.name for role in connection.user.roles]
-        if all(role in user_role_names for role in roles):
+        if required.issubset(role.name for role in connection.user.roles):
             return
         raise NotAuthorizedException()
 
     return roles_required_guard
 
 
+def requires_scope(scope: str, permissions: str = "R") -> Guard:
+    """Get a [Guard][litestar.types.Guard] callable requiring permissions on a scope.
+
+    The user's compiled permission bitmasks are checked, from the token claims
+    or the user cache, without a database query once cached.
+
+    Args:
+        scope: Codename of the permission scope.
+        permissions: Required permission letters, any of ``RWUDA``.
+
+    Raises:
+        ValueError: On an unknown permission letter.
+    """
+    mask = parse_permissions(permissions)
+
+    async def requires_scope_guard(connection: ASGIConnection, _: BaseRouteHandler) -> None:
+        """Authorize a request if the user holds every required permission on the scope."""
+        if has_permissions(await get_scope_masks(connection), scope, mask):
+            return
+        raise PermissionDeniedException(detail="Insufficient privileges")
+
+    return requires_scope_guard
+
+
 def requires_active_user(connection: ASGIConnection, _: BaseRouteHandler) -> None:
     """Request requires active user.
 
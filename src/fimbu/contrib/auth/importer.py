@@ -0,0 +1,289 @@
+"""Bulk user import.
+
+Records are streamed from a CSV or NDJSON file and imported in chunks of
+``batch_size``. Each chunk is checked against the existing emails with one
+query, its passwords are hashed in parallel by a
+:class:`fimbu.utils.crypto.PasswordHasher` pool, and its users and their
+default permissions are inserted with two bulk statements in one
+transaction. Records carrying a ``password_hash`` instead of a ``password``
+are imported as is, without hashing.
+
+Records that are not imported are handed to ``on_reject`` with the reason,
+their passwords redacted.
+"""
+from __future__ import annotations
+
+import asyncio
+import csv
+import time
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Literal
+
+import msgspec
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+if TYPE_CHECKING:
+    from fimbu.contrib.auth.models import PermissionScope
+    from fimbu.contrib.auth.protocols import UserT
+    from fimbu.contrib.auth.service import BaseUserService
+    from fimbu.utils.crypto import PasswordHasher
+
+
+__all__ = ["ImportReport", "RejectWriter", "import_users", "read_records"]
+
+
+_SECRETS = ("password", "password_hash")
+
+
+@dataclass
+class ImportReport:
+    """Progress of an import."""
+
+    read: int = 0
+    """Records read."""
+    imported: int = 0
+    """Users created."""
+    existing: int = 0
+    """Records skipped, their email already has an account."""
+    rejected: int = 0
+    """Invalid records."""
+    seconds: float = 0.0
+    """Time spent so far."""
+
+    @property
+    def rate(self) -> float:
+        """Records processed per second."""
+        return self.read / self.seconds if self.seconds else 0.0
+
+
+def read_records(path: Path, format: Literal["csv", "ndjson"] | None = None) -> Iterator[tuple[int, dict[str, Any] | None]]:
+    """Stream the records of a file with their line number.
+
+    Empty CSV cells are left out, so the model defaults apply.
+
+    Args:
+        path: CSV file with a header row, or NDJSON file.
+        format: Defaults to ``csv`` for a ``.csv`` file, ``ndjson`` otherwise.
+    """
+    format = format or ("csv" if path.suffix.lower() == ".csv" else "ndjson")
+    with path.open(newline="", encoding="utf-8") as stream:
+        if format == "csv":
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}
+            return
+
+        decoder = msgspec.json.Decoder(dict)
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_num, decoder.decode(line)
+            except msgspec.DecodeError:
+                yield line_num, None
+
+
+class RejectWriter:
+    """Write rejected records to an NDJSON file, passwords redacted."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._stream = path.open("wb")
+        self._encoder = msgspec.json.Encoder()
+
+    def __call__(self, line: int, reason: str, record: dict[str, Any] | None) -> None:
+        if record is not None:
+            record = {key: ("******" if key in _SECRETS else value) for key, value in record.items()}
+        self._stream.write(self._encoder.encode({"line": line, "reason": reason, "record": record}) + b"\n")
+
+    def close(self) -> None:
+        self._stream.close()
+
+    def __enter__(self) -> RejectWriter:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+async def import_users(
+    records: Iterable[tuple[int, dict[str, Any] | None]],
+    service: BaseUserService[UserT],
+    hasher: PasswordHasher,
+    batch_size: int = 1_000,
+    verify: bool = False,
+    activate: bool = True,
+    on_reject: Callable[[int, str, dict[str, Any] | None], None] | None = None,
+    on_progress: Callable[[ImportReport], None] | None = None,
+) -> ImportReport:
+    """Import users in chunked transactions.
+
+    Args:
+        records: Line numbers and records, e.g. from :func:`read_records`.
+        service: User service, its model and default scopes are used.
+        hasher: Pool hashing the ``password`` of the records, its capacity should cover ``batch_size``.
+        batch_size: Records per chunk and transaction.
+        verify: Verification status of the users whose record does not set it.
+        activate: Active status of the users whose record does not set it.
+        on_reject: Called with the line, the reason and the record of each record not imported.
+        on_progress: Called with the report after each chunk.
+
+    Returns:
+        The final report.
+    """
+    started = time.monotonic()
+    report = ImportReport()
+    scopes = await service.get_default_scopes()
+    iterator = iter(records)
+
+    def reject(line: int, reason: str, record: dict[str, Any] | None) -> None:
+        if on_reject is not None:
+            on_reject(line, reason, record)
+
+    while chunk := list(islice(iterator, batch_size)):
+        report.read += len(chunk)
+        valid = await _prepare_chunk(chunk, service.user_model, hasher, verify, activate, reject, report)
+        if valid:
+            await _insert_chunk(valid, service.user_model, scopes, reject, report)
+        report.seconds = time.monotonic() - started
+        if on_progress is not None:
+            on_progress(report)
+
+    return report
+
+
+def _column_types(model: type[Any]) -> dict[str, Any]:
+    types = {}
+    for column in model.table.columns:
+        try:
+            types[column.name] = column.type.python_type
+        except NotImplementedError:
+            continue
+    return types
+
+
+def _coerce(row: dict[str, Any], types: dict[str, Any]) -> dict[str, Any]:
+    """Convert the text cells of a CSV record to their column type."""
+    for name, value in row.items():
+        if isinstance(value, str) and types.get(name, str) is not str:
+            row[name] = msgspec.convert(value, types[name], strict=False)
+    return row
+
+
+def _reason(error: Exception) -> str:
+    errors = getattr(error, "errors", None)
+    if callable(errors):
+        return "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in errors())
+    return str(error)
+
+
+async def _existing_emails(user_model: type[UserT], emails: Iterable[str]) -> set[str]:
+    email = user_model.table.c.email
+    rows = await user_model.database.fetch_all(select(email).where(email.in_(list(emails))))
+    return {row[0] for row in rows}
+
+
+async def _prepare_chunk(
+    chunk: list[tuple[int, dict[str, Any] | None]],
+    user_model: type[UserT],
+    hasher: PasswordHasher,
+    verify: bool,
+    activate: bool,
+    reject: Callable[[int, str, dict[str, Any] | None], None],
+    report: ImportReport,
+) -> list[tuple[int, dict[str, Any], dict[str, Any]]]:
+    """Dedupe, validate and hash a chunk into ``(line, record, row)`` triples."""
+    candidates: dict[str, tuple[int, dict[str, Any]]] = {}
+    for line, record in chunk:
+        if record is None:
+            report.rejected += 1
+            reject(line, "invalid JSON", None)
+        elif not record.get("email"):
+            report.rejected += 1
+            reject(line, "missing email", record)
+        elif not record.get("password") and not record.get("password_hash"):
+            report.rejected += 1
+            reject(line, "missing password", record)
+        elif record["email"] in candidates:
+            report.existing += 1
+            reject(line, "duplicate email in file", record)
+        else:
+            candidates[record["email"]] = (line, record)
+
+    for email in await _existing_emails(user_model, candidates) if candidates else ():
+        line, record = candidates.pop(email)
+        report.existing += 1
+        reject(line, "email already exists", record)
+
+    prepared = []
+    types = _column_types(user_model)
+    for line, record in candidates.values():
+        values = {key: value for key, value in record.items() if key != "password"}
+        values.setdefault("password_hash", "")  # hashed once the record is known valid
+        values.setdefault("is_verified", verify)
+        values.setdefault("is_active", activate)
+        try:
+            user = user_model(**values)
+            row = _coerce(user_model.query.extract_column_values(user.extract_db_fields(), model_class=user_model), types)
+        except (ValueError, TypeError, msgspec.ValidationError) as e:
+            report.rejected += 1
+            reject(line, _reason(e), record)
+            continue
+        prepared.append((line, record, row))
+
+    to_hash = [(record, row) for _, record, row in prepared if record.get("password")]
+    hashes = await asyncio.gather(*(hasher.hash(record["password"]) for record, _ in to_hash))
+    for (_, row), password_hash in zip(to_hash, hashes):
+        row["password_hash"] = password_hash
+    return prepared
+
+
+async def _insert_chunk(
+    prepared: list[tuple[int, dict[str, Any], dict[str, Any]]],
+    user_model: type[UserT],
+    scopes: list[PermissionScope],
+    reject: Callable[[int, str, dict[str, Any] | None], None],
+    report: ImportReport,
+) -> None:
+    """Insert the users of a chunk and their default permissions in one transaction.
+
+    A chunk colliding with accounts created meanwhile is retried once
+    without them, a second failure rejects it whole.
+    """
+    from fimbu.contrib.auth.models import Permission
+
+    database = user_model.database
+    for attempt in range(2):
+        permissions = [
+            Permission.query.extract_column_values(
+                {"user": row["id"], "scope": scope.id, **scope.parse_default_permissions(scope.default_permissins)},
+                model_class=Permission,
+            )
+            for _, _, row in prepared
+            for scope in scopes
+        ]
+        try:
+            async with database.transaction():
+                await database.execute_many(user_model.table.insert(), [row for _, _, row in prepared])
+                if permissions:
+                    await database.execute_many(Permission.table.insert(), permissions)
+        except IntegrityError as e:
+            if attempt:
+                for line, record, _ in prepared:
+                    report.rejected += 1
+                    reject(line, str(e.orig), record)
+                return
+            existing = await _existing_emails(user_model, (row["email"] for _, _, row in prepared))
+            for line, record, row in prepared:
+                if row["email"] in existing:
+                    report.existing += 1
+                    reject(line, "email already exists", record)
+            prepared = [item for item in prepared if item[2]["email"] not in existing]
+            if not prepared:
+                return
+        else:
+            report.imported += len(prepared)
+            return
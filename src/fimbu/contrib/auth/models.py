@@ -30,14 +30,27 @@ class PermissionScope(UUIDMixin):
     slug: str = fields.CharField(max_length=75, index=True, unique=True, default='')
     codename: str = fields.CharField(max_length=12, index=True, unique=True)
     default: bool = fields.BooleanField(default=False)
-    default_permissins = fields.CharField(max_length=6, default='R')
+    default_permissins: str = fields.CharField(max_length=6, default='R')
     description: str = fields.TextField(null=True, default=None)
 
 
     async def save(self, *args, **kwargs: Any) -> Coroutine[Any, Any, type[Model] | Any]:
+        from fimbu.contrib.auth.cache import get_default_scopes_cache
+
         self.slug = slugify(self.name)
-        self.default_permissins = str(self.default_permissins).upper()
-        return await super().save(*args, **kwargs)
+        # not set on an instance built without it, the field default applies
+        permissions = getattr(self, "default_permissins", None) or self.meta.fields["default_permissins"].default
+        self.default_permissins = str(permissions).upper()
+        saved = await super().save(*args, **kwargs)
+        get_default_scopes_cache().invalidate()
+        return saved
+
+
+    async def delete(self) -> None:
+        from fimbu.contrib.auth.cache import get_default_scopes_cache
+
+        await super().delete()
+        get_default_scopes_cache().invalidate()
     
 
     async def suscribe_user(self, user: UserT) -> "Permission":
@@ -50,7 +63,7 @@ class PermissionScope(UUIDMixin):
         Returns:
             Permission: The created & saved permission.
         """
-        return await self.create_permission(user).save()
+        return await self.create_permission(user).save(force_save=True)
 
 
     async def unscribe_user(self, user: UserT) -> Union["Permission", None]:
@@ -0,0 +1,104 @@
+"""Compiled permission bitmasks.
+
+The ``Permission`` rows of a user are compiled into a map of scope codename
+to bitmask, one bit per ``can_*`` flag::
+
+    {"billing": R | W, "reports": R}
+
+The map is cached with the user by :class:`fimbu.contrib.auth.cache.UserCache`
+or, with ``AUTH_EMBED_PERMISSIONS``, carried by the JWT in the ``perms``
+claim, so ``requires_scope`` guards check a request with a dict lookup and a
+bitwise ``and``.
+"""
+from __future__ import annotations
+
+from functools import reduce
+from typing import TYPE_CHECKING, Dict
+
+from fimbu.contrib.auth.cache import get_user_cache
+
+if TYPE_CHECKING:
+    from uuid import UUID
+    from litestar.connection import ASGIConnection
+    from fimbu.contrib.auth.protocols import PermT
+
+
+__all__ = [
+    "PERMISSION_BITS",
+    "PERMISSIONS_CLAIM",
+    "ScopeMasks",
+    "compile_permissions",
+    "get_scope_masks",
+    "has_permissions",
+    "load_scope_masks",
+    "parse_permissions",
+    "permission_mask",
+]
+
+
+ScopeMasks = Dict[str, int]
+"""Permission bitmask per scope codename."""
+
+PERMISSION_BITS: dict[str, int] = {"R": 1, "W": 2, "U": 4, "D": 8, "A": 16}
+"""Bit of each permission letter, as used by ``PermissionScope.default_permissins``."""
+
+_FLAGS: dict[str, str] = {
+    "R": "can_read",
+    "W": "can_write",
+    "U": "can_update",
+    "D": "can_delete",
+    "A": "can_approve",
+}
+
+PERMISSIONS_CLAIM = "perms"
+"""JWT claim carrying the scope masks."""
+
+
+def parse_permissions(permissions: str) -> int:
+    """Return the bitmask of permission letters, e.g. ``"RW"``.
+
+    Raises:
+        ValueError: On an unknown letter.
+    """
+    try:
+        return reduce(lambda mask, letter: mask | PERMISSION_BITS[letter], permissions.upper(), 0)
+    except KeyError as e:
+        raise ValueError(f"Unknown permission {e.args[0]!r}, expected letters of {''.join(PERMISSION_BITS)}.") from e
+
+
+def permission_mask(permission: PermT) -> int:
+    """Return the bitmask of the flags set on a ``Permission``."""
+    return sum(bit for letter, bit in PERMISSION_BITS.items() if getattr(permission, _FLAGS[letter], False))
+
+
+def compile_permissions(permissions: list[PermT]) -> ScopeMasks:
+    """Compile ``Permission`` rows, with their scope loaded, into scope masks."""
+    masks: ScopeMasks = {}
+    for permission in permissions:
+        codename = permission.scope.codename
+        masks[codename] = masks.get(codename, 0) | permission_mask(permission)
+    return masks
+
+
+def has_permissions(masks: ScopeMasks, scope: str, mask: int) -> bool:
+    """Whether ``masks`` grant every bit of ``mask`` on ``scope``."""
+    return masks.get(scope, 0) & mask == mask
+
+
+async def load_scope_masks(user_id: UUID) -> ScopeMasks:
+    """Compile the permissions of a user from the database, in one query."""
+    from fimbu.contrib.auth.models import Permission
+
+    return compile_permissions(await Permission.query.filter(user=user_id).select_related("scope").all())
+
+
+async def get_scope_masks(connection: ASGIConnection) -> ScopeMasks:
+    """Return the scope masks of the request user.
+
+    The ``perms`` claim of the request token is used when present, the
+    user cache otherwise.
+    """
+    claims = getattr(connection.auth, "extras", None)
+    if claims and PERMISSIONS_CLAIM in claims:
+        return claims[PERMISSIONS_CLAIM]
+    return await get_user_cache().get_scope_masks(connection.user.id, load_scope_masks)
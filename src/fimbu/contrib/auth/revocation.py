@@ -0,0 +1,284 @@
+"""Revocation of JWTs before they expire.
+
+A token is revoked by its ``jti``, or every token of a user issued until now
+is revoked at once. Revocations are kept in the Redis of the ``auth_store``,
+each entry expiring with the tokens it revokes, and indexed in a sorted set
+scored by expiry.
+
+Checking Redis on every request would cost a round trip, so each worker
+keeps a :class:`BloomFilter` of the revoked entries, rebuilt from the index
+every ``AUTH_REVOCATION_SYNC_INTERVAL`` seconds when it changed. A token
+whose ``jti`` and user are both absent from the filter, the common case, is
+accepted without a network call, only possible hits are checked in Redis.
+A revocation made by another worker applies here after the next sync.
+
+Without a Redis store revocations are kept in process.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+
+from litestar.exceptions import NotAuthorizedException
+from structlog import get_logger
+
+from fimbu.conf import settings
+from fimbu.contrib.auth.tokens import get_token_cache
+from fimbu.utils.text import slugify
+
+if TYPE_CHECKING:
+    from uuid import UUID
+    from litestar.connection import ASGIConnection
+    from litestar.security.jwt import BaseJWTAuth, Token
+    from litestar.stores.base import Store
+
+
+__all__ = [
+    "BloomFilter",
+    "TokenRevocationList",
+    "get_revocation_list",
+    "revoke_request_token",
+]
+
+
+logger = get_logger()
+
+
+class BloomFilter:
+    """Set membership with false positives and no false negatives."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        """Construct an empty filter.
+
+        Args:
+            capacity: Number of items the error rate is guaranteed for.
+            error_rate: Probability of a false positive at capacity.
+        """
+        self.capacity = max(capacity, 1)
+        self.size = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * step) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenRevocationList:
+    """Revoked tokens and users, in Redis behind a per process Bloom filter."""
+
+    def __init__(
+        self,
+        store: Store | None = None,
+        prefix: str = "auth:revoked",
+        sync_interval: float = 5.0,
+        capacity: int = 10_000,
+        error_rate: float = 0.001,
+        user_ttl: int = 86_400,
+    ) -> None:
+        """Construct a revocation list.
+
+        Args:
+            store: The ``auth_store``, revocations stay in process unless it is a ``RedisStore``.
+            prefix: Prefix of the Redis keys.
+            sync_interval: Seconds between two syncs of the Bloom filter.
+            capacity: Revocations the filter is sized for, it grows with the index.
+            error_rate: False positive rate of the filter, each one costs a Redis lookup.
+            user_ttl: Seconds a user revocation lasts, the longest token lifetime.
+        """
+        self.store = store
+        self.prefix = prefix
+        self.sync_interval = sync_interval
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.user_ttl = user_ttl
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._local: dict[str, tuple[float, str]] = {}
+        self._version: bytes | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def _redis(self) -> Any:
+        # only a RedisStore has a client, redis is an optional dependency
+        return getattr(self.store, "_redis", None)
+
+    def _key(self, member: str) -> str:
+        return f"{self.prefix}:{member}"
+
+    async def revoke_token(self, jti: str, expires_at: float) -> None:
+        """Revoke the token with this ``jti`` until it expires.
+
+        Args:
+            jti: The ``jti`` claim of the token.
+            expires_at: Timestamp of the ``exp`` claim of the token.
+        """
+        await self._add(f"jti:{jti}", "1", expires_at)
+
+    async def revoke_user(self, user_id: UUID | str) -> None:
+        """Revoke every token of a user issued before the current second.
+
+        Tokens carry their issue time in whole seconds, a token issued during
+        the second of the revocation is kept, so a user logging in again right
+        after a password reset is not logged out at once.
+        """
+        now = int(time.time())
+        await self._add(f"user:{user_id}", str(now), now + self.user_ttl)
+
+    async def _add(self, member: str, value: str, expires_at: float) -> None:
+        self._bloom.add(member)
+        self._local[member] = (expires_at, value)
+        if self._redis is not None:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.set(self._key(member), value, exat=math.ceil(expires_at))
+                pipe.zadd(self._key("index"), {member: expires_at})
+                pipe.incr(self._key("version"))
+                await pipe.execute()
+
+    async def is_revoked(self, token: Token) -> bool:
+        """Whether a token was revoked, by its ``jti`` or with its user."""
+        return await self._check(token.sub, token.jti, token.iat.timestamp())
+
+    async def is_user_revoked(self, user_id: UUID | str, issued_at: float) -> bool:
+        """Whether a token of a user issued at ``issued_at`` was revoked with the user."""
+        return await self._check(str(user_id), None, issued_at)
+
+    async def _check(self, user_id: str, jti: str | None, issued_at: float) -> bool:
+        members = [f"user:{user_id}"]
+        if jti:
+            members.append(f"jti:{jti}")
+        candidates = [member for member in members if member in self._bloom]
+        if not candidates:
+            return False
+
+        for member, value in zip(candidates, await self._lookup(candidates)):
+            if value is None:
+                continue
+            if member.startswith("jti:") or issued_at < float(value):
+                return True
+        return False
+
+    async def _lookup(self, members: list[str]) -> list[Any]:
+        if self._redis is not None:
+            return await self._redis.mget([self._key(member) for member in members])
+        now = time.time()
+        entries = [self._local.get(member) for member in members]
+        return [entry[1] if entry is not None and entry[0] > now else None for entry in entries]
+
+    async def sync(self) -> None:
+        """Rebuild the Bloom filter from the index if it changed."""
+        now = time.time()
+        self._local = {member: entry for member, entry in self._local.items() if entry[0] > now}
+
+        if self._redis is None:
+            members: Iterable[str] = self._local
+        else:
+            version = await self._redis.get(self._key("version"))
+            if version is not None and version == self._version:
+                return
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.zremrangebyscore(self._key("index"), "-inf", now)
+                pipe.zrangebyscore(self._key("index"), now, "+inf")
+                _, revoked = await pipe.execute()
+            members = [member.decode() for member in revoked]
+            self._version = version
+
+        members = list(members)
+        bloom = BloomFilter(max(self.capacity, len(members) * 2), self.error_rate)
+        bloom.update(members)
+        # revoked here while the index was read
+        bloom.update(self._local)
+        self._bloom = bloom
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await logger.aexception("Token revocation sync failed, retrying.")
+
+    async def start(self) -> None:
+        """Load the revocations and keep them in sync."""
+        if self._task is None:
+            await self.sync()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop syncing the revocations."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+@lru_cache
+def get_revocation_list() -> TokenRevocationList:
+    """Get the revocation list configured by the settings, its store is bound by the ``AuthPlugin``."""
+    return TokenRevocationList(
+        prefix=f"{slugify(settings.APP_NAME)}:auth:revoked",
+        sync_interval=settings.AUTH_REVOCATION_SYNC_INTERVAL,
+        capacity=settings.AUTH_REVOCATION_CAPACITY,
+        error_rate=settings.AUTH_REVOCATION_ERROR_RATE,
+        user_ttl=settings.AUTH_REVOCATION_USER_TTL,
+    )
+
+
+async def revoke_request_token(connection: ASGIConnection, auth: BaseJWTAuth) -> Token | None:
+    """Revoke the valid JWT a request carries in its header or cookie, if any.
+
+    Returns:
+        The revoked token.
+    """
+    encoded_token = connection.headers.get(auth.auth_header) or connection.cookies.get(getattr(auth, "key", ""))
+    if not encoded_token:
+        return None
+    encoded_token = encoded_token.partition(" ")[-1]
+
+    token_cache = get_token_cache()
+    try:
+        token = await token_cache.decode(
+            encoded_token=encoded_token,
+            secret=auth.token_secret,
+            algorithm=auth.algorithm,
+            token_cls=auth.token_cls,
+            audience=auth.accepted_audiences,
+            issuer=auth.accepted_issuers,
+            require_claims=auth.require_claims,
+            verify_exp=auth.verify_expiry,
+            verify_nbf=auth.verify_not_before,
+            strict_audience=auth.strict_audience,
+        )
+    except NotAuthorizedException:
+        return None
+
+    if token.jti:
+        await get_revocation_list().revoke_token(token.jti, token.exp.timestamp())
+    else:
+        # tokens issued without a jti can only be revoked with their user
+        await get_revocation_list().revoke_user(token.sub)
+    token_cache.discard(encoded_token)
+    return token
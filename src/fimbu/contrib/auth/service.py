@@ -1,16 +1,19 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+import asyncio
 from typing import TYPE_CHECKING, Any, Generic, Sequence, TypeVar
 from uuid import UUID
 
-from jose import JWTError
-from litestar.contrib.jwt.jwt_token import Token
+from sqlalchemy.exc import IntegrityError
+from fimbu.contrib.auth.cache import get_default_scopes_cache, get_user_cache
 from fimbu.contrib.auth.models import PermissionScope, Permission
+from fimbu.contrib.auth.permissions import ScopeMasks, load_scope_masks
 from fimbu.contrib.auth.protocols import PermScopteT, PermT, UserT
 from fimbu.contrib.auth.exceptions import InvalidTokenException
+from fimbu.contrib.auth.revocation import get_revocation_list
 from fimbu.contrib.auth.schemas import PermissionUpdate
 from fimbu.utils.crypto import PasswordManager
+from fimbu.utils.signing import BadSignature, TimestampSigner
 from fimbu.db import ResultConverter
 
 from fimbu.contrib.auth.repository import (
@@ -20,10 +23,16 @@ from fimbu.contrib.auth.repository import (
 )
 
 from fimbu.db.exceptions import DuplicateRecordError, ObjectNotFound
+from structlog import get_logger
 
 __all__ = ["BaseUserService", "UserService"]
 
 
+logger = get_logger()
+
+_background_tasks: set[asyncio.Task[Any]] = set()
+
+
 if TYPE_CHECKING:
     from litestar import Request
     from fimbu.contrib.auth.schemas import AccountLogin
@@ -35,6 +44,9 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
     user_model: type[UserT]
     """A subclass of the `User` ORM model."""
 
+    token_max_age: int = 60 * 60 * 24
+    """Seconds a verification or password reset token is valid for."""
+
     def __init__(
         self,
         user_repository: UserRepository[UserT],
@@ -65,22 +77,31 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
             verify: Set the user's verification status to this value.
             activate: Set the user's active status to this value.
         """
-        existing_user = await self.user_repository.exists(email=user.email)
-        if existing_user:
-            raise DuplicateRecordError("email already associated with an account")
-
         user.is_verified = verify
         user.is_active = activate
 
-        user = await self.user_repository.add(user)
-        scopes = await self.perm_scope_repository.list(default=True)
-        permissions = [s.create_permission(user) for s in scopes]
-        
-        await self.permission_repository.add_many(permissions)
+        scopes = await self.get_default_scopes()
+        try:
+            # one transaction, the unique email constraint rejects duplicates
+            async with self.user_model.database.transaction():
+                user = await self.user_repository.add(user)
+                if scopes:
+                    await self.permission_repository.add_many([scope.create_permission(user) for scope in scopes])
+        except IntegrityError as e:
+            if "email" in str(e.orig):
+                raise DuplicateRecordError("email already associated with an account") from e
+            # a default scope may have been deleted meanwhile
+            get_default_scopes_cache().invalidate()
+            raise
 
         return user
 
 
+    async def get_default_scopes(self) -> list[PermissionScope]:
+        """Get the scopes granted to new users, cached in process."""
+        return await get_default_scopes_cache().get(lambda: self.permission_scope_repository.list(default=True))
+
+
     async def register(self, data: dict[str, Any], request: Request | None = None) -> UserT:
         """Register a new user and optionally run custom business logic.
 
@@ -125,14 +146,17 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
         """
         return await self.user_repository.get_one_or_none(**kwargs)
 
-    async def update_user(self, data: UserT) -> UserT:
+    async def update_user(self, item_id: "UUID", data: dict[str, Any]) -> UserT:
         """Update arbitrary user attributes in the database.
 
         Args:
-            data: User update data transfer object.
+            item_id: UUID of the user to update.
+            data: The attributes to update.
         """
-
-        return await self.user_repository.update(data)
+        user = await self.user_repository.get(item_id)
+        user = await self.user_repository.update_instance(user, **data)
+        await get_user_cache().invalidate(item_id)
+        return user
 
     async def delete_user(self, id_: "UUID") -> UserT:
         """Delete a user from the database.
@@ -140,7 +164,10 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
         Args:
             id_: UUID corresponding to a user primary key.
         """
-        return await self.user_repository.delete(id_)
+        user = await self.user_repository.delete(id_)
+        await get_user_cache().invalidate(id_)
+        await get_revocation_list().revoke_user(id_)
+        return user
 
     async def authenticate(self, data: AccountLogin, request: Request | None = None) -> UserT | None:
         """Authenticate a user.
@@ -158,14 +185,14 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
             user = await self.user_repository.get_one(email=data.email)
         except ObjectNotFound:
             # trigger passlib's `dummy_verify` method
-            self.password_manager.verify_and_update(data.password, None)
+            await self.password_manager.averify_and_update(data.password, None)
             return None
 
-        password_verified, new_password_hash = self.password_manager.verify_and_update(
+        password_verified, new_password_hash = await self.password_manager.averify_and_update(
             data.password, user.password_hash
         )
-        if new_password_hash is not None:
-            user = await self.user_repository.update_instance(user, {"password_hash": new_password_hash})
+        if password_verified and new_password_hash is not None:
+            self._schedule_rehash(user, new_password_hash)
 
         if not password_verified or not should_proceed:
             return None
@@ -174,19 +201,35 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
 
         return user
 
+    def _schedule_rehash(self, user: UserT, password_hash: str) -> None:
+        """Store the upgraded hash of a user in the background, the login does not wait for the write."""
+
+        async def rehash() -> None:
+            try:
+                await self.user_repository.update_instance(user, password_hash=password_hash)
+            except Exception:
+                await logger.aexception("Password rehash failed.", user_id=str(user.id))
+
+        task = asyncio.create_task(rehash())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    def get_signer(self, context: str) -> TimestampSigner:
+        """Signer of the tokens bound to a flow, a token of one flow is refused by the others.
+
+        Args:
+            context: The flow, ``verify`` or ``reset_password``.
+        """
+        return TimestampSigner(key=self.secret, salt=f"fimbu.contrib.auth.{context}")
+
     def generate_token(self, user_id: "UUID", aud: str) -> str:
-        """Generate a limited time valid JWT.
+        """Generate a limited time valid, URL safe token.
 
         Args:
             user_id: UUID of the user to provide the token to.
             aud: Context of the token
         """
-        token = Token(
-            exp=datetime.now() + timedelta(seconds=60 * 60 * 24),  # noqa: DTZ005
-            sub=str(user_id),
-            aud=aud,
-        )
-        return token.encode(secret=self.secret, algorithm="HS256")
+        return self.get_signer(aud).sign(UUID(str(user_id)).hex)
 
     async def initiate_verification(self, user: UserT) -> None:
         """Initiate the user verification flow.
@@ -202,29 +245,30 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
 
         Args:
             user: The user requesting verification.
-            token: An encoded JWT bound to verification.
+            token: A signed token bound to verification.
 
         Notes:
         - Develepors need to override this method to facilitate sending the token via email, sms etc.
         """
 
     async def verify(self, encoded_token: str, request: Request | None = None) -> UserT:
-        """Verify a user with the given JWT.
+        """Verify a user with the given token.
 
         Args:
-            encoded_token: An encoded JWT bound to verification.
+            encoded_token: A signed token bound to verification.
             request: The litestar request that initiated the action.
 
         Raises:
             InvalidTokenException: If the token is expired or tampered with.
         """
-        token = self._decode_and_verify_token(encoded_token, context="verify")
+        user_id = await self._decode_and_verify_token(encoded_token, context="verify")
 
-        user_id = token.sub
         try:
-            user = await self.user_repository.update(self.user_model(id=UUID(user_id), is_verified=True))  # type: ignore[arg-type]
+            user = await self.user_repository.get(UUID(user_id))
         except ObjectNotFound as e:
             raise InvalidTokenException("token is invalid") from e
+        user = await self.user_repository.update_instance(user, is_verified=True)
+        await get_user_cache().invalidate(user.id)
 
         await self.post_verification_hook(user, request)
 
@@ -247,31 +291,34 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
 
         Args:
             user: The user requesting the password reset.
-            token: An encoded JWT bound to the password reset flow.
+            token: A signed token bound to the password reset flow.
 
         Notes:
         - Develepors need to override this method to facilitate sending the token via email, sms etc.
         """
 
     async def reset_password(self, encoded_token: str, password: str) -> None:
-        """Reset a user's password given a valid JWT.
+        """Reset a user's password given a valid token.
 
         Args:
-            encoded_token: An encoded JWT bound to the password reset flow.
+            encoded_token: A signed token bound to the password reset flow.
             password: The new password to hash and store.
 
         Raises:
             InvalidTokenException: If the token has expired or been tampered with.
         """
-        token = self._decode_and_verify_token(encoded_token, context="reset_password")
+        user_id = await self._decode_and_verify_token(encoded_token, context="reset_password")
 
-        user_id = token.sub
         try:
-            await self.user_repository.update(
-                self.user_model(id=UUID(user_id), password_hash=self.password_manager.hash(password))  # type: ignore[arg-type]
-            )
+            user = await self.user_repository.get(UUID(user_id))
         except ObjectNotFound as e:
             raise InvalidTokenException from e
+        await self.user_repository.update_instance(
+            user, password_hash=await self.password_manager.get_password_hash(password)
+        )
+        await get_user_cache().invalidate(user.id)
+        # the reset token is single use, and sessions opened with the old password end
+        await get_revocation_list().revoke_user(user.id)
 
     async def pre_login_hook(
         self, data: AccountLogin, request: Request | None = None
@@ -295,7 +342,9 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
         """Execute custom logic to run custom business logic after authenticating a user.
 
         Useful for eg. updating a login counter, updating last known user IP
-        address, etc.
+        address, etc. Prefer buffering such writes with
+        :func:`fimbu.contrib.write_behind.get_write_behind` over updating the
+        user row on every login.
 
         Args:
             user: The user who has authenticated.
@@ -355,20 +404,23 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
         """
         return
 
-    def _decode_and_verify_token(self, encoded_token: str, context: str) -> Token:
+    async def _decode_and_verify_token(self, encoded_token: str, context: str) -> str:
+        """Verify a token of a flow.
+
+        Returns:
+            The id of the user the token was issued to.
+        """
         try:
-            token = Token.decode(
-                encoded_token=encoded_token,
-                secret=self.secret,
-                algorithm="HS256",
-            )
-        except JWTError as e:
+            user_id, signed_at = self.get_signer(context).unsign_timestamp(encoded_token, max_age=self.token_max_age)
+            # tokens carry the hex form, JWTs and the revocation list the dashed one
+            user_id = str(UUID(user_id))
+        except (BadSignature, ValueError) as e:
             raise InvalidTokenException from e
 
-        if token.aud != context:
-            raise InvalidTokenException(f"aud value must be {context}")
+        if await get_revocation_list().is_user_revoked(user_id, signed_at):
+            raise InvalidTokenException("token has been revoked")
 
-        return token
+        return user_id
     
 
     async def get_all_scopes(self) -> list[PermissionScope]:
@@ -407,6 +459,19 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
         return await self.permission_repository.list(user=user)
     
 
+    async def get_scope_masks(self, user_id: UUID) -> ScopeMasks:
+        """
+        Get the compiled permission bitmasks of a user, from the user cache.
+
+        Args:
+            user_id (UUID): The user to get the bitmasks for.
+
+        Returns:
+            ScopeMasks: The bitmask of each scope codename.
+        """
+        return await get_user_cache().get_scope_masks(user_id, load_scope_masks)
+
+
     async def get_user_scopes(self, user: UUID) -> list[PermissionScope]:
         """
         Get use's scopes
@@ -431,7 +496,9 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
         Returns:
             Permission: The created permission.
         """
-        return await self.permission_scope_repository.suscribe_user(scope_id, user)
+        permission = await self.permission_scope_repository.suscribe_user(scope_id, user)
+        await get_user_cache().invalidate(user.id)
+        return permission
     
 
     async def revoke_permission(self, scope_id: UUID, user: UserT) -> Permission | None:
@@ -445,7 +512,9 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
         Returns:
             Permission: The deleted permission.
         """
-        return await self.permission_scope_repository.unscribe_user(scope_id, user)
+        permission = await self.permission_scope_repository.unscribe_user(scope_id, user)
+        await get_user_cache().invalidate(user.id)
+        return permission
     
 
     async def update_permission(self, permission_id: UUID, data: PermissionUpdate ) -> Permission:
@@ -460,7 +529,11 @@ class BaseUserService(Generic[UserT], ResultConverter):  # pylint: disable=R0904
             Permission: The updated permission.
         """
         permission = await self.permission_repository.get(permission_id)
-        await self.permission_repository.update(permission, data.to_dict())
+        # the scope of a permission is not changed, only its flags
+        fields = {key: value for key, value in data.to_dict().items() if key != "scope"}
+        permission = await self.permission_repository.update_instance(permission, **fields)
+        await get_user_cache().invalidate(permission.user.id)
+        return permission
 
 
 UserServiceType = TypeVar("UserServiceType", bound=BaseUserService)
@@ -0,0 +1,142 @@
+"""Cache of verified JWTs.
+
+Decoding a JWT verifies its signature, and an authenticated client sends the
+same token with every request. :class:`TokenCache` keeps the decoded
+:class:`~litestar.security.jwt.Token` of each verified token, keyed by a
+digest of the encoded token, until its ``exp``, so the signature is checked
+once per token and worker rather than once per request.
+
+Only tokens that verified are cached, with the options they verified
+against. Revocation is never cached, the ``revoked`` check of the cache runs
+on every decode, hits included.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Sequence, TypeVar
+
+from litestar.exceptions import NotAuthorizedException
+from litestar.security.jwt import Token
+
+from fimbu.conf import settings
+
+
+__all__ = ["TokenCache", "get_token_cache", "token_digest"]
+
+
+TokenT = TypeVar("TokenT", bound=Token)
+
+
+def token_digest(encoded_token: str) -> bytes:
+    """Digest keying an encoded token, the token itself is not kept."""
+    return hashlib.blake2b(encoded_token.encode(), digest_size=16).digest()
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens, each kept until it expires."""
+
+    def __init__(self, maxsize: int = 4096, revoked: Callable[[Token], Awaitable[bool]] | None = None) -> None:
+        """Construct a cache.
+
+        Args:
+            maxsize: Number of tokens kept.
+            revoked: Check run on every decode, a revoked token is refused even when cached.
+        """
+        self.maxsize = maxsize
+        self.revoked = revoked
+        self._tokens: OrderedDict[bytes, tuple[float, tuple[Any, ...], Token]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def get(self, encoded_token: str, options: tuple[Any, ...]) -> Token | None:
+        """Return the cached token verified with ``options``, if not expired."""
+        digest = token_digest(encoded_token)
+        entry = self._tokens.get(digest)
+        if entry is None:
+            return None
+        expires_at, verified_with, token = entry
+        if expires_at <= time.time():
+            del self._tokens[digest]
+            return None
+        if verified_with != options:
+            return None
+        self._tokens.move_to_end(digest)
+        return token
+
+    def set(self, encoded_token: str, options: tuple[Any, ...], token: Token) -> None:
+        """Cache a token verified with ``options`` until its ``exp``."""
+        digest = token_digest(encoded_token)
+        self._tokens[digest] = (token.exp.timestamp(), options, token)
+        self._tokens.move_to_end(digest)
+        while len(self._tokens) > self.maxsize:
+            self._tokens.popitem(last=False)
+
+    def discard(self, encoded_token: str) -> None:
+        """Drop a token, it is verified again on its next use."""
+        self._tokens.pop(token_digest(encoded_token), None)
+
+    def clear(self) -> None:
+        """Drop every token."""
+        self._tokens.clear()
+
+    async def decode(
+        self,
+        encoded_token: str,
+        secret: str,
+        algorithm: str,
+        token_cls: type[TokenT] = Token,  # type: ignore[assignment]
+        audience: str | Sequence[str] | None = None,
+        issuer: str | Sequence[str] | None = None,
+        require_claims: Sequence[str] | None = None,
+        verify_exp: bool = True,
+        verify_nbf: bool = True,
+        strict_audience: bool = False,
+    ) -> TokenT:
+        """Decode a token, verifying it only on a miss.
+
+        Takes the arguments of :meth:`Token.decode <litestar.security.jwt.Token.decode>`.
+        The returned token is shared, do not change it.
+
+        Raises:
+            NotAuthorizedException: If the token is invalid or revoked.
+        """
+        options = (
+            token_cls,
+            secret,
+            algorithm,
+            audience if isinstance(audience, str) or audience is None else tuple(audience),
+            issuer if isinstance(issuer, str) or issuer is None else tuple(issuer),
+            tuple(require_claims or ()),
+            verify_exp,
+            verify_nbf,
+            strict_audience,
+        )
+        token = self.get(encoded_token, options)
+        if token is None:
+            token = token_cls.decode(
+                encoded_token=encoded_token,
+                secret=secret,
+                algorithm=algorithm,
+                audience=audience,
+                issuer=issuer,
+                require_claims=require_claims,
+                verify_exp=verify_exp,
+                verify_nbf=verify_nbf,
+                strict_audience=strict_audience,
+            )
+            self.set(encoded_token, options, token)
+
+        if self.revoked is not None and await self.revoked(token):
+            self.discard(encoded_token)
+            raise NotAuthorizedException("Token has been revoked")
+        return token  # type: ignore[return-value]
+
+
+@lru_cache
+def get_token_cache() -> TokenCache:
+    """Get the token cache of the process, sized by ``AUTH_TOKEN_CACHE_SIZE``."""
+    return TokenCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE)
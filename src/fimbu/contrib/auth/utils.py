@@ -15,10 +15,13 @@ if TYPE_CHECKING:
     from litestar.contrib.jwt import JWTAuth, JWTCookieAuth
     from litestar.security.session_auth.auth import SessionAuth
     from fimbu.contrib.auth import AuthPlugin
+    from fimbu.contrib.auth.config import AuthConfig
     from fimbu.contrib.auth.service import BaseUserService
 
 
 __all__ = [
+    "USER_SERVICE_STATE_KEY",
+    "build_user_service",
     "get_auth_plugin",
     "get_auth_backend",
     "get_user_service",
@@ -29,6 +32,10 @@ __all__ = [
     "installed_native_auth",
 ]
 
+USER_SERVICE_STATE_KEY = "user_service"
+"""App state key of the shared user service."""
+
+
 def get_auth_plugin(app: Litestar) -> AuthPlugin:
     """Get the AuthPlugin from the Litestar application."""
     from fimbu.contrib.auth import AuthPlugin
@@ -43,14 +50,14 @@ def get_auth_backend(app: Litestar) -> JWTCookieAuth | JWTAuth | SessionAuth:
     return get_auth_plugin(app)._config.auth_backend
 
 
-def get_user_service(app: Litestar) -> BaseUserService[Any, Any]:
-    """Get a `UserService` instance outside of a Litestar request context."""
-    from fimbu.contrib.auth.repository import RoleRepository
-
-    config = get_auth_plugin(app)._config
+def build_user_service(config: AuthConfig) -> BaseUserService[Any, Any]:
+    """Build the user service graph of an auth configuration.
 
+    The service holds no per request state, the ``AuthPlugin`` builds it
+    once and keeps it in the app state.
+    """
     user_repository = config.user_repository_class(config.user_model)
-    
+
     return config.user_service_class(
         user_repository=user_repository,
         secret=config.secret,
@@ -58,6 +65,14 @@ def get_user_service(app: Litestar) -> BaseUserService[Any, Any]:
     )
 
 
+def get_user_service(app: Litestar) -> BaseUserService[Any, Any]:
+    """Get the `UserService` instance outside of a Litestar request context."""
+    service = app.state.get(USER_SERVICE_STATE_KEY)
+    if service is None:
+        service = build_user_service(get_auth_plugin(app)._config)
+    return service
+
+
 def get_user_model() -> UserT:
     """Get the user model from the settings."""
     if hasattr(settings, 'USER_MODEL'):
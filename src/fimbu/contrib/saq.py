@@ -16,7 +16,12 @@ def install_saq_plugin(app: ApplicationType) -> None:
         queue_configs=[
             QueueConfig(
                 name="system-tasks",
-                tasks=["app.domain.system.tasks.system_task", "app.domain.system.tasks.system_upkeep"],
+                tasks=[
+                    "app.domain.system.tasks.system_task",
+                    "app.domain.system.tasks.system_upkeep",
+                    "fimbu.contrib.system.tasks.partition_maintenance",
+                    "fimbu.contrib.system.tasks.retention_purge",
+                ],
                 scheduled_tasks=[
                     CronJob(
                         function="app.domain.system.tasks.system_upkeep",
@@ -24,6 +29,18 @@ def install_saq_plugin(app: ApplicationType) -> None:
                         cron="0 * * * *",
                         timeout=500,
                     ),
+                    CronJob(
+                        function="fimbu.contrib.system.tasks.partition_maintenance",
+                        unique=True,
+                        cron="15 0 * * *",
+                        timeout=600,
+                    ),
+                    CronJob(
+                        function="fimbu.contrib.system.tasks.retention_purge",
+                        unique=True,
+                        cron="30 * * * *",
+                        timeout=1800,
+                    ),
                 ],
             ),
             QueueConfig(
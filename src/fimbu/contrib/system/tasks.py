@@ -3,7 +3,11 @@ import asyncio
 from saq.types import Context
 from structlog import get_logger
 
-__all__ = ["background_worker_task", "system_task", "system_upkeep"]
+from fimbu.db.partitioning import maintain_partitions
+from fimbu.db.retention import apply_retention
+from fimbu.db.utils import get_db_connection
+
+__all__ = ["background_worker_task", "partition_maintenance", "retention_purge", "system_task", "system_upkeep"]
 
 
 logger = get_logger()
@@ -29,3 +33,30 @@ async def system_task(_: Context) -> None:
     await logger.ainfo("Performing simple system task")
     await asyncio.sleep(2)
     await logger.ainfo("System task complete.")
+
+
+async def partition_maintenance(_: Context) -> None:
+    await logger.ainfo("Performing partition maintenance.")
+    _, registry = get_db_connection()
+    for report in await maintain_partitions(registry.models.values()):
+        await logger.ainfo(
+            "Partitions maintained.",
+            table=report.table,
+            created=report.created,
+            expired=report.detached,
+        )
+    await logger.ainfo("Partition maintenance complete.")
+
+
+async def retention_purge(_: Context) -> None:
+    await logger.ainfo("Purging rows past their retention.")
+    _, registry = get_db_connection()
+    for report in await apply_retention(registry.models.values()):
+        await logger.ainfo(
+            "Retention purge complete.",
+            table=report.table,
+            rows=report.rows,
+            batches=report.batches,
+            archived=report.archived,
+            seconds=round(report.seconds, 3),
+        )
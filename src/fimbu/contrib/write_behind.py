@@ -0,0 +1,408 @@
+"""Write-behind counters and last-seen fields.
+
+Hot rows such as a user's login counter turn every request into an ``UPDATE``.
+Instead, increments and "touch" writes are buffered, in process or in Redis,
+and flushed every ``WRITE_BEHIND_FLUSH_INTERVAL`` seconds as one batched
+``UPDATE`` per table and field::
+
+    buffer = get_write_behind()
+    await buffer.incr(user, "login_count")
+    await buffer.touch(user, "last_login_at")
+
+The buffer is flushed on shutdown, so staleness is bounded by the flush
+interval. Writes buffered by a process that dies are lost with the in-process
+backend, use ``WRITE_BEHIND_BACKEND = "redis"`` to share and keep them. With
+Redis, values drained by a worker that died before acknowledging them are
+merged back into the buffer, they are written at least once.
+
+Incremented instances are left as is, their field holds the stored value
+until the flush, so a ``save()`` in between does not write the increment a
+second time.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import time
+import uuid
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Literal, Protocol
+
+from litestar.plugins import InitPluginProtocol
+from sqlalchemy import case, func, literal, update
+from structlog import get_logger
+
+from fimbu.conf import settings
+from fimbu.core.types import ApplicationType
+from fimbu.db.exceptions import RepositoryError
+from fimbu.db.utils import get_db_connection
+from fimbu.utils import decode_json, encode_json
+from fimbu.utils.text import slugify
+
+if TYPE_CHECKING:
+    from litestar.config.app import AppConfig
+    from redis.asyncio import Redis
+    from sqlalchemy import Column
+    from fimbu.core.types import ModelT
+
+
+__all__ = [
+    "MemoryWriteBehindBackend",
+    "RedisWriteBehindBackend",
+    "WriteBehindBuffer",
+    "WriteBehindPlugin",
+    "get_write_behind",
+    "install_write_behind_plugin",
+]
+
+
+logger = get_logger()
+
+WriteOp = Literal["incr", "touch"]
+BufferKey = tuple[str, WriteOp, str]
+"""``(table, operation, field)``"""
+
+FLUSH_CHUNK_SIZE = 500
+
+
+class WriteBehindBackend(Protocol):
+    async def incr(self, key: BufferKey, member: str, amount: int) -> None: ...
+
+    async def touch(self, key: BufferKey, member: str, value: Any) -> None: ...
+
+    async def drain(self) -> dict[BufferKey, dict[str, Any]]: ...
+
+    async def restore(self, key: BufferKey, members: dict[str, Any]) -> None: ...
+
+    async def ack(self, key: BufferKey) -> None: ...
+
+
+class MemoryWriteBehindBackend:
+    """Per process buffer."""
+
+    def __init__(self) -> None:
+        self._pending: dict[BufferKey, dict[str, Any]] = {}
+
+    async def incr(self, key: BufferKey, member: str, amount: int) -> None:
+        members = self._pending.setdefault(key, {})
+        members[member] = members.get(member, 0) + amount
+
+    async def touch(self, key: BufferKey, member: str, value: Any) -> None:
+        self._pending.setdefault(key, {})[member] = value
+
+    async def drain(self) -> dict[BufferKey, dict[str, Any]]:
+        pending, self._pending = self._pending, {}
+        return pending
+
+    async def restore(self, key: BufferKey, members: dict[str, Any]) -> None:
+        for member, value in members.items():
+            if key[1] == "incr":
+                await self.incr(key, member, value)
+            else:
+                self._pending.setdefault(key, {}).setdefault(member, value)
+
+    async def ack(self, key: BufferKey) -> None:
+        pass
+
+
+class RedisWriteBehindBackend:
+    """Buffer shared by every worker through Redis hashes.
+
+    A drained hash is renamed and kept, listed in a sorted set scored by the
+    drain time, until the flush acknowledges it. Hashes left unacknowledged
+    for ``stale_after`` seconds, their worker having died, are merged back on
+    the next drain of any worker.
+    """
+
+    def __init__(self, redis: Redis, namespace: str, stale_after: float = 60.0) -> None:
+        self.redis = redis
+        self.namespace = namespace
+        self.stale_after = stale_after
+        self._keys = f"{namespace}:keys"
+        self._flushing = f"{namespace}:flushing"
+        self._draining: dict[BufferKey, str] = {}
+
+    def _name(self, key: BufferKey) -> str:
+        return f"{self.namespace}:{':'.join(key)}"
+
+    async def incr(self, key: BufferKey, member: str, amount: int) -> None:
+        name = self._name(key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            await pipe.hincrby(name, member, amount).sadd(self._keys, name).execute()
+
+    async def touch(self, key: BufferKey, member: str, value: Any) -> None:
+        name = self._name(key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            await pipe.hset(name, member, encode_json(value)).sadd(self._keys, name).execute()
+
+    def _parse(self, name: str, values: dict[bytes, bytes]) -> tuple[BufferKey, dict[str, Any]]:
+        table, op, field = name[len(self.namespace) + 1:].split(":", 2)
+        key: BufferKey = (table, op, field)  # type: ignore[assignment]
+        return key, {
+            member.decode(): int(value) if op == "incr" else decode_json(value)
+            for member, value in values.items()
+        }
+
+    async def drain(self) -> dict[BufferKey, dict[str, Any]]:
+        from redis.exceptions import ResponseError
+
+        await self._recover()
+        pending: dict[BufferKey, dict[str, Any]] = {}
+        for name in await self.redis.smembers(self._keys):
+            name = name.decode() if isinstance(name, bytes) else name
+            flushing = f"{name}:flushing:{uuid.uuid4().hex}"
+            try:
+                # writes landing after the rename go to a fresh hash
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    await pipe.rename(name, flushing).zadd(self._flushing, {flushing: time.time()}).execute()
+            except ResponseError:
+                await self.redis.zrem(self._flushing, flushing)
+                continue
+            key, pending[key] = self._parse(name, await self.redis.hgetall(flushing))
+            self._draining[key] = flushing
+        return pending
+
+    async def restore(self, key: BufferKey, members: dict[str, Any]) -> None:
+        name = self._name(key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for member, value in members.items():
+                if key[1] == "incr":
+                    pipe.hincrby(name, member, value)
+                else:
+                    pipe.hsetnx(name, member, encode_json(value))
+            await pipe.sadd(self._keys, name).execute()
+
+    async def ack(self, key: BufferKey) -> None:
+        flushing = self._draining.pop(key, None)
+        if flushing is not None:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.delete(flushing).zrem(self._flushing, flushing).execute()
+
+    async def _recover(self) -> None:
+        """Merge back the drained hashes of workers that died before acknowledging them."""
+        for flushing in await self.redis.zrangebyscore(self._flushing, "-inf", time.time() - self.stale_after):
+            flushing = flushing.decode() if isinstance(flushing, bytes) else flushing
+            # the worker removing the entry owns the recovery
+            if not await self.redis.zrem(self._flushing, flushing):
+                continue
+            key, members = self._parse(flushing.rsplit(":flushing:", 1)[0], await self.redis.hgetall(flushing))
+            if members:
+                await self.restore(key, members)
+            await self.redis.delete(flushing)
+            await logger.awarning("Recovered unflushed write-behind values.", key=flushing, count=len(members))
+
+
+def _coerce(column: Column[Any], value: Any) -> Any:
+    """Turn JSON round-tripped values back into what the column expects."""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+
+    if python_type is datetime.datetime:
+        if isinstance(value, str):
+            value = datetime.datetime.fromisoformat(value)
+        if value.tzinfo is not None and not getattr(column.type, "timezone", False):
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    elif python_type is datetime.date and isinstance(value, str):
+        value = datetime.date.fromisoformat(value)
+    return value
+
+
+class WriteBehindBuffer:
+    """Buffer counter increments and touch updates, flushed as batched ``UPDATE``s."""
+
+    def __init__(
+        self,
+        backend: WriteBehindBackend | None = None,
+        flush_interval: float = 5.0,
+        max_pending: int = 10_000,
+    ) -> None:
+        """Construct a buffer.
+
+        Args:
+            backend: Where writes are buffered, in process by default.
+            flush_interval: Maximum number of seconds a write stays buffered.
+            max_pending: Number of buffered writes that triggers an early flush.
+        """
+        self.backend = backend or MemoryWriteBehindBackend()
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._models: dict[str, type[ModelT]] = {}
+        self._writes = 0
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task[None] | None = None
+
+    async def incr(self, instance: ModelT, field: str, amount: int = 1) -> None:
+        """Buffer ``field += amount`` for ``instance``.
+
+        The instance is not changed, saving it before the flush must not
+        write the increment on top of the buffered one.
+        """
+        key, member = self._key(instance, "incr", field)
+        await self.backend.incr(key, member, amount)
+        self._written()
+
+    async def touch(self, instance: ModelT, field: str, value: Any = None) -> None:
+        """Buffer ``field = value`` for ``instance``, the last write wins.
+
+        ``value`` defaults to the current UTC time.
+        """
+        if value is None:
+            value = datetime.datetime.now(datetime.timezone.utc)
+        key, member = self._key(instance, "touch", field)
+        await self.backend.touch(key, member, value)
+        setattr(instance, field, value)
+        self._written()
+
+    def _key(self, instance: ModelT, op: WriteOp, field: str) -> tuple[BufferKey, str]:
+        model = type(instance)
+        table = model.table
+        if field not in table.columns:
+            raise RepositoryError(f"Unknown field '{field}' for {model.__name__}.")
+        if len(model.pkcolumns) != 1:
+            raise RepositoryError(f"{model.__name__} needs a single column primary key for write-behind.")
+        self._models.setdefault(table.name, model)
+        return (table.name, op, field), encode_json(getattr(instance, model.pkcolumns[0]))
+
+    def _written(self) -> None:
+        self._writes += 1
+        if self._writes >= self.max_pending:
+            self._wakeup.set()
+
+    def _resolve_model(self, table_name: str) -> type[ModelT] | None:
+        if table_name not in self._models:
+            _, registry = get_db_connection()
+            for model in registry.models.values():
+                self._models.setdefault(model.table.name, model)
+        return self._models.get(table_name)
+
+    async def flush(self) -> int:
+        """Write every buffered value to the database.
+
+        Returns:
+            The number of rows updated.
+        """
+        self._writes = 0
+        rows = 0
+        error: Exception | None = None
+        drained = await self.backend.drain()
+        done: set[BufferKey] = set()
+        try:
+            for key, members in drained.items():
+                try:
+                    rows += await self._apply(key, members)
+                except Exception as exc:  # noqa: BLE001
+                    await self.backend.restore(key, members)
+                    error = error or exc
+                done.add(key)
+                await self.backend.ack(key)
+        finally:
+            # cancelled midway, what was not written goes back to the buffer
+            for key, members in drained.items():
+                if key not in done:
+                    await self.backend.restore(key, members)
+                    await self.backend.ack(key)
+        if error is not None:
+            raise error
+        return rows
+
+    async def _apply(self, key: BufferKey, members: dict[str, Any]) -> int:
+        table_name, op, field = key
+        model = self._resolve_model(table_name)
+        if model is None:
+            await logger.awarning("Dropping write-behind values of unknown table.", table=table_name)
+            return 0
+
+        table = model.table
+        pk = table.columns[model.pkcolumns[0]]
+        column = table.columns[field]
+        items = [(decode_json(member), _coerce(column, value)) for member, value in members.items()]
+
+        # all or nothing, a key restored after a failure is not applied twice
+        async with model.database.transaction():
+            for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+                chunk = items[start:start + FLUSH_CHUNK_SIZE]
+                if op == "incr":
+                    value = func.coalesce(column, 0) + case(*((pk == key_, amount) for key_, amount in chunk), else_=0)
+                else:
+                    value = case(*((pk == key_, literal(value_, column.type)) for key_, value_ in chunk), else_=column)
+                await model.database.execute(
+                    update(table).where(pk.in_([key_ for key_, _ in chunk])).values({column.name: value})
+                )
+        return len(items)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            try:
+                await self.flush()
+            except Exception:
+                await logger.aexception("Write-behind flush failed, values kept for the next run.")
+
+    async def start(self) -> None:
+        """Start the periodic flush."""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and write what is left.
+
+        A flush in progress is awaited rather than cancelled.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+@lru_cache
+def get_write_behind() -> WriteBehindBuffer:
+    """Get the write-behind buffer configured by the settings."""
+    backend: WriteBehindBackend | None = None
+    if settings.WRITE_BEHIND_BACKEND == "redis":
+        from fimbu.contrib.redis import get_redis
+
+        backend = RedisWriteBehindBackend(get_redis(), namespace=f"{slugify(settings.APP_NAME)}:write-behind")
+
+    return WriteBehindBuffer(
+        backend=backend,
+        flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL,
+        max_pending=settings.WRITE_BEHIND_MAX_PENDING,
+    )
+
+
+class WriteBehindPlugin(InitPluginProtocol):
+    """Run the write-behind flush alongside the application."""
+
+    def __init__(self, buffer: WriteBehindBuffer | None = None) -> None:
+        self.buffer = buffer or get_write_behind()
+
+    def on_app_init(self, app_config: AppConfig) -> AppConfig:
+        app_config.on_startup.append(self.buffer.start)
+        # flush before the database connection is closed
+        app_config.on_shutdown.insert(0, self.buffer.stop)
+        app_config.state.update({"write_behind": self.buffer})
+        return app_config
+
+
+def install_write_behind_plugin(app: ApplicationType) -> None:
+    """Install the write-behind plugin."""
+
+    if isinstance(app, ApplicationType):
+        app.set_config(
+            'plugins',
+            [WriteBehindPlugin()]
+        )
+    else:
+        raise TypeError("app must be an instance or Application")
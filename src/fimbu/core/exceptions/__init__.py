@@ -9,7 +9,7 @@ from typing import TYPE_CHECKING, Any
 from litestar.exceptions import (
     HTTPException,
 )
-from litestar.status_codes import HTTP_409_CONFLICT, HTTP_500_INTERNAL_SERVER_ERROR
+from litestar.status_codes import HTTP_409_CONFLICT, HTTP_500_INTERNAL_SERVER_ERROR, HTTP_504_GATEWAY_TIMEOUT
 from structlog.contextvars import bind_contextvars
 from click import ClickException
 from litestar.exceptions import ImproperlyConfiguredException
@@ -70,6 +70,14 @@ class AppRegistryNotReady(FimbuException):...
 class SuspiciousFileOperation(FimbuException):...
 
 
+class Saturated(FimbuException):
+    """A bounded resource has no capacity left, the caller should retry later."""
+
+    def __init__(self, *args: Any, detail: str = "", retry_after: int = 1) -> None:
+        super().__init__(*args, detail=detail)
+        self.retry_after = retry_after
+
+
 
 class ApplicationError(Exception):
     """Base exception type for the lib's custom exception types."""
@@ -124,3 +132,9 @@ class _HTTPConflictException(HTTPException):
     """Request conflict with the current state of the target resource."""
 
     status_code = HTTP_409_CONFLICT
+
+
+class _HTTPGatewayTimeoutException(HTTPException):
+    """Request deadline exceeded before the work completed."""
+
+    status_code = HTTP_504_GATEWAY_TIMEOUT
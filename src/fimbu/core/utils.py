@@ -8,13 +8,16 @@ from litestar.exceptions import (
     InternalServerException,
     NotFoundException,
     PermissionDeniedException,
+    TooManyRequestsException,
 )
 from fimbu.core.exceptions import (
     ApplicationError,
     AuthorizationError,
+    Saturated,
     _HTTPConflictException,
+    _HTTPGatewayTimeoutException,
 )
-from fimbu.db.exceptions import ObjectNotFound, DuplicateRecordError, RepositoryError
+from fimbu.db.exceptions import ObjectNotFound, DeadlineExceeded, DuplicateRecordError, RepositoryError
 from litestar.middleware.exceptions._debug_response import create_debug_response
 from litestar.middleware.exceptions.middleware import create_exception_response
 
@@ -84,7 +87,7 @@ def get_pydantic_fields(model: BaseModel) -> Tuple[dict[str, Field], dict[str, F
 
 def exception_to_http_response(
     request: Request[Any, Any, Any],
-    exc: ApplicationError | RepositoryError,
+    exc: ApplicationError | RepositoryError | Saturated,
 ) -> Response[ExceptionResponseContent]:
     """Transform repository exceptions to HTTP exceptions.
 
@@ -95,9 +98,16 @@ def exception_to_http_response(
     Returns:
         Exception response appropriate to the type of original exception.
     """
+    if isinstance(exc, Saturated):
+        return create_exception_response(
+            request, TooManyRequestsException(detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
+        )
+
     http_exc: type[HTTPException]
     if isinstance(exc, ObjectNotFound):
         http_exc = NotFoundException
+    elif isinstance(exc, DeadlineExceeded):
+        http_exc = _HTTPGatewayTimeoutException
     elif isinstance(exc, DuplicateRecordError | RepositoryError):
         http_exc = _HTTPConflictException
     elif isinstance(exc, AuthorizationError):
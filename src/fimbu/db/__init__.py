@@ -38,11 +38,12 @@ from edgy.core.signals import Signal
 from edgy.core.utils.sync import run_sync
 from edgy.exceptions import MultipleObjectsReturned, ObjectNotFound
 from .utils import get_db_connection, get_db_registry, get_database
-from fimbu.db._converters import to_schema, EMPTY_FILTER, ResultConverter
+from fimbu.db._converters import to_schema, to_json_bytes, encode_model, EMPTY_FILTER, ResultConverter
 from fimbu.db._fields import (
     JsonBField, GUIDField, BigIntIdentityField,
     EncryptedStringField, EncryptedTextField, DateTimeUTCField
 )
+from fimbu.db import migrations  # noqa: F401  registers the online-safe alembic operations
 
 
 __all__ = [
@@ -107,6 +108,8 @@ __all__ = [
     "get_database",
     "build_db_url",
     "to_schema",
+    "to_json_bytes",
+    "encode_model",
     "EMPTY_FILTER",
     "ResultConverter",
 ]
\ No newline at end of file
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import datetime
+import decimal
+import io
+import uuid
+from typing import TYPE_CHECKING, Any, Callable, Sequence
+
+from fimbu.core.exceptions import MissingDependencyError
+from fimbu.utils import encode_json
+
+if TYPE_CHECKING:
+    from sqlalchemy import Column, Row
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: nocover
+    pa = None  # type: ignore[assignment]
+    pq = None  # type: ignore[assignment]
+
+
+__all__ = [
+    "ArrowBatchBuilder",
+    "BytesSink",
+    "require_pyarrow",
+]
+
+
+Converter = Callable[[Any], Any]
+
+
+def require_pyarrow() -> None:
+    """Raise :class:`MissingDependencyError` if ``pyarrow`` is not installed."""
+    if pa is None:
+        raise MissingDependencyError("pyarrow is required for columnar exports, install fimbu[arrow].")
+
+
+def _python_type(column: Column[Any]) -> type | None:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def _arrow_field(column: Column[Any]) -> tuple[pa.Field, Converter | None]:
+    """Map a table column to an arrow field and an optional value converter."""
+    python_type = _python_type(column)
+    converter: Converter | None = None
+
+    if python_type is bool:
+        arrow_type = pa.bool_()
+    elif python_type is int:
+        arrow_type = pa.int64()
+    elif python_type is float:
+        arrow_type = pa.float64()
+    elif python_type is decimal.Decimal:
+        precision = getattr(column.type, "precision", None)
+        scale = getattr(column.type, "scale", None)
+        if precision is not None and scale is not None:
+            arrow_type = pa.decimal128(precision, scale)
+        else:
+            arrow_type, converter = pa.string(), str
+    elif python_type is str:
+        arrow_type = pa.string()
+    elif python_type is bytes:
+        arrow_type = pa.binary()
+    elif python_type is datetime.datetime:
+        arrow_type = pa.timestamp("us", tz="UTC" if getattr(column.type, "timezone", False) else None)
+    elif python_type is datetime.date:
+        arrow_type = pa.date32()
+    elif python_type is datetime.time:
+        arrow_type = pa.time64("us")
+    elif python_type is datetime.timedelta:
+        arrow_type = pa.duration("us")
+    elif python_type is uuid.UUID:
+        arrow_type, converter = pa.string(), str
+    elif python_type in (dict, list):
+        arrow_type, converter = pa.string(), encode_json
+    else:
+        arrow_type, converter = pa.string(), str
+
+    return pa.field(column.name, arrow_type, nullable=bool(column.nullable)), converter
+
+
+class ArrowBatchBuilder:
+    """Build arrow record batches straight from driver rows."""
+
+    def __init__(self, columns: Sequence[Column[Any]]) -> None:
+        """Construct the arrow schema once for ``columns``.
+
+        Args:
+            columns: The selected table columns, in select order.
+        """
+        require_pyarrow()
+        fields, converters = zip(*(_arrow_field(column) for column in columns))
+        self.schema: pa.Schema = pa.schema(fields)
+        self.converters: tuple[Converter | None, ...] = converters
+
+    def build(self, rows: Sequence[Row[Any]]) -> pa.RecordBatch:
+        """Transpose a batch of rows into a record batch.
+
+        Args:
+            rows: A batch of rows as returned by the driver.
+        """
+        arrays = []
+        for values, field, converter in zip(zip(*rows), self.schema, self.converters):
+            if converter is not None:
+                values = [None if value is None else converter(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+class BytesSink(io.RawIOBase):
+    """Write-only buffer drained after each batch, used to stream encoded output."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:  # type: ignore[override]
+        self._buffer.extend(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        """Return and clear the buffered bytes."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
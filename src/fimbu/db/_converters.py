@@ -1,18 +1,21 @@
 from __future__ import annotations
 
-from functools import partial
+from functools import lru_cache, partial
 from pathlib import Path, PurePath
 from typing import (
     TYPE_CHECKING,
     Any,
     Callable,
     List,
+    Mapping,
+    Optional,
     Sequence,
     cast, overload
 )
 from uuid import UUID
 
 from litestar.pagination import OffsetPagination
+from litestar.serialization import default_serializer
 from fimbu.db.filters import FilterTypes, LimitOffset
 from fimbu.core.types import ModelT, ModelDTOT, RowMappingT
 
@@ -28,7 +31,8 @@ if TYPE_CHECKING:
     from fimbu.core.types import T, ModelDTOT, RowMappingT, ModelT
 
 try:
-    from msgspec import Struct, convert
+    from msgspec import Struct, convert, defstruct
+    from msgspec.json import Encoder
 except ImportError:  # pragma: nocover
 
     class Struct:  # type: ignore[no-redef]
@@ -38,6 +42,16 @@ except ImportError:  # pragma: nocover
         """Placeholder implementation"""
         return {}
 
+    def defstruct(*args: Any, **kwargs: Any) -> Any:  # type: ignore[no-redef] # noqa: ARG001
+        """Placeholder implementation"""
+        return Struct
+
+    class Encoder:  # type: ignore[no-redef]
+        """Placeholder Implementation"""
+
+        def __init__(self, *args: Any, **kwargs: Any) -> None:  # noqa: ARG002
+            """Placeholder implementation"""
+
 
 try:
     from pydantic import BaseModel
@@ -53,6 +67,9 @@ except ImportError:  # pragma: nocover
 
 EMPTY_FILTER: list[FilterTypes] = []
 
+CONVERTER_CACHE_SIZE = 512
+"""Maximum number of schema types whose converters are kept in the registry."""
+
 
 def _default_deserializer(
     target_type: Any,
@@ -104,6 +121,108 @@ def _find_filter(
     )
 
 
+_struct_dec_hook = partial(
+    _default_deserializer,
+    type_decoders=[
+        (lambda x: x is UUID, lambda t, v: t(v.hex)),
+    ],
+)
+"""``msgspec`` decoding hook shared by every struct conversion."""
+
+_model_pagination_type = OffsetPagination[ModelT]
+
+
+@lru_cache(maxsize=CONVERTER_CACHE_SIZE)
+def _get_type_adapter(schema_type: Any) -> TypeAdapter:
+    """Get the pydantic ``TypeAdapter`` built once for ``schema_type``."""
+    return TypeAdapter(schema_type)
+
+
+@lru_cache(maxsize=CONVERTER_CACHE_SIZE)
+def _get_list_type(schema_type: Any) -> Any:
+    """Get the ``List[schema_type]`` generic built once for ``schema_type``."""
+    return List[schema_type]  # type: ignore[valid-type]
+
+
+@lru_cache(maxsize=CONVERTER_CACHE_SIZE)
+def _get_pagination_type(schema_type: Any) -> type[OffsetPagination[Any]]:
+    """Get the ``OffsetPagination[schema_type]`` generic built once for ``schema_type``."""
+    return OffsetPagination[schema_type]  # type: ignore[valid-type]
+
+
+@lru_cache(maxsize=None)
+def get_row_struct(model_type: type[ModelT]) -> type[Struct]:
+    """Get the ``msgspec.Struct`` mirroring the table columns of ``model_type``.
+
+    The struct is generated once per model and its fields follow the column order,
+    so driver rows can be passed to it positionally.
+
+    Args:
+        model_type: The model to mirror.
+
+    Returns:
+        The generated struct type.
+    """
+    fields: list[tuple[str, Any]] = []
+    for column in model_type.table.columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = Any
+        fields.append((str(column.name), Optional[python_type] if column.nullable else python_type))
+    return defstruct(f"{model_type.__name__}Row", fields)
+
+
+def encode_model(model: BaseModel) -> dict[str, Any]:
+    """Dump ``model`` to python values.
+
+    Used as a type encoder: ``msgspec`` encodes datetimes, UUIDs etc. natively,
+    which is cheaper than pydantic's ``json`` mode.
+    """
+    return model.model_dump()
+
+
+def _json_enc_hook(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if hasattr(value, "_mapping"):  # sqlalchemy Row
+        return dict(value._mapping)
+    if isinstance(value, Mapping):
+        return dict(value)
+    return default_serializer(value)
+
+
+_json_encoder = Encoder(enc_hook=_json_enc_hook)
+
+
+def to_json_bytes(
+    data: ModelT | Sequence[ModelT] | Sequence[RowMappingT] | RowMappingT,
+    total: int | None = None,
+    filters: Sequence[FilterTypes | ColumnElement[bool]] | Sequence[FilterTypes] = EMPTY_FILTER,
+    schema_type: type[ModelT | ModelDTOT | RowMappingT] | None = None,
+) -> bytes:
+    """Serialize the :func:`to_schema` result of ``data`` straight to JSON bytes.
+
+    Models and rows are encoded in the same pass that writes the payload, and pydantic
+    schemas are dumped by their cached serializer. Return the bytes in a response with
+    a JSON media type so they aren't encoded a second time.
+
+    Args:
+        data: The return from one of the service calls.
+        total: the total number of rows in the data
+        filters: Collection route filters.
+        schema_type: Optional response schema.
+
+    Returns:
+        The encoded payload.
+    """
+    result = to_schema(data=data, total=total, filters=filters, schema_type=schema_type)
+    if schema_type is not None and issubclass(schema_type, BaseModel):
+        result_type = _get_pagination_type(schema_type) if isinstance(result, OffsetPagination) else schema_type
+        return _get_type_adapter(result_type).dump_json(result)
+    return _json_encoder.encode(result)
+
+
 def to_schema(
     data: ModelT | Sequence[ModelT] | Sequence[RowMappingT] | RowMappingT,
     total: int | None = None,
@@ -119,27 +238,17 @@ def to_schema(
                 obj=data,
                 type=schema_type,
                 from_attributes=True,
-                dec_hook=partial(
-                    _default_deserializer,
-                    type_decoders=[
-                        (lambda x: x is UUID, lambda t, v: t(v.hex)),
-                    ],
-                ),
+                dec_hook=_struct_dec_hook,
             )
         limit_offset = _find_filter(LimitOffset, *filters)
         total = total or len(data)
         limit_offset = limit_offset if limit_offset is not None else LimitOffset(limit=len(data), offset=0)
-        return OffsetPagination[schema_type](  # type: ignore[valid-type]
+        return _get_pagination_type(schema_type)(
             items=convert(
                 obj=data,
-                type=List[schema_type],  # type: ignore[valid-type]
+                type=_get_list_type(schema_type),
                 from_attributes=True,
-                dec_hook=partial(
-                    _default_deserializer,
-                    type_decoders=[
-                        (lambda x: x is UUID, lambda t, v: t(v.hex)),
-                    ],
-                ),
+                dec_hook=_struct_dec_hook,
             ),
             limit=limit_offset.limit,
             offset=limit_offset.offset,
@@ -148,12 +257,12 @@ def to_schema(
 
     if schema_type is not None and issubclass(schema_type, BaseModel):
         if not isinstance(data, Sequence):
-            return TypeAdapter(schema_type).validate_python(data, from_attributes=True)  # type: ignore  # noqa: PGH003
+            return _get_type_adapter(schema_type).validate_python(data, from_attributes=True)  # type: ignore  # noqa: PGH003
         limit_offset = _find_filter(LimitOffset, *filters)
         total = total if total else len(data)
         limit_offset = limit_offset if limit_offset is not None else LimitOffset(limit=len(data), offset=0)
-        return OffsetPagination[schema_type](  # type: ignore[valid-type]
-            items=TypeAdapter(List[schema_type]).validate_python(data, from_attributes=True),  # type: ignore[valid-type]
+        return _get_pagination_type(schema_type)(
+            items=_get_type_adapter(_get_list_type(schema_type)).validate_python(data, from_attributes=True),
             limit=limit_offset.limit,
             offset=limit_offset.offset,
             total=total,
@@ -163,7 +272,7 @@ def to_schema(
     limit_offset = _find_filter(LimitOffset, *filters)
     total = total or len(data)  # type: ignore[arg-type]
     limit_offset = limit_offset if limit_offset is not None else LimitOffset(limit=len(data), offset=0)  # type: ignore[arg-type]
-    return OffsetPagination[ModelT](
+    return _model_pagination_type(
         items=data,  # type: ignore[arg-type]
         limit=limit_offset.limit,
         offset=limit_offset.offset,
@@ -288,3 +397,24 @@ class ResultConverter:
             The list of instances retrieved from the repository.
         """
         return to_schema(data=data, total=total, filters=filters, schema_type=schema_type)
+
+
+    def to_json_bytes(
+        self,
+        data: ModelT | Sequence[ModelT] | Sequence[RowMappingT] | RowMappingT,
+        total: int | None = None,
+        filters: Sequence[FilterTypes | ColumnElement[bool]] | Sequence[FilterTypes] = EMPTY_FILTER,
+        schema_type: type[ModelDTOT | ModelT] | None = None,
+    ) -> bytes:
+        """Convert the object to a response schema and encode it to JSON in a single pass.
+
+        Args:
+            data: The return from one of the service calls.
+            total: the total number of rows in the data
+            schema_type: Collection route filters.
+            filters: Collection route filters.
+
+        Returns:
+            The JSON encoded payload.
+        """
+        return to_json_bytes(data=data, total=total, filters=filters, schema_type=schema_type)
@@ -1,6 +1,7 @@
-from typing import Any
+from typing import Any, Sequence
 from datetime import datetime
 from edgy.core.db.fields.core import FieldFactory, UUIDField
+from sqlalchemy import Column, Index
 from sqlalchemy.dialects.postgresql import UUID
 
 from fimbu.db.types import (
@@ -18,11 +19,43 @@ class GUIDField(UUIDField):
 
 
 class JsonBField(FieldFactory, dict):
+    """JSON field stored as native ``JSONB`` where possible.
+
+    Pass ``gin_index=True`` to create a GIN index on PostgreSQL so that
+    ``JsonContainsFilter`` and ``JsonPathFilter`` can use it. ``gin_ops``
+    selects the operator class, ``jsonb_path_ops`` (the default) is smaller
+    and faster but only supports ``@>``, ``@?`` and ``@@``; use ``jsonb_ops``
+    if key existence operators are needed as well.
+    """
     _type = JsonB
+    field_type = Any
 
     @classmethod
     def get_column_type(cls, **kwargs: Any) -> Any:
-        return JsonB(**kwargs)
+        return JsonB
+
+    @classmethod
+    def get_global_constraints(
+        cls,
+        field_obj: Any,
+        name: str,
+        columns: Sequence[Column],
+        original_fn: Any = None,
+    ) -> Sequence[Any]:
+        constraints = list(original_fn(name, columns))
+        if not getattr(field_obj, "gin_index", False):
+            return constraints
+
+        ops = getattr(field_obj, "gin_ops", None) or "jsonb_path_ops"
+        for column in columns:
+            index = Index(
+                None,
+                column,
+                postgresql_using="gin",
+                postgresql_ops={column.name: ops},
+            )
+            constraints.append(index.ddl_if(dialect="postgresql"))
+        return constraints
     
 
 class DateTimeUTCField(FieldFactory, datetime):
@@ -0,0 +1,530 @@
+"""Runtime index advisor.
+
+When ``DB_ADVISOR_ENABLED`` is set, the read methods of ``AsyncRepository``
+record the *shape* of their filters (fields, operators and ordering, never
+values) together with the query latency. The aggregated shapes are flushed
+every ``DB_ADVISOR_FLUSH_INTERVAL`` seconds to the ``fimbu_filter_shapes``
+table, where ``fimbu db advise`` joins them with the PostgreSQL statistics
+views and ``EXPLAIN`` plans to suggest missing and unused indexes.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import hashlib
+import inspect
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache, wraps
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Iterable, Sequence, TypeVar
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    func,
+    insert,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable
+from structlog import get_logger
+
+from fimbu.conf import settings
+from fimbu.db.filters import (
+    AndFilter,
+    BeforeAfter,
+    CollectionFilter,
+    JsonContainsFilter,
+    JsonPathFilter,
+    NotInCollectionFilter,
+    NotInSearchFilter,
+    OnBeforeAfter,
+    OrderBy,
+    OrFilter,
+    SearchFilter,
+)
+from fimbu.utils import decode_json, encode_json
+
+if TYPE_CHECKING:
+    from edgy import Database
+
+
+__all__ = (
+    "FilterShape",
+    "IndexAdvice",
+    "ShapeRecorder",
+    "TableAdvice",
+    "advise",
+    "filter_shape",
+    "get_shape_recorder",
+    "observe_filters",
+)
+
+
+logger = get_logger()
+_preparer = postgresql.dialect().identifier_preparer
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+EQUALITY_OPS = {"eq", "exact", "iexact", "isnull", "in"}
+RANGE_OPS = {"lt", "lte", "gt", "gte", "range"}
+TRIGRAM_OPS = {"like", "ilike", "contains", "icontains"}
+JSON_OPS = {"@>", "@?"}
+
+filter_shapes = Table(
+    "fimbu_filter_shapes",
+    MetaData(),
+    Column("key", String(64), primary_key=True),
+    Column("table_name", String(255), nullable=False),
+    Column("shape", Text, nullable=False),
+    Column("calls", BigInteger, nullable=False),
+    Column("total_ms", Float, nullable=False),
+    Column("max_ms", Float, nullable=False),
+    Column("last_seen", DateTime(timezone=True), nullable=False),
+)
+"""Aggregated filter shapes, one row per table and shape."""
+
+
+@dataclass(frozen=True)
+class FilterShape:
+    """Fields and operators of a filtered query, without the values."""
+
+    table: str
+    """Name of the queried table."""
+    predicates: tuple[tuple[str, str], ...] = ()
+    """``(field, operator)`` pairs, sorted."""
+    order_by: tuple[tuple[str, str], ...] = ()
+    """``(field, direction)`` pairs, in order."""
+
+    @property
+    def key(self) -> str:
+        """Stable identifier of the shape, shared by every process."""
+        return hashlib.sha1(f"{self.table}:{self.to_json()}".encode()).hexdigest()
+
+    def describe(self) -> str:
+        """Render the shape as a pseudo ``WHERE ... ORDER BY ...`` clause."""
+        where = " AND ".join(f"{name} {op}" for name, op in self.predicates) or "-"
+        if self.order_by:
+            where += " ORDER BY " + ", ".join(f"{name} {direction}" for name, direction in self.order_by)
+        return where
+
+    def to_json(self) -> str:
+        return encode_json({"predicates": self.predicates, "order_by": self.order_by})
+
+    @classmethod
+    def from_json(cls, table: str, data: str) -> FilterShape:
+        shape = decode_json(data)
+        return cls(
+            table=table,
+            predicates=tuple(tuple(p) for p in shape["predicates"]),
+            order_by=tuple(tuple(o) for o in shape["order_by"]),
+        )
+
+
+def _predicates(filter_: Any) -> Iterable[tuple[str, str]]:
+    if isinstance(filter_, (BeforeAfter, OnBeforeAfter)):
+        yield filter_.field_name, "range"
+    elif isinstance(filter_, NotInCollectionFilter):
+        yield filter_.field_name, "not_in"
+    elif isinstance(filter_, CollectionFilter):
+        yield filter_.field_name, "in"
+    elif isinstance(filter_, SearchFilter):
+        yield filter_.field_name, "ilike" if filter_.ignore_case else "like"
+    elif isinstance(filter_, NotInSearchFilter):
+        yield filter_.field_name, "not_like"
+    elif isinstance(filter_, JsonContainsFilter):
+        yield filter_.field_name, "@>"
+    elif isinstance(filter_, JsonPathFilter):
+        yield filter_.field_name, "@?"
+    elif isinstance(filter_, AndFilter):
+        yield from _predicates(filter_.left_op)
+        yield from _predicates(filter_.right_op)
+    elif isinstance(filter_, OrFilter):
+        yield from ((name, f"or:{op}") for name, op in _predicates(filter_.left_op))
+        yield from ((name, f"or:{op}") for name, op in _predicates(filter_.right_op))
+
+
+def filter_shape(table: str, filters: Sequence[Any], lookups: Iterable[str] = ()) -> FilterShape:
+    """Build the shape of a query from repository filters and lookup keyword names.
+
+    Args:
+        table: Name of the queried table.
+        filters: Repository filter types.
+        lookups: Keyword lookups, e.g. ``email`` or ``created_at__gte``.
+    """
+    predicates = {predicate for filter_ in filters for predicate in _predicates(filter_)}
+    for lookup in lookups:
+        name, _, op = lookup.partition("__")
+        predicates.add((name, op or "eq"))
+    order_by = tuple((f.field_name, f.sort_order) for f in filters if isinstance(f, OrderBy))
+    return FilterShape(table=table, predicates=tuple(sorted(predicates)), order_by=order_by)
+
+
+@dataclass
+class _ShapeStats:
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+
+class ShapeRecorder:
+    """Aggregate filter shapes in process and flush them periodically."""
+
+    def __init__(self, flush_interval: float = 30.0) -> None:
+        self.flush_interval = flush_interval
+        self._stats: dict[FilterShape, _ShapeStats] = {}
+        self._last_flush = time.monotonic()
+        self._flushing: asyncio.Task[None] | None = None
+        self._table_created = False
+
+    def record(self, shape: FilterShape, seconds: float, database: Database) -> None:
+        """Account one query of ``shape`` that took ``seconds``."""
+        stats = self._stats.setdefault(shape, _ShapeStats())
+        elapsed_ms = seconds * 1000
+        stats.calls += 1
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+        if time.monotonic() - self._last_flush >= self.flush_interval and self._flushing is None:
+            self._last_flush = time.monotonic()
+            self._flushing = asyncio.create_task(self._flush_in_background(database))
+
+    async def _flush_in_background(self, database: Database) -> None:
+        try:
+            await self.flush(database)
+        except Exception:  # noqa: BLE001
+            await logger.aexception("Failed to flush filter shapes.")
+        finally:
+            self._flushing = None
+
+    async def flush(self, database: Database) -> None:
+        """Add the shapes recorded since the last flush to ``fimbu_filter_shapes``."""
+        stats, self._stats = self._stats, {}
+        if not stats:
+            return
+        if not self._table_created:
+            await database.execute(CreateTable(filter_shapes, if_not_exists=True))
+            self._table_created = True
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for shape, shape_stats in stats.items():
+            await self._upsert(database, shape, shape_stats, now)
+
+    async def _upsert(
+        self, database: Database, shape: FilterShape, shape_stats: _ShapeStats, now: datetime.datetime
+    ) -> None:
+        """Add the stats of a shape to its row, a single statement where the dialect has one.
+
+        Workers flushing a new shape at the same time must not insert it twice.
+        """
+        dialect = database.url.dialect
+        values = {
+            "key": shape.key,
+            "table_name": shape.table,
+            "shape": shape.to_json(),
+            "calls": shape_stats.calls,
+            "total_ms": shape_stats.total_ms,
+            "max_ms": shape_stats.max_ms,
+            "last_seen": now,
+        }
+        greatest = func.greatest if dialect in {"postgresql", "postgres"} else func.max
+
+        if dialect in {"postgresql", "postgres", "sqlite"}:
+            statement = (postgresql.insert if dialect != "sqlite" else sqlite.insert)(filter_shapes).values(**values)
+            await database.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[filter_shapes.c.key],
+                    set_={
+                        "calls": filter_shapes.c.calls + statement.excluded.calls,
+                        "total_ms": filter_shapes.c.total_ms + statement.excluded.total_ms,
+                        "max_ms": greatest(filter_shapes.c.max_ms, statement.excluded.max_ms),
+                        "last_seen": statement.excluded.last_seen,
+                    },
+                )
+            )
+            return
+
+        statement = (
+            update(filter_shapes)
+            .where(filter_shapes.c.key == shape.key)
+            .values(
+                calls=filter_shapes.c.calls + shape_stats.calls,
+                total_ms=filter_shapes.c.total_ms + shape_stats.total_ms,
+                max_ms=greatest(filter_shapes.c.max_ms, shape_stats.max_ms),
+                last_seen=now,
+            )
+        )
+        if await database.execute(statement):
+            return
+        try:
+            await database.execute(insert(filter_shapes).values(**values))
+        except IntegrityError:
+            # inserted by another worker meanwhile
+            await database.execute(statement)
+
+
+@lru_cache
+def get_shape_recorder() -> ShapeRecorder | None:
+    """Get the process shape recorder, ``None`` unless ``DB_ADVISOR_ENABLED`` is set."""
+    if not getattr(settings, "DB_ADVISOR_ENABLED", False):
+        return None
+    return ShapeRecorder(flush_interval=settings.DB_ADVISOR_FLUSH_INTERVAL)
+
+
+_current_filters: ContextVar[list[Any] | None] = ContextVar("fimbu_current_filters", default=None)
+
+
+def note_filters(filters: Sequence[Any]) -> None:
+    """Remember the filters applied by the repository method being observed."""
+    current = _current_filters.get()
+    if current is not None:
+        current.extend(filters)
+
+
+def observe_filters(method: F) -> F:
+    """Record the filter shape and latency of a repository read method."""
+    signature = inspect.signature(method)
+    lookups_name = next(
+        (p.name for p in signature.parameters.values() if p.kind is inspect.Parameter.VAR_KEYWORD),
+        None,
+    )
+
+    @wraps(method)
+    async def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        recorder = get_shape_recorder()
+        if recorder is None:
+            return await method(self, *args, **kwargs)
+
+        filters: list[Any] = []
+        token = _current_filters.set(filters)
+        started = time.perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_filters.reset(token)
+            lookups = signature.bind_partial(self, *args, **kwargs).arguments.get(lookups_name, {}) if lookups_name else {}
+            recorder.record(
+                filter_shape(self.model_type.table.name, filters, lookups),
+                elapsed,
+                self.model_type.database,
+            )
+
+    return wrapper  # type: ignore[return-value]
+
+
+@dataclass
+class IndexAdvice:
+    """Advice for one recorded filter shape."""
+
+    shape: FilterShape
+    """The recorded shape."""
+    calls: int
+    """Number of recorded queries."""
+    avg_ms: float
+    """Average latency in milliseconds."""
+    max_ms: float
+    """Highest latency in milliseconds."""
+    plan: str | None = None
+    """Top ``EXPLAIN`` node for the table, e.g. ``Seq Scan`` or ``Index Scan using ix_...``."""
+    index: str | None = None
+    """Existing index whose leading column matches the shape."""
+    suggestion: str | None = None
+    """Suggested ``CREATE INDEX`` statement."""
+
+
+@dataclass
+class TableAdvice:
+    """Statistics and advice for one table."""
+
+    table: str
+    """Name of the table."""
+    rows: int = 0
+    """Estimated live rows."""
+    total_size: int = 0
+    """Table size including indexes and TOAST, in bytes."""
+    seq_scan: int = 0
+    """Sequential scans since statistics were reset."""
+    idx_scan: int = 0
+    """Index scans since statistics were reset."""
+    indexes: list[dict[str, Any]] = field(default_factory=list)
+    """Indexes with their ``columns``, ``scans`` and ``size``."""
+    shapes: list[IndexAdvice] = field(default_factory=list)
+    """Recorded shapes, slowest in total first."""
+    unused: list[str] = field(default_factory=list)
+    """``DROP INDEX`` statements for indexes never scanned."""
+
+
+_INDEXES_SQL = text(
+    "SELECT s.indexrelname AS name, s.idx_scan AS scans, pg_relation_size(s.indexrelid) AS size, "
+    "ix.indisunique AS is_unique, ix.indisprimary AS is_primary, am.amname AS method, "
+    "ARRAY(SELECT a.attname FROM unnest(ix.indkey) WITH ORDINALITY AS k(attnum, n) "
+    "JOIN pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = k.attnum ORDER BY k.n) AS columns "
+    "FROM pg_stat_user_indexes s "
+    "JOIN pg_index ix ON ix.indexrelid = s.indexrelid "
+    "JOIN pg_class c ON c.oid = s.indexrelid "
+    "JOIN pg_am am ON am.oid = c.relam "
+    "WHERE s.relname = :table"
+)
+_TABLE_SQL = text(
+    "SELECT n_live_tup, pg_total_relation_size(relid), seq_scan, COALESCE(idx_scan, 0) "
+    "FROM pg_stat_user_tables WHERE relname = :table"
+)
+
+
+def _index_columns(shape: FilterShape) -> list[str]:
+    """Order the shape columns the way a btree wants them: equality, then range, then sort."""
+    equality = [name for name, op in shape.predicates if op in EQUALITY_OPS]
+    ranges = [name for name, op in shape.predicates if op in RANGE_OPS]
+    columns = list(dict.fromkeys(equality + ranges[:1]))
+    if not ranges:
+        columns += [name for name, _ in shape.order_by if name not in columns]
+    return columns
+
+
+def _suggest(shape: FilterShape) -> tuple[list[str], str | None]:
+    table = _preparer.quote(shape.table)
+    json_fields = [name for name, op in shape.predicates if op in JSON_OPS]
+    if json_fields:
+        column = json_fields[0]
+        return [column], (
+            f"CREATE INDEX CONCURRENTLY ix_{shape.table}_{column}_gin ON {table} "
+            f"USING gin ({_preparer.quote(column)} jsonb_path_ops)"
+        )
+
+    columns = _index_columns(shape)
+    if columns:
+        quoted = ", ".join(_preparer.quote(name) for name in columns)
+        return columns, f"CREATE INDEX CONCURRENTLY ix_{shape.table}_{'_'.join(columns)} ON {table} ({quoted})"
+
+    like_fields = [name for name, op in shape.predicates if op in TRIGRAM_OPS]
+    if like_fields:
+        column = like_fields[0]
+        return [column], (
+            f"CREATE INDEX CONCURRENTLY ix_{shape.table}_{column}_trgm ON {table} "
+            f"USING gin ({_preparer.quote(column)} gin_trgm_ops)"
+        )
+    return [], None
+
+
+def _explain_sql(shape: FilterShape) -> str:
+    clauses = []
+    for number, (name, op) in enumerate(shape.predicates, start=1):
+        column = _preparer.quote(name)
+        op = op.removeprefix("or:")
+        if op in ("in", "not_in"):
+            clauses.append(f"{column} {'<>' if op == 'not_in' else '='} ANY(${number})")
+        elif op == "range":
+            clauses.append(f"{column} >= ${number}")
+        elif op in RANGE_OPS:
+            clauses.append(f"{column} {dict(lt='<', lte='<=', gt='>', gte='>=').get(op, '>=')} ${number}")
+        elif op in TRIGRAM_OPS or op in ("not_like",):
+            clauses.append(f"{column} {'NOT ' if op == 'not_like' else ''}{'ILIKE' if op.startswith('i') else 'LIKE'} ${number}")
+        elif op in JSON_OPS:
+            clauses.append(f"{column} {op} ${number}")
+        elif op == "isnull":
+            clauses.append(f"{column} IS NULL")
+        else:
+            clauses.append(f"{column} = ${number}")
+
+    sql = f"SELECT * FROM {_preparer.quote(shape.table)}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if shape.order_by:
+        sql += " ORDER BY " + ", ".join(f"{_preparer.quote(name)} {direction.upper()}" for name, direction in shape.order_by)
+    return sql + " LIMIT 100"
+
+
+def _plan_node(plan: dict[str, Any], table: str) -> str | None:
+    """Return the first scan node touching ``table``."""
+    if plan.get("Relation Name") == table:
+        node = plan["Node Type"]
+        return f"{node} using {plan['Index Name']}" if "Index Name" in plan else node
+    for child in plan.get("Plans", []):
+        if (node := _plan_node(child, table)) is not None:
+            return node
+    return None
+
+
+async def _explain(database: Database, shape: FilterShape) -> str | None:
+    try:
+        rows = await database.fetch_all(text(f"EXPLAIN (GENERIC_PLAN, FORMAT JSON) {_explain_sql(shape)}"))
+    except Exception:  # noqa: BLE001
+        # GENERIC_PLAN needs PostgreSQL 16, operators may not apply to the column type
+        return None
+    plan = rows[0][0]
+    plan = decode_json(plan) if isinstance(plan, (str, bytes)) else plan
+    return _plan_node(plan[0]["Plan"], shape.table)
+
+
+async def advise(database: Database, tables: Sequence[str] | None = None, min_calls: int = 1) -> list[TableAdvice]:
+    """Join the recorded filter shapes with the PostgreSQL statistics.
+
+    Args:
+        database: The PostgreSQL database the shapes were recorded against.
+        tables: Only advise on these tables.
+        min_calls: Ignore shapes recorded fewer times.
+
+    Returns:
+        One report per table, in decreasing order of recorded query time.
+    """
+    await database.execute(CreateTable(filter_shapes, if_not_exists=True))
+    query = (
+        select(filter_shapes)
+        .where(filter_shapes.c.calls >= min_calls)
+        .order_by(filter_shapes.c.total_ms.desc())
+    )
+    if tables:
+        query = query.where(filter_shapes.c.table_name.in_(tables))
+
+    reports: dict[str, TableAdvice] = {}
+    for row in await database.fetch_all(query):
+        record = row._mapping
+        table = record["table_name"]
+        report = reports.get(table)
+        if report is None:
+            report = reports[table] = await _table_advice(database, table)
+
+        shape = FilterShape.from_json(table, record["shape"])
+        advice = IndexAdvice(
+            shape=shape,
+            calls=record["calls"],
+            avg_ms=record["total_ms"] / record["calls"],
+            max_ms=record["max_ms"],
+            plan=await _explain(database, shape),
+        )
+        columns, suggestion = _suggest(shape)
+        advice.index = next(
+            (index["name"] for index in report.indexes if columns and index["columns"][:1] == columns[:1]),
+            None,
+        )
+        if advice.index is None and (advice.plan is None or "Seq Scan" in advice.plan):
+            advice.suggestion = suggestion
+        report.shapes.append(advice)
+
+    return list(reports.values())
+
+
+async def _table_advice(database: Database, table: str) -> TableAdvice:
+    report = TableAdvice(table=table)
+    stats = await database.fetch_one(_TABLE_SQL.bindparams(table=table))
+    if stats is not None:
+        report.rows, report.total_size, report.seq_scan, report.idx_scan = stats
+
+    for row in await database.fetch_all(_INDEXES_SQL.bindparams(table=table)):
+        index = dict(row._mapping)
+        report.indexes.append(index)
+        if not index["scans"] and not index["is_unique"] and not index["is_primary"]:
+            report.unused.append(f"DROP INDEX CONCURRENTLY {_preparer.quote(index['name'])}")
+    return report
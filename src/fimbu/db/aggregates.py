@@ -0,0 +1,105 @@
+"""Aggregate datastructures."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from sqlalchemy import func
+
+from fimbu.db.exceptions import RepositoryError
+
+
+if TYPE_CHECKING:
+    from typing_extensions import TypeAlias
+    from sqlalchemy import ColumnElement, Table
+
+
+__all__ = (
+    "Aggregate",
+    "AggregateTypes",
+    "Avg",
+    "Count",
+    "Max",
+    "Min",
+    "Sum",
+)
+
+
+AggregateTypes: TypeAlias = "Avg | Count | Max | Min | Sum"
+"""Aggregate type alias of the types supported by ``AsyncRepository.aggregate``."""
+
+
+@dataclass
+class Aggregate:
+    """Data required to construct an aggregate ``SELECT`` expression."""
+
+    field_name: str | None = None
+    """Name of the model attribute to aggregate."""
+    distinct: bool = False
+    """Aggregate over distinct values only."""
+
+    function: ClassVar[str]
+    """Name of the SQL aggregate function."""
+
+    def get_expression(self, table: Table) -> ColumnElement[Any]:
+        """Build the aggregate expression against ``table``.
+
+        Args:
+            table: The table of the queried model.
+
+        Returns:
+            The aggregate column expression.
+        """
+        if self.field_name is None:
+            raise RepositoryError(f"{self.__class__.__name__} requires a field name.")
+        try:
+            column = table.columns[self.field_name]
+        except KeyError as exc:
+            raise RepositoryError(f"Unknown field '{self.field_name}' for aggregate.") from exc
+
+        if self.distinct:
+            column = column.distinct()
+        return getattr(func, self.function)(column)
+
+
+@dataclass
+class Count(Aggregate):
+    """Data required to construct a ``COUNT(...)`` expression.
+
+    Counts rows when no field name is given.
+    """
+
+    function: ClassVar[str] = "count"
+
+    def get_expression(self, table: Table) -> ColumnElement[Any]:
+        if self.field_name is None:
+            return func.count()
+        return super().get_expression(table)
+
+
+@dataclass
+class Sum(Aggregate):
+    """Data required to construct a ``SUM(...)`` expression."""
+
+    function: ClassVar[str] = "sum"
+
+
+@dataclass
+class Avg(Aggregate):
+    """Data required to construct an ``AVG(...)`` expression."""
+
+    function: ClassVar[str] = "avg"
+
+
+@dataclass
+class Min(Aggregate):
+    """Data required to construct a ``MIN(...)`` expression."""
+
+    function: ClassVar[str] = "min"
+
+
+@dataclass
+class Max(Aggregate):
+    """Data required to construct a ``MAX(...)`` expression."""
+
+    function: ClassVar[str] = "max"
@@ -0,0 +1,265 @@
+"""Throttled, resumable batch backfills.
+
+A backfill walks a table in primary key order, ``batch_size`` rows at a time,
+applies an update to each chunk and commits it together with its checkpoint
+in the ``fimbu_backfills`` table. Re-running a backfill with the same name
+resumes after the last committed key.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import inspect
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Mapping, Union
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    MetaData,
+    String,
+    Table,
+    Text,
+    bindparam,
+    delete,
+    insert,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.schema import CreateTable
+
+from fimbu.db.exceptions import RepositoryError
+from fimbu.utils import decode_json, encode_json
+
+if TYPE_CHECKING:
+    from typing_extensions import TypeAlias
+    from edgy import Database
+    from sqlalchemy import RowMapping, Select
+
+
+__all__ = (
+    "Backfill",
+    "BackfillReport",
+    "BackfillThrottle",
+    "BackfillUpdate",
+    "backfill_checkpoints",
+)
+
+
+BackfillUpdate: TypeAlias = Union[str, Mapping[str, Any], Callable[["list[RowMapping]"], Any]]
+"""Chunk update, one of:
+
+- raw SQL using the expanding ``:keys`` parameter, e.g. ``UPDATE t SET a = b WHERE id IN :keys``
+- a mapping of column values for an ``UPDATE ... WHERE key IN (...)``
+- a callable receiving the chunk rows, sync or async
+"""
+
+backfill_metadata = MetaData()
+
+backfill_checkpoints = Table(
+    "fimbu_backfills",
+    backfill_metadata,
+    Column("name", String(255), primary_key=True),
+    Column("table_name", String(255), nullable=False),
+    Column("last_key", Text, nullable=True),
+    Column("rows_done", BigInteger, nullable=False, default=0),
+    Column("started_at", DateTime(timezone=True), nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+    Column("finished_at", DateTime(timezone=True), nullable=True),
+)
+"""Checkpoint table, one row per named backfill."""
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+@dataclass
+class BackfillReport:
+    """Progress of a backfill run."""
+
+    name: str
+    """Name of the backfill."""
+    rows: int = 0
+    """Rows processed, including the ones of previous runs."""
+    chunks: int = 0
+    """Chunks committed by this run."""
+    last_key: Any = None
+    """Last committed primary key value."""
+    resumed: bool = False
+    """Whether the run resumed from a checkpoint."""
+    finished: bool = False
+    """Whether the whole table has been walked."""
+
+
+@dataclass
+class BackfillThrottle:
+    """Adaptive pause between chunks."""
+
+    rows_per_second: float | None = None
+    """Target write rate, chunks are spaced out to stay under it."""
+    max_replication_lag: float | None = None
+    """Seconds of replica replay lag to wait out before the next chunk, PostgreSQL only."""
+    max_sleep: float = 30.0
+    """Upper bound for a single pause, in seconds."""
+
+    async def wait(self, database: Database, rows: int, elapsed: float) -> None:
+        """Pause after a chunk of ``rows`` that took ``elapsed`` seconds."""
+        if self.rows_per_second:
+            delay = rows / self.rows_per_second - elapsed
+            if delay > 0:
+                await asyncio.sleep(min(delay, self.max_sleep))
+
+        if self.max_replication_lag is None or database.url.dialect not in {"postgresql", "postgres"}:
+            return
+        while (lag := await self.replication_lag(database)) > self.max_replication_lag:
+            await asyncio.sleep(min(lag, self.max_sleep))
+
+    @staticmethod
+    async def replication_lag(database: Database) -> float:
+        """Return the largest replay lag of the connected replicas, in seconds."""
+        lag = await database.fetch_val(
+            text("SELECT COALESCE(EXTRACT(EPOCH FROM MAX(replay_lag)), 0) FROM pg_stat_replication")
+        )
+        return float(lag or 0)
+
+
+class Backfill:
+    """Walk a select in keyset ordered chunks and apply ``update`` to each one."""
+
+    def __init__(
+        self,
+        name: str,
+        database: Database,
+        statement: Select[Any],
+        key: Column[Any],
+        update: BackfillUpdate,
+        batch_size: int = 1_000,
+        throttle: BackfillThrottle | None = None,
+        on_progress: Callable[[BackfillReport], Any] | None = None,
+    ) -> None:
+        """Prepare a backfill.
+
+        Args:
+            name: Unique name of the backfill, used as checkpoint key.
+            database: Database the table lives in.
+            statement: Filtered select of the rows to walk, it must include ``key``.
+            key: Single column primary key of the table.
+            update: Update applied to each chunk, see :data:`BackfillUpdate`.
+            batch_size: Number of rows per chunk.
+            throttle: Pause policy between chunks.
+            on_progress: Called with the report after each committed chunk.
+        """
+        if batch_size < 1:
+            raise RepositoryError("batch_size must be a positive integer.")
+        self.name = name
+        self.database = database
+        self.statement = statement
+        self.key = key
+        self.update = update
+        self.batch_size = batch_size
+        self.throttle = throttle or BackfillThrottle()
+        self.on_progress = on_progress
+
+    async def run(self, restart: bool = False) -> BackfillReport:
+        """Run, or resume, the backfill until the table is exhausted.
+
+        Args:
+            restart: Discard the checkpoint and start from the first row.
+
+        Returns:
+            The final report.
+        """
+        report = await self._load_checkpoint(restart)
+        if report.finished:
+            return report
+
+        while True:
+            started = time.monotonic()
+            statement = self.statement.order_by(self.key).limit(self.batch_size)
+            if report.last_key is not None:
+                statement = statement.where(self.key > report.last_key)
+
+            rows = [row._mapping for row in await self.database.fetch_all(statement)]
+            if not rows:
+                break
+
+            keys = [row[self.key.name] for row in rows]
+            async with self.database.transaction():
+                await self._apply(rows, keys)
+                await self.database.execute(
+                    update(backfill_checkpoints)
+                    .where(backfill_checkpoints.c.name == self.name)
+                    .values(
+                        last_key=encode_json(keys[-1]),
+                        rows_done=backfill_checkpoints.c.rows_done + len(rows),
+                        updated_at=_utcnow(),
+                    )
+                )
+
+            report.rows += len(rows)
+            report.chunks += 1
+            report.last_key = keys[-1]
+            if self.on_progress is not None:
+                self.on_progress(report)
+            if len(rows) < self.batch_size:
+                break
+            await self.throttle.wait(self.database, len(rows), time.monotonic() - started)
+
+        await self.database.execute(
+            update(backfill_checkpoints)
+            .where(backfill_checkpoints.c.name == self.name)
+            .values(finished_at=_utcnow(), updated_at=_utcnow())
+        )
+        report.finished = True
+        return report
+
+    async def _apply(self, rows: list[RowMapping], keys: list[Any]) -> None:
+        if isinstance(self.update, str):
+            statement = text(self.update).bindparams(bindparam("keys", expanding=True))
+            await self.database.execute(statement, {"keys": keys})
+        elif isinstance(self.update, Mapping):
+            await self.database.execute(
+                update(self.key.table).where(self.key.in_(keys)).values(**self.update)
+            )
+        else:
+            result = self.update(rows)
+            if inspect.isawaitable(result):
+                await result
+
+    async def _load_checkpoint(self, restart: bool) -> BackfillReport:
+        await self.database.execute(CreateTable(backfill_checkpoints, if_not_exists=True))
+        if restart:
+            await self.database.execute(delete(backfill_checkpoints).where(backfill_checkpoints.c.name == self.name))
+
+        row = await self.database.fetch_one(
+            select(backfill_checkpoints).where(backfill_checkpoints.c.name == self.name)
+        )
+        if row is None:
+            now = _utcnow()
+            await self.database.execute(
+                insert(backfill_checkpoints).values(
+                    name=self.name,
+                    table_name=self.key.table.name,
+                    rows_done=0,
+                    started_at=now,
+                    updated_at=now,
+                )
+            )
+            return BackfillReport(name=self.name)
+
+        checkpoint = row._mapping
+        if checkpoint["table_name"] != self.key.table.name:
+            raise RepositoryError(
+                f"Backfill '{self.name}' was started on table '{checkpoint['table_name']}'."
+            )
+        return BackfillReport(
+            name=self.name,
+            rows=checkpoint["rows_done"],
+            last_key=None if checkpoint["last_key"] is None else decode_json(checkpoint["last_key"]),
+            resumed=True,
+            finished=checkpoint["finished_at"] is not None,
+        )
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import sys
+from contextlib import AsyncExitStack
+
+import anyio
+from click import argument, echo, group, option
+from sqlalchemy import text
+
+from fimbu.db.advisor import advise as advise_indexes
+from fimbu.db.exceptions import RepositoryError
+from fimbu.db.partitioning import maintain_partitions
+from fimbu.db.repository import AsyncRepository
+from fimbu.db.retention import apply_retention
+from fimbu.db.sharding import get_shard_database, get_shard_spec, rebalance as rebalance_shards
+from fimbu.db.utils import get_db_connection
+
+
+__all__ = ["database_group"]
+
+
+@group(name="db")
+def database_group() -> None:
+    """Manage the database."""
+
+
+@database_group.command(name="partitions", help="Create upcoming partitions and expire old ones.")
+@option("--model", "model_names", multiple=True, help="Only maintain these models.")
+def partitions(model_names: tuple[str, ...]) -> None:
+    """Create upcoming partitions and expire old ones."""
+    db, registry = get_db_connection()
+    models = [
+        model for name, model in registry.models.items()
+        if not model_names or name in model_names
+    ]
+
+    async def _maintain() -> None:
+        async with db:
+            reports = await maintain_partitions(models)
+
+        if not reports:
+            echo("No partitioned models found.")
+        for report in reports:
+            echo(f"{report.table}: {len(report.created)} created, {len(report.detached)} expired.")
+            for name in report.created:
+                echo(f"  + {name}")
+            for name in report.detached:
+                echo(f"  - {name}")
+
+    anyio.run(_maintain)
+
+
+@database_group.command(name="purge", help="Delete rows past their model retention policy.")
+@option("--model", "model_names", multiple=True, help="Only purge these models.")
+def purge(model_names: tuple[str, ...]) -> None:
+    """Delete rows past their model retention policy."""
+    db, registry = get_db_connection()
+    models = [
+        model for name, model in registry.models.items()
+        if not model_names or name in model_names
+    ]
+
+    async def _purge() -> None:
+        async with db:
+            reports = await apply_retention(models)
+
+        if not reports:
+            echo("No models with a retention policy found.")
+        for report in reports:
+            action = "archived" if report.archived else "deleted"
+            echo(f"{report.table}: {report.rows} rows {action} in {report.batches} batches, {report.seconds:.2f}s.")
+
+    anyio.run(_purge)
+
+
+@database_group.command(name="backfill", help="Update a table in throttled, resumable chunks.")
+@argument("name")
+@option("--model", "model_name", required=True, help="Name of the model to walk.")
+@option("--sql", help="Statement run per chunk, using :keys for the chunk primary keys.")
+@option("--set", "assignments", multiple=True, help="Column assignment as column=SQL expression.")
+@option("--batch-size", default=1000, show_default=True, help="Rows per chunk.")
+@option("--rows-per-second", type=float, default=None, help="Target write rate.")
+@option("--max-lag", type=float, default=None, help="Replica lag in seconds to wait out between chunks.")
+@option("--restart", is_flag=True, default=False, help="Ignore the checkpoint and start over.")
+def backfill(
+    name: str,
+    model_name: str,
+    sql: str | None,
+    assignments: tuple[str, ...],
+    batch_size: int,
+    rows_per_second: float | None,
+    max_lag: float | None,
+    restart: bool,
+) -> None:
+    """Update a table in throttled, resumable chunks."""
+    if bool(sql) == bool(assignments):
+        echo("Error: pass either --sql or --set.", err=True)
+        sys.exit(1)
+
+    db, registry = get_db_connection()
+    if model_name not in registry.models:
+        echo(f"Error: unknown model '{model_name}'.", err=True)
+        sys.exit(1)
+
+    update = sql
+    if assignments:
+        update = {}
+        for assignment in assignments:
+            column, _, expression = assignment.partition("=")
+            update[column.strip()] = text(expression.strip())
+
+    def _progress(report) -> None:
+        echo(f"{report.name}: {report.rows} rows, last key {report.last_key}")
+
+    async def _backfill() -> None:
+        async with db:
+            repository = AsyncRepository(registry.models[model_name])
+            try:
+                report = await repository.backfill(
+                    name,
+                    update,
+                    batch_size=batch_size,
+                    rows_per_second=rows_per_second,
+                    max_replication_lag=max_lag,
+                    restart=restart,
+                    on_progress=_progress,
+                )
+            except RepositoryError as e:
+                echo(f"Error: {e}", err=True)
+                sys.exit(1)
+
+        if report.resumed and not report.chunks:
+            echo(f"{report.name} already finished, use --restart to run it again.")
+        else:
+            echo(f"{report.name} finished: {report.rows} rows.")
+
+    anyio.run(_backfill)
+
+
+@database_group.command(name="rebalance", help="Move the rows of a sharded model to their shard.")
+@option("--model", "model_name", required=True, help="Name of the sharded model.")
+@option("--from", "sources", multiple=True, help="Shards to walk, defaults to the model shards. Name removed shards to drain them.")
+@option("--batch-size", default=1000, show_default=True, help="Rows read per batch.")
+@option("--dry-run", is_flag=True, default=False, help="Only count the rows that would move.")
+def rebalance(model_name: str, sources: tuple[str, ...], batch_size: int, dry_run: bool) -> None:
+    """Move the rows of a sharded model to their shard."""
+    db, registry = get_db_connection()
+    model = registry.models.get(model_name)
+    if model is None or get_shard_spec(model) is None:
+        echo(f"Error: '{model_name}' is not a sharded model.", err=True)
+        sys.exit(1)
+
+    databases = {get_shard_database(name) for name in (*get_shard_spec(model).shards, *sources)}
+
+    async def _rebalance() -> None:
+        async with AsyncExitStack() as stack:
+            for database in databases | {db}:
+                await stack.enter_async_context(database)
+            report = await rebalance_shards(model, sources or None, batch_size=batch_size, dry_run=dry_run)
+
+        verb = "would move" if dry_run else "moved"
+        echo(f"{report.table}: {report.scanned} rows scanned, {sum(report.moved.values())} {verb}.")
+        for label, rows in sorted(report.moved.items()):
+            echo(f"  {label}: {rows}")
+
+    anyio.run(_rebalance)
+
+
+def _size(num_bytes: int) -> str:
+    for unit in ("B", "kB", "MB", "GB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
+
+
+@database_group.command(name="advise", help="Suggest missing and unused indexes from the recorded filter shapes.")
+@option("--table", "tables", multiple=True, help="Only advise on these tables.")
+@option("--min-calls", default=1, show_default=True, help="Ignore shapes recorded fewer times.")
+def advise(tables: tuple[str, ...], min_calls: int) -> None:
+    """Suggest missing and unused indexes from the recorded filter shapes."""
+    db, _ = get_db_connection()
+    if db.url.dialect not in {"postgresql", "postgres"}:
+        echo("Error: the index advisor requires PostgreSQL.", err=True)
+        sys.exit(1)
+
+    async def _advise() -> None:
+        async with db:
+            reports = await advise_indexes(db, tables, min_calls=min_calls)
+
+        if not reports:
+            echo("No filter shapes recorded, set DB_ADVISOR_ENABLED = True and run the application.")
+        for report in reports:
+            echo(
+                f"{report.table}: ~{report.rows} rows, {_size(report.total_size)}, "
+                f"{report.seq_scan} seq scans / {report.idx_scan} index scans"
+            )
+            for index in report.indexes:
+                echo(f"  index {index['name']} ({', '.join(index['columns'])}): {index['scans']} scans, {_size(index['size'])}")
+            for shape in report.shapes:
+                echo(
+                    f"  {shape.shape.describe()}: {shape.calls} calls, "
+                    f"avg {shape.avg_ms:.1f} ms, max {shape.max_ms:.1f} ms, plan {shape.plan or 'n/a'}"
+                )
+                if shape.suggestion:
+                    echo(f"    suggest: {shape.suggestion};")
+            for statement in report.unused:
+                echo(f"  unused: {statement};")
+
+    anyio.run(_advise)
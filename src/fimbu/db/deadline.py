@@ -0,0 +1,134 @@
+"""Per-request database deadlines.
+
+A deadline is an absolute point in time stored in a context variable, set by
+:class:`fimbu.middleware.deadline.DeadlineMiddleware` for HTTP requests or by
+:func:`deadline` around any other unit of work::
+
+    with deadline(2.5):
+        users = await repository.list()
+
+Repository calls made under a deadline are cancelled once it passes. On
+PostgreSQL they also run in a transaction with ``SET LOCAL statement_timeout``
+set to the remaining time, so the server aborts a runaway query and the pool
+connection is given back instead of being held until it completes.
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Iterator, TypeVar
+
+import anyio
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from fimbu.db.exceptions import DeadlineExceeded
+
+if TYPE_CHECKING:
+    from edgy import Database
+
+
+__all__ = (
+    "deadline",
+    "deadline_bound",
+    "get_deadline",
+    "run_within_deadline",
+    "time_remaining",
+)
+
+
+T = TypeVar("T")
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+QUERY_CANCELED = "57014"
+"""SQLSTATE of a query cancelled by ``statement_timeout``."""
+
+_deadline: ContextVar[float | None] = ContextVar("fimbu_deadline", default=None)
+
+
+def get_deadline() -> float | None:
+    """Return the current deadline as a ``time.monotonic()`` value, if any."""
+    return _deadline.get()
+
+
+def time_remaining() -> float | None:
+    """Return the seconds left before the current deadline, ``None`` without deadline."""
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """Run the block under a deadline of ``seconds`` from now.
+
+    A nested deadline can only shorten the enclosing one. ``None`` leaves the
+    current deadline untouched.
+    """
+    if seconds is None:
+        yield
+        return
+
+    current = _deadline.get()
+    expires = time.monotonic() + seconds
+    token = _deadline.set(expires if current is None else min(current, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _is_query_canceled(exc: BaseException) -> bool:
+    orig = getattr(exc, "orig", None)
+    return any(
+        getattr(error, "sqlstate", None) == QUERY_CANCELED or getattr(error, "pgcode", None) == QUERY_CANCELED
+        for error in (exc, orig, getattr(orig, "__cause__", None))
+    )
+
+
+async def run_within_deadline(awaitable: Awaitable[T], database: Database | None = None) -> T:
+    """Await ``awaitable``, cancelling it when the current deadline passes.
+
+    Args:
+        awaitable: The database work, typically a repository coroutine.
+        database: Database the work runs against, ``statement_timeout`` is set on PostgreSQL.
+
+    Raises:
+        DeadlineExceeded: If the deadline passed before or during the work.
+    """
+    remaining = time_remaining()
+    if remaining is None:
+        return await awaitable
+    if remaining <= 0:
+        getattr(awaitable, "close", lambda: None)()
+        raise DeadlineExceeded("Deadline exceeded before the query started.")
+
+    try:
+        with anyio.fail_after(remaining):
+            if database is not None and database.url.dialect in {"postgresql", "postgres"}:
+                # the task keeps one pool connection for the transaction, SET LOCAL applies to it only
+                async with database.transaction():
+                    await database.execute(text(f"SET LOCAL statement_timeout = {max(int(remaining * 1000), 1)}"))
+                    return await awaitable
+            return await awaitable
+    except TimeoutError as exc:
+        raise DeadlineExceeded("Deadline exceeded.") from exc
+    except DBAPIError as exc:
+        if _is_query_canceled(exc):
+            raise DeadlineExceeded("Query cancelled by statement_timeout.") from exc
+        raise
+
+
+def deadline_bound(method: F) -> F:
+    """Run a repository method within the current deadline."""
+
+    @wraps(method)
+    async def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        if _deadline.get() is None:
+            return await method(self, *args, **kwargs)
+        # fanned out shard queries run in their own tasks, only the cancellation applies to them
+        database = self.model_type.database if getattr(self, "shard_spec", None) is None else None
+        return await run_within_deadline(method(self, *args, **kwargs), database)
+
+    return wrapper  # type: ignore[return-value]
@@ -45,3 +45,7 @@ class DatabaseNotFound(FimbuException):
 
 class RepositoryError(FimbuException):
     """Base repository exception type."""
+
+
+class DeadlineExceeded(RepositoryError):
+    """The request deadline passed before the database work completed."""
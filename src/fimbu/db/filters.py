@@ -9,7 +9,8 @@ from typing import TYPE_CHECKING, Any, Generic, Literal, TypeVar
 
 from fimbu.db.exceptions import RepositoryError
 from fimbu.db.utils import get_instrumented_attr
-from sqlalchemy import and_, or_, false
+from sqlalchemy import Boolean, and_, cast, func, or_, false, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH
 
 
 if TYPE_CHECKING:
@@ -25,6 +26,8 @@ __all__ = (
     "BeforeAfter",
     "CollectionFilter",
     "FilterTypes",
+    "JsonContainsFilter",
+    "JsonPathFilter",
     "LimitOffset",
     "OrderBy",
     "SearchFilter",
@@ -34,7 +37,7 @@ __all__ = (
 )
 
 
-FilterTypes: TypeAlias = "BoolFilter | AndFilter | BeforeAfter | OnBeforeAfter | CollectionFilter[Any] | LimitOffset | OrderBy | SearchFilter | NotInCollectionFilter[Any] | NotInSearchFilter"
+FilterTypes: TypeAlias = "BoolFilter | AndFilter | BeforeAfter | OnBeforeAfter | CollectionFilter[Any] | LimitOffset | OrderBy | SearchFilter | NotInCollectionFilter[Any] | NotInSearchFilter | JsonContainsFilter | JsonPathFilter"
 """Aggregate type alias of the types supported for collection filtering."""
 
 
@@ -64,6 +67,9 @@ class BoolFilter:
     
 
     def _apply_filters(self, filter_: FilterTypes):
+        if isinstance(filter_, (BoolFilter,)):
+            return filter_.get_expression(self.queryset)
+
         instr_attr = get_instrumented_attr(self.queryset.model_class, filter_.field_name)
         expr: ColumnElement[bool] = false() # returns nothing
         
@@ -119,6 +125,12 @@ class BoolFilter:
                 value=filter_.value,
                 ignore_case=bool(filter_.ignore_case),
             )
+
+        elif isinstance(filter_, (JsonContainsFilter,)):
+            expr = json_contains(instr_attr, filter_.value)
+
+        elif isinstance(filter_, (JsonPathFilter,)):
+            expr = json_path_exists(instr_attr, filter_.path, filter_.variables)
         else:
             msg = f"Unexpected filter: {filter_}"  # type: ignore[unreachable]
             raise RepositoryError(msg)
@@ -192,6 +204,30 @@ class BoolFilter:
         return field_name.notilike(value) if ignore_case else field_name.notilike(value)
 
 
+def json_contains(
+    field_name: InstrumentedAttribute,
+    value: dict[str, Any] | list[Any],
+) -> ColumnElement[bool]:
+    """Build a ``field_name @> :value`` expression."""
+    return type_coerce(field_name, JSONB).contains(value)
+
+
+def json_path_exists(
+    field_name: InstrumentedAttribute,
+    path: str,
+    variables: dict[str, Any] | None = None,
+) -> ColumnElement[bool]:
+    """Build a ``field_name @? :path`` expression.
+
+    ``@?`` is the operator form of ``jsonb_path_exists`` and the one a GIN
+    index can serve, the function itself is only used when ``variables``
+    are given since the operator does not accept them.
+    """
+    if variables is None:
+        return type_coerce(field_name, JSONB).op("@?", return_type=Boolean)(cast(path, JSONPATH))
+    return func.jsonb_path_exists(field_name, cast(path, JSONPATH), type_coerce(variables, JSONB), type_=Boolean)
+
+
 @dataclass(kw_only=True)
 class AndFilter(BoolFilter):
     """Data required to construct a ``WHERE ... AND ...`` clause."""
@@ -313,3 +349,32 @@ class NotInSearchFilter:
     """Values for ``NOT LIKE`` clause."""
     ignore_case: bool | None = False
     """Should the search be case insensitive."""
+
+
+@dataclass
+class JsonContainsFilter:
+    """Data required to construct a ``WHERE field_name @> :value`` clause.
+
+    PostgreSQL only, served by a GIN index on the column.
+    """
+
+    field_name: str
+    """Name of the ``JSONB`` model attribute to filter on."""
+    value: dict[str, Any] | list[Any]
+    """Document the column must contain."""
+
+
+@dataclass
+class JsonPathFilter:
+    """Data required to construct a ``WHERE field_name @? :path`` clause.
+
+    PostgreSQL only, served by a GIN index on the column unless ``variables``
+    are given, in which case ``jsonb_path_exists(...)`` is used.
+    """
+
+    field_name: str
+    """Name of the ``JSONB`` model attribute to filter on."""
+    path: str
+    """SQL/JSON path expression, e.g. ``$.tags[*] ? (@ == "python")``."""
+    variables: dict[str, Any] | None = None
+    """Values for the ``$name`` variables referenced in ``path``."""
@@ -0,0 +1,177 @@
+"""Per-request SQL instrumentation.
+
+SQLAlchemy cursor events, fired for every statement edgy and databasez send,
+are accounted to the :class:`QueryStats` of the current context, opened by
+:func:`track_queries` or by
+:class:`fimbu.middleware.query_stats.QueryStatsMiddleware` for HTTP requests.
+Statements are grouped by fingerprint, their text with literals and
+placeholders collapsed, so a fingerprint repeated more than
+``DB_N_PLUS_ONE_THRESHOLD`` times in one request is reported as an N+1
+pattern. Statements slower than ``DB_SLOW_QUERY_MS`` are logged with the
+types of their parameters, never their values.
+"""
+from __future__ import annotations
+
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from structlog import get_logger
+
+from fimbu.conf import settings
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection, ExceptionContext, ExecutionContext
+
+
+__all__ = (
+    "QueryStats",
+    "fingerprint",
+    "get_query_stats",
+    "install_query_instrumentation",
+    "parameter_shape",
+    "track_queries",
+)
+
+
+logger = get_logger()
+
+_START_KEY = "fimbu_query_started"
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<!:):\w+|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """Normalize a statement so repeats with other values compare equal.
+
+    Literals and bind placeholders become ``?`` and ``IN`` lists of any
+    length become ``(?+)``.
+    """
+    statement = _STRING.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _IN_LIST.sub("(?+)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> Any:
+    """Describe bound parameters by their type names, values are left out."""
+    if executemany:
+        return {"executemany": len(parameters), "row": parameter_shape(parameters[0]) if parameters else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+@dataclass
+class QueryStats:
+    """Statements issued within one request or :func:`track_queries` block."""
+
+    count: int = 0
+    """Number of statements."""
+    total_ms: float = 0.0
+    """Database time, in milliseconds."""
+    fingerprints: Counter[str] = field(default_factory=Counter)
+    """Statements per fingerprint."""
+    slow: int = 0
+    """Statements over the slow query threshold."""
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Return the fingerprints issued more than ``threshold`` times, most repeated first."""
+        return [(statement, count) for statement, count in self.fingerprints.most_common() if count > threshold]
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar("fimbu_query_stats", default=None)
+
+
+def get_query_stats() -> QueryStats | None:
+    """Return the statistics of the current context, if tracked."""
+    return _query_stats.get()
+
+
+@contextmanager
+def track_queries(label: str | None = None) -> Iterator[QueryStats]:
+    """Account the statements of the block and report N+1 patterns on exit.
+
+    Args:
+        label: Name of the unit of work in the N+1 warning, e.g. the request path.
+    """
+    install_query_instrumentation()
+    stats = QueryStats()
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+        threshold = getattr(settings, "DB_N_PLUS_ONE_THRESHOLD", 10)
+        for statement, count in stats.repeated(threshold):
+            logger.warning("Possible N+1 query.", fingerprint=statement, repeated=count, label=label)
+
+
+def _before_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: ExecutionContext | None,
+    executemany: bool,
+) -> None:
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: ExecutionContext | None,
+    executemany: bool,
+) -> None:
+    started = conn.info.get(_START_KEY)
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    slow = elapsed_ms >= getattr(settings, "DB_SLOW_QUERY_MS", 200.0)
+
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.total_ms += elapsed_ms
+        stats.fingerprints[fingerprint(statement)] += 1
+        stats.slow += slow
+
+    if slow:
+        logger.warning(
+            "Slow query.",
+            duration_ms=round(elapsed_ms, 2),
+            statement=fingerprint(statement),
+            parameters=parameter_shape(parameters, executemany),
+        )
+
+
+def _handle_error(context: ExceptionContext) -> None:
+    started = context.connection.info.get(_START_KEY) if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def install_query_instrumentation() -> None:
+    """Listen to the cursor events of every engine, once."""
+    if not event.contains(Engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
@@ -0,0 +1,614 @@
+"""Online-safe migration operations.
+
+Plain alembic DDL takes locks that block writes to the table for as long as
+the statement runs, which on a large table stalls production traffic for the
+whole deploy. This module registers operations that avoid it on PostgreSQL
+and fall back to their regular counterpart on other databases::
+
+    def upgrade():
+        op.create_index_concurrently("ix_user_email", "user", ["email"])
+        op.create_foreign_key_not_valid("fk_order_user", "order", "user", ["user_id"], ["id"])
+        op.validate_constraint("fk_order_user", "order")
+        op.add_column_backfilled("user", sa.Column("token", sa.Text(), server_default=sa.text("gen_random_uuid()::text"), nullable=False))
+
+Concurrent index builds and constraint validations run outside of the
+migration transaction, which is committed before them, so give such
+migrations a revision of their own. With ``settings.DB_ONLINE_MIGRATIONS``
+autogenerate emits these operations for the existing tables of a PostgreSQL
+database instead of the blocking ones.
+
+The operations are registered when :mod:`fimbu.db` is imported.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Iterator, Sequence
+
+from alembic.autogenerate import comparators, renderers
+from alembic.autogenerate import render
+from alembic.operations import BatchOperations, Operations, ops
+from alembic.operations.batch import BatchOperationsImpl
+from alembic.util import CommandError
+from sqlalchemy import CheckConstraint, Column, literal_column, select, text, update
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import AddConstraint
+from sqlalchemy.sql.elements import TextClause
+
+from fimbu.conf import settings
+
+try:
+    # alembic>=1.18 registers its own comparators after the global ones, run last
+    from alembic.util import DispatchPriority
+
+    _RUN_LAST: dict[str, Any] = {"priority": DispatchPriority.LAST}
+except ImportError:
+    # older versions run the comparators in registration order, alembic's first
+    _RUN_LAST = {}
+
+if TYPE_CHECKING:
+    from alembic.autogenerate.api import AutogenContext
+    from alembic.ddl.impl import DefaultImpl
+    from sqlalchemy import Table
+    from sqlalchemy.sql.compiler import DDLCompiler
+
+
+__all__ = (
+    "AddColumnBackfilledOp",
+    "CreateCheckConstraintNotValidOp",
+    "CreateForeignKeyNotValidOp",
+    "CreateIndexConcurrentlyOp",
+    "DropIndexConcurrentlyOp",
+    "ValidateConstraintOp",
+)
+
+
+class AddConstraintNotValid(AddConstraint):
+    """``ALTER TABLE ... ADD CONSTRAINT ... NOT VALID``."""
+
+    inherit_cache = False
+
+
+@compiles(AddConstraintNotValid)
+def _compile_add_constraint_not_valid(element: AddConstraintNotValid, compiler: DDLCompiler, **kw: Any) -> str:
+    return f"{compiler.visit_add_constraint(element, **kw)} NOT VALID"
+
+
+def _is_postgresql(operations: Operations) -> bool:
+    return operations.migration_context.dialect.name == "postgresql"
+
+
+@contextmanager
+def _outside_transaction(operations: Operations) -> Iterator[None]:
+    """Commit the migration transaction and run the block in autocommit mode, on PostgreSQL."""
+    if _is_postgresql(operations):
+        with operations.migration_context.autocommit_block():
+            yield
+    else:
+        yield
+
+
+def _quote(operations: Operations, name: str) -> str:
+    return operations.migration_context.dialect.identifier_preparer.quote(name)
+
+
+def _qualified(operations: Operations, table_name: str, schema: str | None) -> str:
+    table = _quote(operations, table_name)
+    return f"{_quote(operations, schema)}.{table}" if schema else table
+
+
+def _drop_invalid_index(operations: Operations, index_name: str, schema: str | None) -> None:
+    """Drop the leftover of an interrupted concurrent build, so the index can be built again."""
+    context = operations.migration_context
+    if context.as_sql:
+        return
+    invalid = context.bind.execute(
+        text(
+            "SELECT 1 FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relname = :name AND n.nspname = coalesce(:schema, current_schema()) AND NOT i.indisvalid"
+        ),
+        {"name": index_name, "schema": schema},
+    ).first()
+    if invalid is not None:
+        context.impl.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {_qualified(operations, index_name, schema)}")
+
+
+@Operations.register_operation("create_index_concurrently")
+@BatchOperations.register_operation("create_index_concurrently", "batch_create_index_concurrently")
+class CreateIndexConcurrentlyOp(ops.CreateIndexOp):
+    """Create an index without blocking writes to the table."""
+
+    @classmethod
+    def create_index_concurrently(
+        cls,
+        operations: Operations,
+        index_name: str | None,
+        table_name: str,
+        columns: Sequence[str],
+        *,
+        schema: str | None = None,
+        unique: bool = False,
+        if_not_exists: bool | None = None,
+        **kw: Any,
+    ) -> None:
+        """Issue ``CREATE INDEX CONCURRENTLY`` outside of the migration transaction.
+
+        An invalid index left by an interrupted build is dropped first. Other
+        databases get a regular ``CREATE INDEX``.
+        """
+        op = cls(index_name, table_name, columns, schema=schema, unique=unique, if_not_exists=if_not_exists, **kw)
+        return operations.invoke(op)
+
+    @classmethod
+    def batch_create_index_concurrently(
+        cls,
+        operations: BatchOperations,
+        index_name: str,
+        columns: Sequence[str],
+        **kw: Any,
+    ) -> None:
+        """Issue ``CREATE INDEX CONCURRENTLY`` within a batch migration context."""
+        op = cls(index_name, operations.impl.table_name, columns, schema=operations.impl.schema, **kw)
+        return operations.invoke(op)
+
+    def reverse(self) -> DropIndexConcurrentlyOp:
+        return DropIndexConcurrentlyOp.from_index(self.to_index())
+
+
+@Operations.register_operation("drop_index_concurrently")
+@BatchOperations.register_operation("drop_index_concurrently", "batch_drop_index_concurrently")
+class DropIndexConcurrentlyOp(ops.DropIndexOp):
+    """Drop an index without blocking the queries on the table."""
+
+    @classmethod
+    def drop_index_concurrently(
+        cls,
+        operations: Operations,
+        index_name: str,
+        table_name: str | None = None,
+        *,
+        schema: str | None = None,
+        if_exists: bool | None = None,
+        **kw: Any,
+    ) -> None:
+        """Issue ``DROP INDEX CONCURRENTLY`` outside of the migration transaction."""
+        op = cls(index_name, table_name=table_name, schema=schema, if_exists=if_exists, **kw)
+        return operations.invoke(op)
+
+    @classmethod
+    def batch_drop_index_concurrently(cls, operations: BatchOperations, index_name: str, **kw: Any) -> None:
+        """Issue ``DROP INDEX CONCURRENTLY`` within a batch migration context."""
+        op = cls(index_name, table_name=operations.impl.table_name, schema=operations.impl.schema, **kw)
+        return operations.invoke(op)
+
+    def reverse(self) -> CreateIndexConcurrentlyOp:
+        return CreateIndexConcurrentlyOp.from_index(self.to_index())
+
+
+@Operations.register_operation("create_foreign_key_not_valid")
+@BatchOperations.register_operation("create_foreign_key_not_valid", "batch_create_foreign_key_not_valid")
+class CreateForeignKeyNotValidOp(ops.CreateForeignKeyOp):
+    """Add a foreign key without checking the existing rows."""
+
+    @classmethod
+    def create_foreign_key_not_valid(
+        cls,
+        operations: Operations,
+        constraint_name: str,
+        source_table: str,
+        referent_table: str,
+        local_cols: list[str],
+        remote_cols: list[str],
+        **kw: Any,
+    ) -> None:
+        """Add a foreign key ``NOT VALID``, check the rows with ``op.validate_constraint``.
+
+        Only new writes are checked, so adding it takes a brief lock. Other
+        databases get a regular foreign key.
+        """
+        op = cls(constraint_name, source_table, referent_table, local_cols, remote_cols, **kw)
+        return operations.invoke(op)
+
+    @classmethod
+    def batch_create_foreign_key_not_valid(
+        cls,
+        operations: BatchOperations,
+        constraint_name: str,
+        referent_table: str,
+        local_cols: list[str],
+        remote_cols: list[str],
+        **kw: Any,
+    ) -> None:
+        """Add a foreign key ``NOT VALID`` within a batch migration context."""
+        op = cls(
+            constraint_name,
+            operations.impl.table_name,
+            referent_table,
+            local_cols,
+            remote_cols,
+            source_schema=operations.impl.schema,
+            **kw,
+        )
+        return operations.invoke(op)
+
+
+@Operations.register_operation("create_check_constraint_not_valid")
+@BatchOperations.register_operation("create_check_constraint_not_valid", "batch_create_check_constraint_not_valid")
+class CreateCheckConstraintNotValidOp(ops.CreateCheckConstraintOp):
+    """Add a check constraint without checking the existing rows."""
+
+    @classmethod
+    def create_check_constraint_not_valid(
+        cls,
+        operations: Operations,
+        constraint_name: str,
+        table_name: str,
+        condition: str | Any,
+        *,
+        schema: str | None = None,
+        **kw: Any,
+    ) -> None:
+        """Add a check constraint ``NOT VALID``, check the rows with ``op.validate_constraint``."""
+        op = cls(constraint_name, table_name, condition, schema=schema, **kw)
+        return operations.invoke(op)
+
+    @classmethod
+    def batch_create_check_constraint_not_valid(
+        cls,
+        operations: BatchOperations,
+        constraint_name: str,
+        condition: str | Any,
+        **kw: Any,
+    ) -> None:
+        """Add a check constraint ``NOT VALID`` within a batch migration context."""
+        op = cls(constraint_name, operations.impl.table_name, condition, schema=operations.impl.schema, **kw)
+        return operations.invoke(op)
+
+
+class _NoOp(ops.MigrateOperation):
+    """Placeholder for the reverse of an operation with nothing to undo."""
+
+    def reverse(self) -> _NoOp:
+        return self
+
+    def to_diff_tuple(self) -> tuple[Any, ...]:
+        return ()
+
+
+@Operations.register_operation("validate_constraint")
+@BatchOperations.register_operation("validate_constraint", "batch_validate_constraint")
+class ValidateConstraintOp(ops.MigrateOperation):
+    """Check the existing rows against a ``NOT VALID`` constraint."""
+
+    def __init__(self, constraint_name: str, table_name: str, *, schema: str | None = None) -> None:
+        self.constraint_name = constraint_name
+        self.table_name = table_name
+        self.schema = schema
+
+    @classmethod
+    def validate_constraint(
+        cls,
+        operations: Operations,
+        constraint_name: str,
+        table_name: str,
+        *,
+        schema: str | None = None,
+    ) -> None:
+        """Issue ``ALTER TABLE ... VALIDATE CONSTRAINT`` outside of the migration transaction.
+
+        Validation scans the table without blocking writes. It does nothing on
+        other databases, where constraints are always valid.
+        """
+        op = cls(constraint_name, table_name, schema=schema)
+        return operations.invoke(op)
+
+    @classmethod
+    def batch_validate_constraint(cls, operations: BatchOperations, constraint_name: str) -> None:
+        """Validate a constraint within a batch migration context."""
+        op = cls(constraint_name, operations.impl.table_name, schema=operations.impl.schema)
+        return operations.invoke(op)
+
+    def reverse(self) -> _NoOp:
+        # dropping the constraint is the reverse of the operation that added it
+        return _NoOp()
+
+    def to_diff_tuple(self) -> tuple[Any, ...]:
+        return ("validate_constraint", self.schema, self.table_name, self.constraint_name)
+
+
+@Operations.register_operation("add_column_backfilled")
+@BatchOperations.register_operation("add_column_backfilled", "batch_add_column_backfilled")
+class AddColumnBackfilledOp(ops.AddColumnOp):
+    """Add a column with a server default and fill the existing rows in batches."""
+
+    def __init__(
+        self,
+        table_name: str,
+        column: Column[Any],
+        *,
+        schema: str | None = None,
+        key: str = "id",
+        batch_size: int | None = None,
+        **kw: Any,
+    ) -> None:
+        super().__init__(table_name, column, schema=schema, **kw)
+        self.key = key
+        self.batch_size = batch_size
+
+    @classmethod
+    def add_column_backfilled(
+        cls,
+        operations: Operations,
+        table_name: str,
+        column: Column[Any],
+        *,
+        schema: str | None = None,
+        key: str = "id",
+        batch_size: int | None = None,
+    ) -> None:
+        """Add ``column`` without rewriting the table under an exclusive lock.
+
+        On PostgreSQL the column is added nullable, its server default is set
+        for new rows and the existing ones are updated ``batch_size`` rows at a
+        time, each batch committed on its own. A ``NOT NULL`` column is then
+        constrained through a validated check, so setting it does not scan the
+        table under the lock. Other databases get a regular ``ADD COLUMN``.
+
+        Args:
+            operations: The migration operations.
+            table_name: Name of the table.
+            column: The column, its ``server_default`` fills the existing rows.
+            schema: Schema of the table.
+            key: Unique column the batches are selected on, the primary key.
+            batch_size: Rows updated per batch, defaults to ``settings.DB_BACKFILL_BATCH_SIZE``.
+        """
+        op = cls(table_name, column, schema=schema, key=key, batch_size=batch_size)
+        return operations.invoke(op)
+
+    @classmethod
+    def batch_add_column_backfilled(
+        cls,
+        operations: BatchOperations,
+        column: Column[Any],
+        *,
+        key: str = "id",
+        batch_size: int | None = None,
+    ) -> None:
+        """Add a backfilled column within a batch migration context."""
+        op = cls(operations.impl.table_name, column, schema=operations.impl.schema, key=key, batch_size=batch_size)
+        return operations.invoke(op)
+
+
+def _immediate_impl(operations: Operations) -> DefaultImpl:
+    """Return the implementation executing DDL right away.
+
+    Batch contexts queue their operations until the block exits, the pending
+    ones are applied first so the statement sees the columns they add.
+    """
+    impl = operations.impl
+    if isinstance(impl, BatchOperationsImpl):
+        impl.flush()
+        impl.batch.clear()
+        return impl.impl
+    return impl
+
+
+@Operations.implementation_for(CreateIndexConcurrentlyOp)
+def create_index_concurrently(operations: Operations, operation: CreateIndexConcurrentlyOp) -> None:
+    index = operation.to_index(operations.migration_context)
+    kw = {} if operation.if_not_exists is None else {"if_not_exists": operation.if_not_exists}
+    if not _is_postgresql(operations):
+        operations.impl.create_index(index, **kw)
+        return
+
+    index.dialect_options["postgresql"]["concurrently"] = True
+    impl = _immediate_impl(operations)
+    with _outside_transaction(operations):
+        if index.name is not None:
+            _drop_invalid_index(operations, index.name, operation.schema)
+        impl.create_index(index, **kw)
+
+
+@Operations.implementation_for(DropIndexConcurrentlyOp)
+def drop_index_concurrently(operations: Operations, operation: DropIndexConcurrentlyOp) -> None:
+    index = operation.to_index(operations.migration_context)
+    kw = {} if operation.if_exists is None else {"if_exists": operation.if_exists}
+    if not _is_postgresql(operations):
+        operations.impl.drop_index(index, **kw)
+        return
+
+    index.dialect_options["postgresql"]["concurrently"] = True
+    impl = _immediate_impl(operations)
+    with _outside_transaction(operations):
+        impl.drop_index(index, **kw)
+
+
+@Operations.implementation_for(CreateForeignKeyNotValidOp)
+@Operations.implementation_for(CreateCheckConstraintNotValidOp)
+def create_constraint_not_valid(operations: Operations, operation: ops.AddConstraintOp) -> None:
+    constraint = operation.to_constraint(operations.migration_context)
+    if _is_postgresql(operations):
+        _immediate_impl(operations).execute(AddConstraintNotValid(constraint))
+    else:
+        operations.impl.add_constraint(constraint)
+
+
+@Operations.implementation_for(ValidateConstraintOp)
+def validate_constraint(operations: Operations, operation: ValidateConstraintOp) -> None:
+    if not _is_postgresql(operations):
+        return
+    impl = _immediate_impl(operations)
+    table = _qualified(operations, operation.table_name, operation.schema)
+    with _outside_transaction(operations):
+        impl.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {_quote(operations, operation.constraint_name)}")
+
+
+@Operations.implementation_for(_NoOp)
+def _no_op(operations: Operations, operation: _NoOp) -> None:
+    pass
+
+
+@Operations.implementation_for(AddColumnBackfilledOp)
+def add_column_backfilled(operations: Operations, operation: AddColumnBackfilledOp) -> None:
+    context = operations.migration_context
+    column = operation.column._copy() if operation.column.table is not None else operation.column
+    if not _is_postgresql(operations) or column.server_default is None:
+        operations.impl.add_column(operation.table_name, column, schema=operation.schema, **operation.kw)
+        return
+
+    impl = _immediate_impl(operations)
+    name, schema, table_name = column.name, operation.schema, operation.table_name
+    default, not_null = column.server_default, not column.nullable
+    # the default as written in DDL, literals included, so --sql output needs no bound parameters
+    value = literal_column(context.dialect.ddl_compiler(context.dialect, None).get_column_default_string(column))
+
+    # adding a nullable column without default only touches the catalog
+    column.nullable, column.server_default = True, None
+    impl.add_column(table_name, column, schema=schema, **operation.kw)
+    impl.alter_column(table_name, name, server_default=default, existing_type=column.type, schema=schema)
+
+    table = operations.schema_obj.table(table_name, Column(operation.key), Column(name, column.type), schema=schema)
+    if context.as_sql:
+        impl.execute(update(table).where(table.c[name].is_(None)).values({name: value}))
+    else:
+        batch_size = operation.batch_size or getattr(settings, "DB_BACKFILL_BATCH_SIZE", 1_000)
+        key = table.c[operation.key]
+        pending = select(key).where(table.c[name].is_(None)).order_by(key).limit(batch_size)
+        # each batch commits on its own, row locks are held for one batch only. The
+        # walk goes forward by key, a default evaluating to NULL cannot loop forever
+        with _outside_transaction(operations):
+            last = None
+            while keys := context.bind.execute(pending if last is None else pending.where(key > last)).scalars().all():
+                context.bind.execute(update(table).where(key.in_(keys)).values({name: value}))
+                last = keys[-1]
+        if not_null and context.bind.execute(pending.limit(1)).first() is not None:
+            raise CommandError(
+                f"The default of {table_name}.{name} left rows NULL, the column cannot be made NOT NULL"
+            )
+
+    if not not_null:
+        return
+    check_name = f"{table_name}_{name}_not_null"[:63]
+    check = CheckConstraint(table.c[name].is_not(None), name=check_name)
+    table.append_constraint(check)
+    impl.execute(AddConstraintNotValid(check))
+    with _outside_transaction(operations):
+        impl.execute(f"ALTER TABLE {_qualified(operations, table_name, schema)} VALIDATE CONSTRAINT {_quote(operations, check_name)}")
+    # with a valid NOT NULL check, SET NOT NULL skips the table scan
+    impl.alter_column(table_name, name, nullable=False, existing_type=column.type, schema=schema)
+    impl.execute(f"ALTER TABLE {_qualified(operations, table_name, schema)} DROP CONSTRAINT {_quote(operations, check_name)}")
+
+
+def _rename(text_: str, name: str, online_name: str) -> str:
+    return text_.replace(f"{name}(", f"{online_name}(", 1)
+
+
+@renderers.dispatch_for(CreateIndexConcurrentlyOp)
+def _render_create_index_concurrently(autogen_context: AutogenContext, op: CreateIndexConcurrentlyOp) -> str:
+    return _rename(render._add_index(autogen_context, op), "create_index", "create_index_concurrently")
+
+
+@renderers.dispatch_for(DropIndexConcurrentlyOp)
+def _render_drop_index_concurrently(autogen_context: AutogenContext, op: DropIndexConcurrentlyOp) -> str:
+    return _rename(render._drop_index(autogen_context, op), "drop_index", "drop_index_concurrently")
+
+
+@renderers.dispatch_for(CreateForeignKeyNotValidOp)
+def _render_create_foreign_key_not_valid(autogen_context: AutogenContext, op: CreateForeignKeyNotValidOp) -> str:
+    return _rename(render._add_fk_constraint(autogen_context, op), "create_foreign_key", "create_foreign_key_not_valid")
+
+
+@renderers.dispatch_for(CreateCheckConstraintNotValidOp)
+def _render_create_check_constraint_not_valid(
+    autogen_context: AutogenContext, op: CreateCheckConstraintNotValidOp
+) -> str:
+    # alembic<1.18 has no renderer for check constraints to build upon
+    args = [repr(render._render_gen_name(autogen_context, op.constraint_name))]
+    if not autogen_context._has_batch:
+        args.append(repr(render._ident(op.table_name)))
+    args.append(render._render_potential_expr(op.to_constraint().sqltext, autogen_context))
+    if not autogen_context._has_batch and op.schema:
+        args.append(f"schema={render._ident(op.schema)!r}")
+    return f"{render._alembic_autogenerate_prefix(autogen_context)}create_check_constraint_not_valid({', '.join(args)})"
+
+
+@renderers.dispatch_for(ValidateConstraintOp)
+def _render_validate_constraint(autogen_context: AutogenContext, op: ValidateConstraintOp) -> str:
+    args = [repr(op.constraint_name)]
+    if not autogen_context._has_batch:
+        args.append(repr(op.table_name))
+        if op.schema:
+            args.append(f"schema={op.schema!r}")
+    return f"{render._alembic_autogenerate_prefix(autogen_context)}validate_constraint({', '.join(args)})"
+
+
+@renderers.dispatch_for(_NoOp)
+def _render_no_op(autogen_context: AutogenContext, op: _NoOp) -> list[str]:
+    return []
+
+
+@renderers.dispatch_for(AddColumnBackfilledOp)
+def _render_add_column_backfilled(autogen_context: AutogenContext, op: AddColumnBackfilledOp) -> str:
+    text_ = _rename(render._add_column(autogen_context, op), "add_column", "add_column_backfilled")
+    return f"{text_[:-1]}, key={op.key!r})" if op.key != "id" else text_
+
+
+def _is_volatile(default: Any) -> bool:
+    """Whether a server default is computed per row, so adding it rewrites the table.
+
+    PostgreSQL stores a constant default in the catalog, only function calls
+    are worth a backfill.
+    """
+    arg = getattr(default, "arg", None)
+    if arg is None or isinstance(arg, str):
+        return False
+    if isinstance(arg, TextClause):
+        return "(" in arg.text
+    return True
+
+
+def _online(autogen_context: AutogenContext, op: ops.MigrateOperation) -> list[ops.MigrateOperation]:
+    """Return the non-blocking form of an operation on an existing table."""
+    if type(op) is ops.CreateIndexOp:
+        return [CreateIndexConcurrentlyOp.from_index(op.to_index())]
+    if type(op) is ops.DropIndexOp:
+        return [DropIndexConcurrentlyOp.from_index(op.to_index())]
+    if type(op) is ops.CreateForeignKeyOp and op.constraint_name is not None:
+        return [
+            CreateForeignKeyNotValidOp.from_constraint(op.to_constraint()),
+            ValidateConstraintOp(op.constraint_name, op.source_table, schema=op.kw.get("source_schema")),
+        ]
+    if type(op) is ops.CreateCheckConstraintOp and op.constraint_name is not None:
+        return [
+            CreateCheckConstraintNotValidOp.from_constraint(op.to_constraint()),
+            ValidateConstraintOp(op.constraint_name, op.table_name, schema=op.schema),
+        ]
+    if type(op) is ops.AddColumnOp and _is_volatile(op.column.server_default):
+        key = f"{op.schema}.{op.table_name}" if op.schema else op.table_name
+        table = autogen_context.table_key_to_table.get(key)
+        primary_key = list(table.primary_key.columns) if table is not None else []
+        if len(primary_key) == 1:
+            return [AddColumnBackfilledOp(op.table_name, op.column, schema=op.schema, key=primary_key[0].name, **op.kw)]
+    return [op]
+
+
+@comparators.dispatch_for("table", **_RUN_LAST)
+def _rewrite_online(
+    autogen_context: AutogenContext,
+    modify_table_ops: ops.ModifyTableOps,
+    schema: str | None,
+    table_name: str,
+    conn_table: Table | None,
+    metadata_table: Table | None,
+) -> None:
+    """Replace the blocking operations autogenerate found on an existing table."""
+    if (
+        conn_table is None
+        or metadata_table is None
+        or autogen_context.dialect is None
+        or autogen_context.dialect.name != "postgresql"
+        or not getattr(settings, "DB_ONLINE_MIGRATIONS", True)
+    ):
+        return
+    modify_table_ops.ops = [online for op in modify_table_ops.ops for online in _online(autogen_context, op)]
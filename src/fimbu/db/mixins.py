@@ -1,7 +1,12 @@
 import uuid
 from uuid import UUID
 from datetime import datetime
+from typing import Optional
+
+import sqlalchemy
+
 from fimbu.db import fields, Model, GUIDField
+from fimbu.db.partitioning import apply_partitioning
 
 class UUIDMixin(Model):
     """
@@ -31,6 +36,19 @@ class AuditMixin(Model):
         abstract = True
 
 
+class PartitionedMixin(Model):
+    """
+    Range partitioned table mixin, configured by ``Meta.partition_by``
+    """
+
+    @classmethod
+    def build(cls, schema: Optional[str] = None) -> sqlalchemy.Table:
+        return apply_partitioning(cls, super().build(schema))
+
+    class Meta:
+        abstract = True
+
+
 class UserMixin(UUIDMixin):
     """Base fimbu user mixin."""
     email: str = fields.EmailField(max_length=255, null=False, unique=True)
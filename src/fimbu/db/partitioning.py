@@ -0,0 +1,308 @@
+"""Declarative range partitioning for PostgreSQL tables.
+
+A model opts in by inheriting :class:`fimbu.db.mixins.PartitionedMixin` and
+declaring the partitioning in its ``Meta``::
+
+    class AuditLog(PartitionedMixin, AuditMixin):
+        ...
+
+        class Meta:
+            registry = registry
+            partition_by = "created_at"
+            partition_interval = "month"
+            partition_premake = 3
+            partition_retention = 12
+
+Partitions are named ``<table>_p<YYYYMMDD>`` after their lower bound and are
+created ahead of time and expired by :func:`maintain_partitions`, exposed as
+``fimbu db partitions`` and as the ``partition_maintenance`` SAQ task.
+"""
+from __future__ import annotations
+
+import datetime
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, Literal
+
+from sqlalchemy import PrimaryKeyConstraint, text
+from sqlalchemy.dialects import postgresql
+
+from fimbu.core.exceptions import ImproperlyConfigured
+
+if TYPE_CHECKING:
+    from typing_extensions import TypeAlias
+    from sqlalchemy import Table
+    from fimbu.core.types import ModelT
+
+
+__all__ = (
+    "PartitionReport",
+    "PartitionSpec",
+    "apply_partitioning",
+    "ensure_partitions",
+    "expire_partitions",
+    "get_partition_spec",
+    "get_partitioned_models",
+    "maintain_partitions",
+)
+
+
+PartitionInterval: TypeAlias = Literal["day", "week", "month", "year"]
+"""Supported partition intervals."""
+
+PARTITION_DIALECTS = {"postgresql", "postgres"}
+_preparer = postgresql.dialect().identifier_preparer
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    """Range partitioning options read from a model ``Meta``."""
+
+    field_name: str
+    """Name of the datetime attribute to partition on, ``Meta.partition_by``."""
+    interval: PartitionInterval = "month"
+    """Width of each partition, ``Meta.partition_interval``."""
+    premake: int = 3
+    """Number of future partitions kept ahead, ``Meta.partition_premake``."""
+    retention: int | None = None
+    """Number of past intervals to keep, ``Meta.partition_retention``.
+
+    ``None`` keeps every partition."""
+    drop: bool = False
+    """Drop expired partitions instead of detaching them, ``Meta.partition_drop``."""
+
+    def floor(self, moment: datetime.datetime) -> datetime.datetime:
+        """Return the lower bound of the partition holding ``moment``."""
+        start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.interval == "week":
+            return start - datetime.timedelta(days=start.weekday())
+        if self.interval == "month":
+            return start.replace(day=1)
+        if self.interval == "year":
+            return start.replace(month=1, day=1)
+        return start
+
+    def shift(self, start: datetime.datetime, steps: int = 1) -> datetime.datetime:
+        """Move a partition bound by ``steps`` intervals."""
+        if self.interval == "day":
+            return start + datetime.timedelta(days=steps)
+        if self.interval == "week":
+            return start + datetime.timedelta(weeks=steps)
+        if self.interval == "month":
+            month = start.month - 1 + steps
+            return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+        return start.replace(year=start.year + steps)
+
+
+@dataclass
+class PartitionReport:
+    """Outcome of a maintenance run for one model."""
+
+    table: str
+    """Name of the partitioned table."""
+    created: list[str] = field(default_factory=list)
+    """Partitions created by the run."""
+    detached: list[str] = field(default_factory=list)
+    """Partitions detached (and dropped if ``drop`` is set) by the run."""
+
+
+@lru_cache(maxsize=None)
+def get_partition_spec(model: type[ModelT]) -> PartitionSpec | None:
+    """Read the partitioning options declared on ``model.Meta``.
+
+    Args:
+        model: The model class.
+
+    Returns:
+        The partition spec, or ``None`` if the model is not partitioned.
+
+    Raises:
+        ImproperlyConfigured: If the options are invalid.
+    """
+    meta = getattr(model, "Meta", None)
+    field_name = getattr(meta, "partition_by", None)
+    if field_name is None:
+        return None
+
+    model_field = model.meta.fields.get(field_name)
+    if model_field is None or not issubclass(model_field.field_type, datetime.datetime):
+        raise ImproperlyConfigured(
+            f"{model.__name__}.Meta.partition_by must name a datetime field, got '{field_name}'."
+        )
+
+    spec = PartitionSpec(
+        field_name=field_name,
+        interval=getattr(meta, "partition_interval", "month"),
+        premake=getattr(meta, "partition_premake", 3),
+        retention=getattr(meta, "partition_retention", None),
+        drop=getattr(meta, "partition_drop", False),
+    )
+    if spec.interval not in ("day", "week", "month", "year"):
+        raise ImproperlyConfigured(f"Invalid partition interval '{spec.interval}' for {model.__name__}.")
+    if spec.premake < 0 or (spec.retention is not None and spec.retention < 1):
+        raise ImproperlyConfigured(f"Invalid partition premake/retention for {model.__name__}.")
+    return spec
+
+
+def _is_partitioned(model: type[ModelT]) -> bool:
+    database = getattr(model, "database", None)
+    return database is not None and database.url.dialect in PARTITION_DIALECTS
+
+
+def apply_partitioning(model: type[ModelT], table: Table) -> Table:
+    """Declare ``PARTITION BY RANGE`` on ``table`` if ``model`` asks for it.
+
+    PostgreSQL requires the partition key to be part of the primary key, so it
+    is appended to it. Other dialects get a plain table.
+
+    Args:
+        model: The model class the table was built for.
+        table: The freshly built table.
+
+    Returns:
+        The same table.
+    """
+    spec = get_partition_spec(model)
+    if spec is None or not _is_partitioned(model):
+        return table
+
+    column = table.columns[spec.field_name]
+    table.dialect_kwargs["postgresql_partition_by"] = f"RANGE ({_preparer.quote(column.name)})"
+    if not column.primary_key:
+        columns = [*table.primary_key.columns, column]
+        column.primary_key, column.nullable = True, False
+        table.append_constraint(PrimaryKeyConstraint(*columns))
+    return table
+
+
+def get_partitioned_models(models: Iterable[type[ModelT]]) -> list[type[ModelT]]:
+    """Filter ``models`` down to the range partitioned ones."""
+    return [model for model in models if get_partition_spec(model) is not None and _is_partitioned(model)]
+
+
+def _qualified(table: Table, name: str) -> str:
+    if table.schema:
+        return f"{_preparer.quote_schema(table.schema)}.{_preparer.quote(name)}"
+    return _preparer.quote(name)
+
+
+def _bound(table: Table, spec: PartitionSpec, moment: datetime.datetime) -> str:
+    column_type = table.columns[spec.field_name].type
+    if getattr(column_type, "timezone", False):
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.isoformat()
+
+
+def _partition_name(table: Table, start: datetime.datetime) -> str:
+    return f"{table.name}_p{start:%Y%m%d}"
+
+
+def _utcnow(now: datetime.datetime | None = None) -> datetime.datetime:
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    if now.tzinfo is not None:
+        now = now.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return now
+
+
+async def ensure_partitions(model: type[ModelT], now: datetime.datetime | None = None) -> list[str]:
+    """Create the current partition and ``premake`` future ones.
+
+    Args:
+        model: A range partitioned model.
+        now: Reference time, defaults to the current UTC time.
+
+    Returns:
+        Names of the partitions that did not exist yet.
+    """
+    spec = get_partition_spec(model)
+    table = model.table
+    existing = set(await _list_partitions(model))
+    start = spec.floor(_utcnow(now))
+
+    created: list[str] = []
+    for _ in range(spec.premake + 1):
+        end = spec.shift(start)
+        name = _partition_name(table, start)
+        if name not in existing:
+            await model.database.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {_qualified(table, name)} "
+                    f"PARTITION OF {_preparer.format_table(table)} "
+                    f"FOR VALUES FROM ('{_bound(table, spec, start)}') TO ('{_bound(table, spec, end)}')"
+                )
+            )
+            created.append(name)
+        start = end
+    return created
+
+
+async def expire_partitions(model: type[ModelT], now: datetime.datetime | None = None) -> list[str]:
+    """Detach, or drop, partitions older than the retention window.
+
+    Only partitions named by :func:`ensure_partitions` are considered.
+
+    Args:
+        model: A range partitioned model.
+        now: Reference time, defaults to the current UTC time.
+
+    Returns:
+        Names of the expired partitions.
+    """
+    spec = get_partition_spec(model)
+    if spec.retention is None:
+        return []
+
+    table = model.table
+    cutoff = spec.shift(spec.floor(_utcnow(now)), -spec.retention)
+    prefix = f"{table.name}_p"
+
+    expired: list[str] = []
+    for name in sorted(await _list_partitions(model)):
+        if not name.startswith(prefix):
+            continue
+        try:
+            start = datetime.datetime.strptime(name[len(prefix):], "%Y%m%d")
+        except ValueError:
+            continue
+        if spec.shift(start) > cutoff:
+            continue
+
+        async with model.database.transaction():
+            await model.database.execute(
+                text(f"ALTER TABLE {_preparer.format_table(table)} DETACH PARTITION {_qualified(table, name)}")
+            )
+            if spec.drop:
+                await model.database.execute(text(f"DROP TABLE {_qualified(table, name)}"))
+        expired.append(name)
+    return expired
+
+
+async def maintain_partitions(models: Iterable[type[ModelT]], now: datetime.datetime | None = None) -> list[PartitionReport]:
+    """Run :func:`ensure_partitions` and :func:`expire_partitions` for ``models``.
+
+    Args:
+        models: Candidate models, non partitioned ones are skipped.
+        now: Reference time, defaults to the current UTC time.
+
+    Returns:
+        One report per partitioned model.
+    """
+    reports: list[PartitionReport] = []
+    for model in get_partitioned_models(models):
+        report = PartitionReport(table=model.table.name)
+        report.created = await ensure_partitions(model, now)
+        report.detached = await expire_partitions(model, now)
+        reports.append(report)
+    return reports
+
+
+async def _list_partitions(model: type[ModelT]) -> list[str]:
+    rows = await model.database.fetch_all(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.oid = CAST(:table AS regclass)"
+        ).bindparams(table=_preparer.format_table(model.table))
+    )
+    return [row[0] for row in rows]
@@ -1,22 +1,31 @@
 from __future__ import annotations
 
 import abc
-from typing import Any, Generic, Collection
+import asyncio
+import os
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Generic, Collection, Sequence
 import string
 import random
 from datetime import datetime
 from uuid import UUID
-from edgy import ObjectNotFound, QuerySet, or_
+from edgy import MultipleObjectsReturned, ObjectNotFound, QuerySet, or_
 from litestar.repository.abc import AbstractAsyncRepository
 from sqlalchemy import text
-from fimbu.core.types import ModelT, T
+from fimbu.core.types import ModelDTOT, ModelT, T
 
 
 from sqlalchemy.orm import InstrumentedAttribute
 from sqlalchemy.sql import ColumnElement
 
 from fimbu.utils.text import slugify
+from fimbu.db._arrow import ArrowBatchBuilder, BytesSink, pa, pq, require_pyarrow
+from fimbu.db._converters import Struct, get_row_struct
+from fimbu.db.advisor import note_filters, observe_filters
+from fimbu.db.deadline import deadline_bound
+from fimbu.db.backfill import Backfill, BackfillThrottle
 from fimbu.db.exceptions import RepositoryError
+from fimbu.db.sharding import get_shard_database, get_shard_spec, merge_ordered, route_shards
+from fimbu.db.utils import get_instrumented_attr
 from fimbu.db.filters import (
     BeforeAfter,
     CollectionFilter,
@@ -29,8 +38,20 @@ from fimbu.db.filters import (
     SearchFilter,
     AndFilter,
     OrFilter,
+    JsonContainsFilter,
+    JsonPathFilter,
+    json_contains,
+    json_path_exists,
 )
 
+if TYPE_CHECKING:
+    from edgy import Database
+    from sqlalchemy import Column, RowMapping
+    from sqlalchemy.sql import Select
+
+    from fimbu.db.aggregates import AggregateTypes
+    from fimbu.db.backfill import BackfillReport, BackfillUpdate
+
 
 
 __all__ = [
@@ -39,6 +60,13 @@ __all__ = [
 ]
 
 
+DEFAULT_EXPORT_BATCH_SIZE = 10_000
+"""Rows fetched from the driver per record batch during columnar exports."""
+
+DEFAULT_BACKFILL_BATCH_SIZE = 1_000
+"""Rows updated per transaction during a backfill."""
+
+
 
 class FilterableRepository(Generic[ModelT]):
     model_type: type[ModelT]
@@ -71,13 +99,14 @@ class FilterableRepository(Generic[ModelT]):
             The Queryset with filters applied.
         """
 
+        note_filters(filters)
         order_by_filters: list[OrderBy] = []
         pagination_filter: LimitOffset = None
 
         for filter_ in filters:
             if isinstance(filter_, (LimitOffset,)):
                 if apply_pagination:
-                    pagination_filters = filter_
+                    pagination_filter = filter_
 
             elif isinstance(filter_, (BeforeAfter,)):
                 queryset = self._filter_on_datetime_field(
@@ -125,7 +154,18 @@ class FilterableRepository(Generic[ModelT]):
                 )
 
             elif isinstance(filter_, (AndFilter, OrFilter)):
-                queryset = queryset.filter(filter_._expression)
+                queryset = queryset.filter(filter_.get_expression(queryset))
+
+            elif isinstance(filter_, (JsonContainsFilter,)):
+                queryset = self._filter_json_contains(queryset, filter_.field_name, filter_.value)
+
+            elif isinstance(filter_, (JsonPathFilter,)):
+                queryset = self._filter_json_path(
+                    queryset,
+                    filter_.field_name,
+                    path=filter_.path,
+                    variables=filter_.variables,
+                )
 
             else:
                 msg = f"Unexpected filter: {filter_}"  # type: ignore[unreachable]
@@ -137,7 +177,7 @@ class FilterableRepository(Generic[ModelT]):
             fieldnames = [f.field_name if f.sort_order == 'asc' else f"-{f.field_name}" for f in order_by_filters]
             queryset = self._order_by(queryset, fieldnames)
 
-        if pagination_filters:
+        if pagination_filter:
             if not queryset._order_by:
                 pass # TODO: LOG Warning
 
@@ -209,6 +249,25 @@ class FilterableRepository(Generic[ModelT]):
         lookup = f'{field_name}__icontains' if ignore_case else f'{field_name}__contains'
         return queryset.exclude(**{lookup: value})
 
+    def _filter_json_contains(
+        self,
+        queryset: QuerySet[ModelT],
+        field_name: str,
+        value: dict[str, Any] | list[Any],
+    ) -> QuerySet[ModelT]:
+        instr_attr = get_instrumented_attr(self.model_type, field_name)
+        return queryset.filter(json_contains(instr_attr, value))
+
+    def _filter_json_path(
+        self,
+        queryset: QuerySet[ModelT],
+        field_name: str,
+        path: str,
+        variables: dict[str, Any] | None = None,
+    ) -> QuerySet[ModelT]:
+        instr_attr = get_instrumented_attr(self.model_type, field_name)
+        return queryset.filter(json_path_exists(instr_attr, path, variables))
+
     def _order_by(
         self,
         queryset: QuerySet[ModelT],
@@ -227,20 +286,79 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
     def __init__(self, model_type: type[ModelT], **kwargs: Any) -> None:
         """Repository constructors accept arbitrary kwargs."""
         self.model_type = model_type
-        self.id_attribute = model_type.pkname
+        self.id_attribute = model_type.pknames[0]
+        self.shard_spec = get_shard_spec(model_type)
         super().__init__(**kwargs)
 
 
+    def _shards(self, *filters: Any, **kwargs: Any) -> list[QuerySet[ModelT]]:
+        """Base querysets of a sharded model, one per shard the filters can match."""
+        querysets = []
+        for name in route_shards(self.shard_spec, filters, kwargs):
+            queryset = self.model_type.query.all()
+            queryset.database = get_shard_database(name)
+            querysets.append(queryset)
+        return querysets
+
+
+    def _shard_of(self, instance: ModelT) -> QuerySet[ModelT]:
+        value = getattr(instance, self.shard_spec.key)
+        return self._shards(**{self.shard_spec.key: value})[0]
+
+
+    async def _fetch(self, queryset: QuerySet[ModelT]) -> list[ModelT]:
+        """Run a shard queryset, instances keep the shard database for later saves."""
+        instances = await queryset.all()
+        for instance in instances:
+            instance.database = queryset.database
+        return instances
+
+
+    async def _get_sharded(self, **kwargs: Any) -> ModelT:
+        results = await asyncio.gather(
+            *(self._fetch(queryset.filter(**kwargs).limit(2)) for queryset in self._shards(**kwargs))
+        )
+        instances = [instance for result in results for instance in result]
+        if not instances:
+            raise ObjectNotFound()
+        if len(instances) > 1:
+            raise MultipleObjectsReturned()
+        return instances[0]
+
+
+    def _check_unsharded(self, operation: str) -> None:
+        if self.shard_spec is not None:
+            raise RepositoryError(f"{operation} is not supported on sharded model {self.model_type.__name__}.")
+
+
+    @deadline_bound
     async def add(self, data: ModelT) -> ModelT:
         """Add ``data`` to the collection."""
-        return await data.save()
+        if self.shard_spec is not None:
+            data.database = self._shard_of(data).database
+        # an INSERT, a preset primary key such as a UUID default must not turn it into an UPDATE
+        return await data.save(force_save=True)
     
 
+    @deadline_bound
     async def add_many(self, data: list[ModelT]) -> list[ModelT]:
         """Add multiple ``data`` to the collection."""
-        return await self.model_type.query.bulk_create(data)
+        if self.shard_spec is not None:
+            by_shard: dict[Database, tuple[QuerySet[ModelT], list[dict[str, Any]]]] = {}
+            for instance in data:
+                values = instance if isinstance(instance, dict) else instance.extract_db_fields()
+                queryset = self._shards(**{self.shard_spec.key: values[self.shard_spec.key]})[0]
+                by_shard.setdefault(queryset.database, (queryset, []))[1].append(values)
+            await asyncio.gather(*(queryset.bulk_create(items) for queryset, items in by_shard.values()))
+            return data
+        await self.model_type.query.bulk_create(
+            [instance if isinstance(instance, dict) else instance.extract_db_fields() for instance in data]
+        )
+        return data
     
 
+    @deadline_bound
+    @observe_filters
     async def count(self, *filters: FilterTypes, **kwargs: Any) -> int: # type: ignore
         """Get the count of records returned by a query.
 
@@ -251,10 +369,17 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         Returns:
             The count of instances
         """
-        queryset = self._apply_filters(filters, apply_pagination=False, queryset=self.model_type.query)
+        if self.shard_spec is not None:
+            counts = await asyncio.gather(*(
+                self._apply_filters(*filters, apply_pagination=False, queryset=queryset).filter(**kwargs).count()
+                for queryset in self._shards(*filters, **kwargs)
+            ))
+            return sum(counts)
+        queryset = self._apply_filters(*filters, apply_pagination=False, queryset=self.model_type.query.all())
         return await queryset.filter(**kwargs).count()
     
 
+    @deadline_bound
     async def delete(self, item_id: Any) -> ModelT:
         """Delete instance identified by ``item_id``.
 
@@ -267,11 +392,15 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         Raises:
             ObjectNotFound: If no instance found identified by ``item_id``.
         """
-        instance: ModelT = await self.model_type.query.get(**{self.id_attribute: item_id})
+        if self.shard_spec is not None:
+            instance = await self._get_sharded(**{self.id_attribute: item_id})
+        else:
+            instance: ModelT = await self.model_type.query.get(**{self.id_attribute: item_id})
         await instance.delete()
         return instance
 
 
+    @deadline_bound
     async def delete_many(self, item_ids: list[Any]) -> list[ModelT]:
         """Delete multiple instances identified by list of IDs ``item_ids``.
 
@@ -281,11 +410,18 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         Returns:
             The deleted instances.
         """
+        if self.shard_spec is not None:
+            querysets = [queryset.filter(**{f"{self.id_attribute}__in": item_ids}) for queryset in self._shards()]
+            results = await asyncio.gather(*(self._fetch(queryset) for queryset in querysets))
+            await asyncio.gather(*(queryset.delete() for queryset in querysets))
+            return [instance for result in results for instance in result]
         instances: list[ModelT] = await self.model_type.query.filter(**{f"{self.id_attribute}__in": item_ids})
         await self.model_type.query.filter(**{f"{self.id_attribute}__in": item_ids}).delete()
         return instances
 
 
+    @deadline_bound
+    @observe_filters
     async def exists(self, *filters: Any, **kwargs: Any) -> bool:
         """Return true if the object specified by ``kwargs`` exists.
 
@@ -297,10 +433,17 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
             True if the instance was found.  False if not found.
 
         """
-        queryset = self._apply_filters(filters, apply_pagination=False, queryset=self.model_type.query)
+        if self.shard_spec is not None:
+            found = await asyncio.gather(*(
+                self._apply_filters(*filters, apply_pagination=False, queryset=queryset).exists(**kwargs)
+                for queryset in self._shards(*filters, **kwargs)
+            ))
+            return any(found)
+        queryset = self._apply_filters(*filters, apply_pagination=False, queryset=self.model_type.query.all())
         return await queryset.exists(**kwargs)
 
 
+    @deadline_bound
     async def get(self, item_id: Any, **kwargs: Any) -> ModelT:
         """Get instance identified by ``item_id``.
 
@@ -316,9 +459,12 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
             MultipleObjectsReturned: If multiple instances found identified by ``item_id``.
         """
         kwargs[self.id_attribute] = item_id
+        if self.shard_spec is not None:
+            return await self._get_sharded(**kwargs)
         return await self.model_type.query.get(**kwargs)
 
 
+    @deadline_bound
     async def get_one(self, **kwargs: Any) -> ModelT:
         """Get an instance specified by the ``kwargs`` filters if it exists.
 
@@ -332,9 +478,12 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
             ObjectNotFound: If no instance found identified by ``kwargs``.
             MultipleObjectsReturned: If multiple instances found identified by ``kwargs``.
         """
+        if self.shard_spec is not None:
+            return await self._get_sharded(**kwargs)
         return await self.model_type.query.get(**kwargs)
 
 
+    @deadline_bound
     async def get_or_create(self, **kwargs: Any) -> tuple[ModelT, bool]:
         """Get an instance specified by the ``kwargs`` filters if it exists or create it.
 
@@ -344,9 +493,16 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         Returns:
             A tuple that includes the retrieved or created instance, and a boolean on whether the record was created or not
         """
+        if self.shard_spec is not None:
+            defaults = kwargs.pop("defaults", None) or {}
+            instance = await self.get_one_or_none(**kwargs)
+            if instance is not None:
+                return instance, False
+            return await self.add(self.model_type(**kwargs, **defaults)), True
         return await self.model_type.query.get_or_create(**kwargs)
     
 
+    @deadline_bound
     async def get_one_or_none(self, **kwargs: Any) -> ModelT | None:
         """Get an instance if it exists or None.
 
@@ -356,9 +512,15 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         Returns:
             The retrieved instance or None.
         """
+        if self.shard_spec is not None:
+            results = await asyncio.gather(
+                *(self._fetch(queryset.filter(**kwargs).limit(1)) for queryset in self._shards(**kwargs))
+            )
+            return next((result[0] for result in results if result), None)
         return await self.model_type.query.filter(**kwargs).first()
 
 
+    @deadline_bound
     async def update_instance(self, instance: ModelT | UUID, **kwargs: Any) -> ModelT:
         """Update instance with the attribute values present on ``kwargs``.
 
@@ -369,8 +531,13 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         Returns:
             The updated instance.
         """
+        if self.shard_spec is not None and self.shard_spec.key in kwargs:
+            raise RepositoryError(f"The shard key of {self.model_type.__name__} can't be updated.")
         if isinstance(instance, UUID):
-            instance = await self.model_type.query.get(id=instance)
+            if self.shard_spec is not None:
+                instance = await self._get_sharded(id=instance)
+            else:
+                instance = await self.model_type.query.get(id=instance)
         
         for key, value in kwargs.items():
             setattr(instance, key, value)
@@ -379,6 +546,7 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         return instance
     
 
+    @deadline_bound
     async def update(self, **kwargs: Any) -> None:
         """Update instance with the attribute values present on ``kwargs``.
 
@@ -396,9 +564,17 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
             raise ValueError(f"Missing {self.id_attribute} in kwargs for update")
         
         pk = kwargs.pop(self.id_attribute)
+        if self.shard_spec is not None:
+            if self.shard_spec.key in kwargs:
+                raise RepositoryError(f"The shard key of {self.model_type.__name__} can't be updated.")
+            await asyncio.gather(
+                *(queryset.filter(**{self.id_attribute: pk}).update(**kwargs) for queryset in self._shards())
+            )
+            return None
         return await self.model_type.query.filter(**{self.id_attribute: pk}).update(**kwargs)
     
 
+    @deadline_bound
     async def update_many(self, data: list[ModelT]) -> None:
         """Update multiple instances with the attribute values present on instances in ``data``.
 
@@ -412,9 +588,11 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         Raises:
             ObjectNotFound: If no instance found with same identifier as ``data``.
         """
+        self._check_unsharded("update_many")
         return await self.model_type.query.bulk_update(data)
     
 
+    @deadline_bound
     async def upsert(self, **kwargs: Any) -> tuple[ModelT, bool]:
         """Update or create instance.
 
@@ -433,6 +611,7 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
             ObjectNotFound: If no instance found with same identifier as ``data``.
             DuplicatedRecordError: If an instance already exists with same identifier as ``data`` on <AbstractAsyncRepository.id_attribute>.
         """
+        self._check_unsharded("upsert")
         return await self.model_type.query.update_or_create(kwargs)
     
 
@@ -456,6 +635,8 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         raise NotImplementedError("Upsert many is not implemented")
 
 
+    @deadline_bound
+    @observe_filters
     async def list_and_count(self, *filters: FilterTypes, **kwargs: Any) -> tuple[list[ModelT], int]: # type: ignore
         """List records with total count.
 
@@ -466,10 +647,22 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         Returns:
             a tuple containing The list of instances, after filtering applied, and a count of records returned by query, ignoring pagination.
         """
+        if self.shard_spec is not None:
+            querysets = []
+            for queryset in self._shards(*filters, **kwargs):
+                queryset = self._apply_filters(*filters, apply_pagination=False, queryset=queryset).filter(**kwargs)
+                queryset._order_by = None
+                querysets.append(queryset)
+            results, counts = await asyncio.gather(
+                asyncio.gather(*(self._fetch(queryset) for queryset in querysets)),
+                asyncio.gather(*(queryset.count() for queryset in querysets)),
+            )
+            return [instance for result in results for instance in result], sum(counts)
+
         result_query = self._apply_filters(
-            filters,
+            *filters,
             apply_pagination=False,
-            queryset=self.model_type.query
+            queryset=self.model_type.query.all()
         ).filter(**kwargs)
         result_query._order_by = None
 
@@ -478,6 +671,8 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         return result, count
 
 
+    @deadline_bound
+    @observe_filters
     async def list(self, *filters: Any, **kwargs: Any) -> list[ModelT]:
         """Get a list of instances, optionally filtered.
 
@@ -488,10 +683,355 @@ class AsyncRepository(AbstractAsyncRepository[ModelT], FilterableRepository[Mode
         Returns:
             The list of instances, after filtering applied
         """
-        queryset = self._apply_filters(filters, apply_pagination=True, queryset=self.model_type.query)
+        if self.shard_spec is not None:
+            return await self._list_sharded(*filters, **kwargs)
+        queryset = self._apply_filters(*filters, apply_pagination=True, queryset=self.model_type.query.all())
         return await queryset.filter(**kwargs).all()
 
 
+    async def _list_sharded(self, *filters: Any, **kwargs: Any) -> list[ModelT]:
+        """Fan a list out to the shards, then merge and paginate the results.
+
+        Each shard returns its first ``offset + limit`` rows in order, so the
+        global page is the slice of their merge.
+        """
+        pagination = next((f for f in reversed(filters) if isinstance(f, LimitOffset)), None)
+        filters = tuple(f for f in filters if not isinstance(f, LimitOffset))
+        querysets = []
+        for queryset in self._shards(*filters, **kwargs):
+            queryset = self._apply_filters(*filters, apply_pagination=False, queryset=queryset).filter(**kwargs)
+            if pagination is not None:
+                queryset = queryset.limit(pagination.offset + pagination.limit)
+            querysets.append(queryset)
+
+        results = await asyncio.gather(*(self._fetch(queryset) for queryset in querysets))
+        instances = merge_ordered(results, [f for f in filters if isinstance(f, OrderBy)])
+        if pagination is not None:
+            return instances[pagination.offset:pagination.offset + pagination.limit]
+        return instances
+
+
+    @deadline_bound
+    @observe_filters
+    async def list_as(self, *filters: Any, schema_type: type[ModelDTOT] | None = None, **kwargs: Any) -> list[ModelDTOT]:
+        """Get a list of structs, optionally filtered, without building model instances.
+
+        Only the struct's fields are selected and driver rows are passed to the struct
+        positionally, so no validation is performed.
+
+        Args:
+            *filters: filters for specific filtering operations
+            schema_type: A ``msgspec.Struct`` whose fields are column names.
+                Defaults to a struct generated from the model columns.
+            **kwargs: Instance attribute value filters.
+
+        Returns:
+            The list of structs, after filtering applied
+        """
+        struct_type = self._get_struct_type(schema_type)
+        expression, database, _ = self._select_columns(
+            *filters, columns=struct_type.__struct_fields__, **kwargs
+        )
+        return [struct_type(*row) for row in await database.fetch_all(expression)]
+
+
+    @deadline_bound
+    async def get_as(self, item_id: Any, schema_type: type[ModelDTOT] | None = None, **kwargs: Any) -> ModelDTOT:
+        """Get the struct of the instance identified by ``item_id``, without building a model instance.
+
+        Args:
+            item_id: Identifier of the instance to be retrieved.
+            schema_type: A ``msgspec.Struct`` whose fields are column names.
+                Defaults to a struct generated from the model columns.
+            **kwargs: Additional attribute value filters.
+
+        Returns:
+            The retrieved struct.
+
+        Raises:
+            ObjectNotFound: If no instance found identified by ``item_id``.
+        """
+        struct_type = self._get_struct_type(schema_type)
+        kwargs[self.id_attribute] = item_id
+        expression, database, _ = self._select_columns(columns=struct_type.__struct_fields__, **kwargs)
+        row = await database.fetch_one(expression)
+        return struct_type(*self.check_not_found(row))
+
+
+    def _get_struct_type(self, schema_type: type[ModelDTOT] | None) -> type[ModelDTOT]:
+        if schema_type is None:
+            return get_row_struct(self.model_type)
+        if not issubclass(schema_type, Struct):
+            raise RepositoryError(f"{schema_type.__name__} must be a msgspec Struct.")
+        return schema_type
+
+
+    @deadline_bound
+    @observe_filters
+    async def aggregate(
+        self,
+        *filters: FilterTypes,
+        group_by: Sequence[str] | None = None,
+        metrics: dict[str, AggregateTypes] | None = None,
+        **kwargs: Any,
+    ) -> list[RowMapping]:
+        """Reduce records to aggregated rows with a single ``GROUP BY`` query.
+
+        Args:
+            *filters: Types for specific filtering operations.
+            group_by: Names of the model attributes to group on.
+            metrics: Result labels mapped to aggregates, e.g ``{"total": Sum("amount"), "n": Count()}``.
+            **kwargs: Instance attribute value filters.
+
+        Returns:
+            One row per group, keyed by the ``group_by`` field names and the ``metrics`` labels.
+
+        Raises:
+            RepositoryError: If nothing to aggregate is given or a field is unknown.
+        """
+        self._check_unsharded("aggregate")
+        group_by = group_by or []
+        metrics = metrics or {}
+        if not group_by and not metrics:
+            raise RepositoryError("aggregate requires at least one group_by field or metric.")
+
+        # ordering on a metric label can't be resolved against the model table
+        metric_order_by = [f for f in filters if isinstance(f, OrderBy) and f.field_name in metrics]
+        queryset = self._apply_filters(
+            *(f for f in filters if f not in metric_order_by),
+            queryset=self.model_type.query.all(),
+        ).filter(**kwargs)
+
+        table = queryset.table
+        try:
+            group_columns = [table.columns[field_name] for field_name in group_by]
+        except KeyError as exc:
+            raise RepositoryError(f"Unknown group_by field {exc}.") from exc
+        metric_columns = {label: metric.get_expression(table).label(label) for label, metric in metrics.items()}
+
+        expression = queryset._build_select().with_only_columns(*group_columns, *metric_columns.values())
+        if group_columns:
+            expression = expression.group_by(*group_columns)
+        for order_by in metric_order_by:
+            column = metric_columns[order_by.field_name]
+            expression = expression.order_by(column.desc() if order_by.sort_order == "desc" else column.asc())
+
+        rows = await queryset.database.fetch_all(expression)
+        return [row._mapping for row in rows]
+
+
+    async def export_arrow(
+        self,
+        destination: str | os.PathLike[str] | Any,
+        *filters: FilterTypes,
+        columns: Sequence[str] | None = None,
+        batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+        **kwargs: Any,
+    ) -> int:
+        """Write records to an Arrow IPC file, batch by batch, without building model instances.
+
+        Args:
+            destination: A file path or a writable binary file object.
+            *filters: Types for specific filtering operations.
+            columns: Names of the columns to export. Defaults to all the table columns.
+            batch_size: Number of rows fetched from the driver per record batch.
+            **kwargs: Instance attribute value filters.
+
+        Returns:
+            The number of exported rows.
+        """
+        require_pyarrow()
+        return await self._export_columnar(
+            pa.ipc.new_file, destination, *filters, columns=columns, batch_size=batch_size, **kwargs
+        )
+
+
+    async def export_parquet(
+        self,
+        destination: str | os.PathLike[str] | Any,
+        *filters: FilterTypes,
+        columns: Sequence[str] | None = None,
+        batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+        compression: str = "zstd",
+        **kwargs: Any,
+    ) -> int:
+        """Write records to a Parquet file, batch by batch, without building model instances.
+
+        Args:
+            destination: A file path or a writable binary file object.
+            *filters: Types for specific filtering operations.
+            columns: Names of the columns to export. Defaults to all the table columns.
+            batch_size: Number of rows fetched from the driver per record batch.
+            compression: Parquet compression codec.
+            **kwargs: Instance attribute value filters.
+
+        Returns:
+            The number of exported rows.
+        """
+        require_pyarrow()
+        return await self._export_columnar(
+            lambda sink, schema: pq.ParquetWriter(sink, schema, compression=compression),
+            destination, *filters, columns=columns, batch_size=batch_size, **kwargs
+        )
+
+
+    async def stream_arrow(
+        self,
+        *filters: FilterTypes,
+        columns: Sequence[str] | None = None,
+        batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+        **kwargs: Any,
+    ) -> AsyncIterator[bytes]:
+        """Encode records as an Arrow IPC stream, yielding bytes as each batch is written.
+
+        Suited to litestar's ``Stream`` response.
+
+        Args:
+            *filters: Types for specific filtering operations.
+            columns: Names of the columns to export. Defaults to all the table columns.
+            batch_size: Number of rows fetched from the driver per record batch.
+            **kwargs: Instance attribute value filters.
+        """
+        require_pyarrow()
+        sink = BytesSink()
+        async for _ in self._iter_columnar(
+            pa.ipc.new_stream, sink, *filters, columns=columns, batch_size=batch_size, **kwargs
+        ):
+            yield sink.drain()
+        yield sink.drain()
+
+
+    async def stream_parquet(
+        self,
+        *filters: FilterTypes,
+        columns: Sequence[str] | None = None,
+        batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+        compression: str = "zstd",
+        **kwargs: Any,
+    ) -> AsyncIterator[bytes]:
+        """Encode records as Parquet, yielding bytes as each batch is written.
+
+        Suited to litestar's ``Stream`` response.
+
+        Args:
+            *filters: Types for specific filtering operations.
+            columns: Names of the columns to export. Defaults to all the table columns.
+            batch_size: Number of rows fetched from the driver per record batch.
+            compression: Parquet compression codec.
+            **kwargs: Instance attribute value filters.
+        """
+        require_pyarrow()
+        sink = BytesSink()
+        async for _ in self._iter_columnar(
+            lambda sink, schema: pq.ParquetWriter(sink, schema, compression=compression),
+            sink, *filters, columns=columns, batch_size=batch_size, **kwargs
+        ):
+            yield sink.drain()
+        yield sink.drain()
+
+
+    async def _export_columnar(
+        self,
+        open_writer: Callable[[Any, pa.Schema], Any],
+        destination: str | os.PathLike[str] | Any,
+        *filters: FilterTypes,
+        **kwargs: Any,
+    ) -> int:
+        if isinstance(destination, os.PathLike):
+            destination = os.fspath(destination)
+        total = 0
+        async for count in self._iter_columnar(open_writer, destination, *filters, **kwargs):
+            total += count
+        return total
+
+
+    async def _iter_columnar(
+        self,
+        open_writer: Callable[[Any, pa.Schema], Any],
+        sink: Any,
+        *filters: FilterTypes,
+        columns: Sequence[str] | None = None,
+        batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+        **kwargs: Any,
+    ) -> AsyncIterator[int]:
+        """Stream driver row batches into ``open_writer(sink, schema)``, yielding the rows written per batch."""
+        expression, database, selected = self._select_columns(*filters, columns=columns, **kwargs)
+        builder = ArrowBatchBuilder(selected)
+        loop = asyncio.get_running_loop()
+
+        writer = open_writer(sink, builder.schema)
+        try:
+            async for rows in database.batched_iterate(expression, batch_size=batch_size):
+                await loop.run_in_executor(None, writer.write_batch, builder.build(rows))
+                yield len(rows)
+        finally:
+            writer.close()
+
+
+    async def backfill(
+        self,
+        name: str,
+        update: BackfillUpdate,
+        *filters: FilterTypes,
+        batch_size: int = DEFAULT_BACKFILL_BATCH_SIZE,
+        rows_per_second: float | None = None,
+        max_replication_lag: float | None = None,
+        restart: bool = False,
+        on_progress: Callable[[BackfillReport], Any] | None = None,
+        **kwargs: Any,
+    ) -> BackfillReport:
+        """Apply ``update`` to the matching records in primary key ordered chunks.
+
+        Each chunk is committed with its checkpoint, so a run interrupted for any
+        reason resumes after the last committed chunk when called again with the
+        same ``name``.
+
+        Args:
+            name: Unique name of the backfill.
+            update: Raw SQL using ``:keys``, column values or a callable receiving the chunk rows.
+            *filters: Types for specific filtering operations.
+            batch_size: Number of rows per chunk.
+            rows_per_second: Target write rate, chunks are spaced out to stay under it.
+            max_replication_lag: Replica lag, in seconds, to wait out between chunks (PostgreSQL).
+            restart: Discard the checkpoint and start over.
+            on_progress: Called with the report after each chunk.
+            **kwargs: Instance attribute value filters.
+
+        Returns:
+            The backfill report.
+        """
+        columns = None if callable(update) else [self.id_attribute]
+        statement, database, _ = self._select_columns(*filters, columns=columns, **kwargs)
+        backfill = Backfill(
+            name,
+            database,
+            statement,
+            key=statement.selected_columns[self.id_attribute],
+            update=update,
+            batch_size=batch_size,
+            throttle=BackfillThrottle(rows_per_second=rows_per_second, max_replication_lag=max_replication_lag),
+            on_progress=on_progress,
+        )
+        return await backfill.run(restart=restart)
+
+
+    def _select_columns(
+        self,
+        *filters: FilterTypes,
+        columns: Sequence[str] | None = None,
+        **kwargs: Any,
+    ) -> tuple[Select[Any], Database, list[Column[Any]]]:
+        """Build a select of raw table columns, bypassing model construction."""
+        self._check_unsharded("Column selects")
+        queryset = self._apply_filters(*filters, queryset=self.model_type.query.all()).filter(**kwargs)
+        table = queryset.table
+        try:
+            selected = [table.columns[name] for name in columns] if columns else list(table.columns)
+        except KeyError as exc:
+            raise RepositoryError(f"Unknown column {exc}.") from exc
+        return queryset._build_select().with_only_columns(*selected), queryset.database, selected
+
+
     @staticmethod
     def check_not_found(item_or_none: ModelT | None) -> T:
         """Raise :class:`NotFoundError` if ``item_or_none`` is ``None``.
@@ -0,0 +1,191 @@
+"""Per-model retention policies.
+
+A model declares how long its rows are kept in its ``Meta``::
+
+    class AuditLog(AuditMixin):
+        ...
+
+        class Meta:
+            registry = registry
+            retention = {"field": "created_at", "keep": timedelta(days=90)}
+
+Expired rows are deleted, or first copied to ``archive``, by
+:func:`purge_expired` in small batches walked through the ``field`` index,
+exposed as ``fimbu db purge`` and as the ``retention_purge`` SAQ task.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Iterable
+
+from sqlalchemy import and_, delete, insert, select, tuple_
+
+from fimbu.core.exceptions import ImproperlyConfigured
+
+if TYPE_CHECKING:
+    from sqlalchemy import ColumnElement, Table
+    from fimbu.core.types import ModelT
+
+
+__all__ = (
+    "RetentionPolicy",
+    "RetentionReport",
+    "apply_retention",
+    "get_retention_policy",
+    "purge_expired",
+)
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Retention options read from ``Meta.retention``."""
+
+    field: str
+    """Name of the datetime attribute rows expire on."""
+    keep: datetime.timedelta
+    """How long rows are kept."""
+    filter: tuple[tuple[str, Any], ...] = ()
+    """Extra equality conditions, e.g. ``{"deleted": True}`` to only purge soft deleted rows."""
+    archive: Any = None
+    """Model or table receiving a copy of the rows before they are deleted."""
+    batch_size: int = 1_000
+    """Rows deleted per batch."""
+    pause: float = 0.1
+    """Seconds to sleep between batches."""
+
+
+@dataclass
+class RetentionReport:
+    """Outcome of a purge run for one model."""
+
+    table: str
+    """Name of the purged table."""
+    rows: int = 0
+    """Rows removed."""
+    batches: int = 0
+    """Batches committed."""
+    seconds: float = 0.0
+    """Wall time of the run."""
+    archived: bool = False
+    """Whether rows were copied to the archive first."""
+
+
+@lru_cache(maxsize=None)
+def get_retention_policy(model: type[ModelT]) -> RetentionPolicy | None:
+    """Read the retention policy declared on ``model.Meta``.
+
+    Args:
+        model: The model class.
+
+    Returns:
+        The retention policy, or ``None`` if the model has none.
+
+    Raises:
+        ImproperlyConfigured: If the policy is invalid.
+    """
+    options = getattr(getattr(model, "Meta", None), "retention", None)
+    if options is None or isinstance(options, RetentionPolicy):
+        return options
+
+    try:
+        policy = RetentionPolicy(
+            field=options["field"],
+            keep=options["keep"],
+            filter=tuple(options.get("filter", {}).items()),
+            archive=options.get("archive"),
+            batch_size=options.get("batch_size", 1_000),
+            pause=options.get("pause", 0.1),
+        )
+    except (KeyError, TypeError, AttributeError) as exc:
+        raise ImproperlyConfigured(f"Invalid {model.__name__}.Meta.retention: {exc}") from exc
+
+    model_field = model.meta.fields.get(policy.field)
+    if model_field is None or not issubclass(model_field.field_type, datetime.datetime):
+        raise ImproperlyConfigured(
+            f"{model.__name__}.Meta.retention field must name a datetime field, got '{policy.field}'."
+        )
+    if not isinstance(policy.keep, datetime.timedelta) or policy.batch_size < 1:
+        raise ImproperlyConfigured(f"Invalid {model.__name__}.Meta.retention keep/batch_size.")
+    return policy
+
+
+def _archive_table(policy: RetentionPolicy) -> Table | None:
+    archive = policy.archive
+    return getattr(archive, "table", archive)
+
+
+def _where(table: Table, policy: RetentionPolicy, cutoff: datetime.datetime) -> ColumnElement[bool]:
+    column = table.columns[policy.field]
+    if getattr(column.type, "timezone", False):
+        cutoff = cutoff.replace(tzinfo=datetime.timezone.utc)
+    return and_(column < cutoff, *(table.columns[name] == value for name, value in policy.filter))
+
+
+async def purge_expired(model: type[ModelT], now: datetime.datetime | None = None) -> RetentionReport:
+    """Delete, or archive then delete, the rows of ``model`` past their retention.
+
+    Args:
+        model: A model with a retention policy.
+        now: Reference time, defaults to the current UTC time.
+
+    Returns:
+        The purge report.
+    """
+    started = time.monotonic()
+    policy = get_retention_policy(model)
+    table = model.table
+    database = model.database
+    archive = _archive_table(policy)
+
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    if now.tzinfo is not None:
+        now = now.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    where = _where(table, policy, now - policy.keep)
+
+    key_columns = [table.columns[name] for name in model.pkcolumns]
+    key = key_columns[0] if len(key_columns) == 1 else tuple_(*key_columns)
+    batch = select(*key_columns).where(where).order_by(table.columns[policy.field]).limit(policy.batch_size)
+
+    report = RetentionReport(table=table.name, archived=archive is not None)
+    while True:
+        rows = await database.fetch_all(batch)
+        if not rows:
+            break
+
+        keys = [row[0] for row in rows] if len(key_columns) == 1 else [tuple(row) for row in rows]
+        async with database.transaction():
+            if archive is not None:
+                columns = [column for column in table.columns if column.name in archive.columns]
+                await database.execute(
+                    insert(archive).from_select(
+                        [column.name for column in columns],
+                        select(*columns).where(key.in_(keys)),
+                    )
+                )
+            await database.execute(delete(table).where(key.in_(keys)))
+
+        report.rows += len(rows)
+        report.batches += 1
+        if len(rows) < policy.batch_size:
+            break
+        await asyncio.sleep(policy.pause)
+
+    report.seconds = time.monotonic() - started
+    return report
+
+
+async def apply_retention(models: Iterable[type[ModelT]], now: datetime.datetime | None = None) -> list[RetentionReport]:
+    """Run :func:`purge_expired` for every model of ``models`` with a retention policy.
+
+    Args:
+        models: Candidate models, the ones without a policy are skipped.
+        now: Reference time, defaults to the current UTC time.
+
+    Returns:
+        One report per purged model.
+    """
+    return [await purge_expired(model, now) for model in models if get_retention_policy(model) is not None]
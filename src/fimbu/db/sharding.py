@@ -0,0 +1,233 @@
+"""Hash sharded models.
+
+A model spreads its rows over several databases of the ``DatabaseRegistry``
+by declaring a shard key in its ``Meta``::
+
+    class Event(Model):
+        ...
+
+        class Meta:
+            registry = registry
+            shard_key = "tenant_id"
+            shards = ("events_0", "events_1", "events_2")
+
+Rows are placed with consistent hashing, so adding or removing a shard only
+moves the keys of the neighbouring ring segments. ``AsyncRepository`` routes
+operations carrying the shard key to a single database and fans the others
+out to every shard. After changing ``Meta.shards`` run ``fimbu db rebalance``
+to move the rows to their new shard; reads naming the shard key may miss rows
+that have not been moved yet.
+"""
+from __future__ import annotations
+
+import bisect
+import functools
+import hashlib
+import heapq
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Iterable, Sequence
+
+from sqlalchemy import delete, insert, select
+
+from fimbu.core.exceptions import ImproperlyConfigured
+from fimbu.db.exceptions import RepositoryError
+from fimbu.db.filters import CollectionFilter, OrderBy
+from fimbu.db.utils import get_db_registry
+from fimbu.utils import encode_json
+
+if TYPE_CHECKING:
+    from edgy import Database
+    from fimbu.core.types import ModelT
+
+
+__all__ = (
+    "RebalanceReport",
+    "ShardSpec",
+    "get_shard_database",
+    "get_shard_spec",
+    "merge_ordered",
+    "rebalance",
+    "route_shards",
+)
+
+
+def _hash(value: Any) -> int:
+    return int.from_bytes(hashlib.md5(encode_json(value).encode()).digest()[:8], "big")
+
+
+@dataclass(frozen=True)
+class ShardSpec:
+    """Sharding options read from a model ``Meta``."""
+
+    key: str
+    """Name of the attribute rows are distributed on, ``Meta.shard_key``."""
+    shards: tuple[str, ...]
+    """Names of the ``DatabaseRegistry`` databases, ``Meta.shards``."""
+    replicas: int = 64
+    """Points per shard on the hash ring, ``Meta.shard_replicas``."""
+    _ring: tuple[tuple[int, str], ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        ring = sorted((_hash(f"{shard}:{point}"), shard) for shard in self.shards for point in range(self.replicas))
+        object.__setattr__(self, "_ring", tuple(ring))
+
+    def shard_for(self, value: Any) -> str:
+        """Return the name of the shard holding the rows whose key is ``value``."""
+        index = bisect.bisect(self._ring, (_hash(value), ""))
+        return self._ring[index % len(self._ring)][1]
+
+
+@lru_cache(maxsize=None)
+def get_shard_spec(model: type[ModelT]) -> ShardSpec | None:
+    """Read the sharding options declared on ``model.Meta``.
+
+    Args:
+        model: The model class.
+
+    Returns:
+        The shard spec, or ``None`` if the model is not sharded.
+
+    Raises:
+        ImproperlyConfigured: If the options are invalid.
+    """
+    meta = getattr(model, "Meta", None)
+    key = getattr(meta, "shard_key", None)
+    if key is None:
+        return None
+
+    shards = tuple(getattr(meta, "shards", ()))
+    if key not in model.meta.fields:
+        raise ImproperlyConfigured(f"{model.__name__}.Meta.shard_key must name a field, got '{key}'.")
+    if not shards or len(set(shards)) != len(shards):
+        raise ImproperlyConfigured(f"{model.__name__}.Meta.shards must list distinct database names.")
+    return ShardSpec(key=key, shards=shards, replicas=getattr(meta, "shard_replicas", 64))
+
+
+def get_shard_database(name: str) -> Database:
+    """Get a shard database from the ``DatabaseRegistry``."""
+    return get_db_registry()[name]
+
+
+def route_shards(spec: ShardSpec, filters: Sequence[Any], kwargs: dict[str, Any]) -> list[str]:
+    """Return the shards a query can match, in ``spec.shards`` order.
+
+    Equality and ``__in`` lookups and ``CollectionFilter`` on the shard key
+    narrow the query down, anything else goes to every shard.
+    """
+    for lookup in (spec.key, f"{spec.key}__exact"):
+        if lookup in kwargs:
+            return [spec.shard_for(kwargs[lookup])]
+
+    values = kwargs.get(f"{spec.key}__in")
+    if values is None:
+        values = next(
+            (f.values for f in filters if isinstance(f, CollectionFilter) and f.field_name == spec.key and f.values is not None),
+            None,
+        )
+    if values is not None:
+        targets = {spec.shard_for(value) for value in values}
+        return [shard for shard in spec.shards if shard in targets]
+    return list(spec.shards)
+
+
+def _compare(order_by: Sequence[OrderBy], left: Any, right: Any) -> int:
+    for filter_ in order_by:
+        a, b = getattr(left, filter_.field_name), getattr(right, filter_.field_name)
+        if a == b:
+            continue
+        # PostgreSQL puts NULL last in ascending order
+        if a is None or b is None:
+            result = 1 if a is None else -1
+        else:
+            result = -1 if a < b else 1
+        return -result if filter_.sort_order == "desc" else result
+    return 0
+
+
+def merge_ordered(results: Iterable[list[ModelT]], order_by: Sequence[OrderBy]) -> list[ModelT]:
+    """Merge per shard results, each already sorted by ``order_by``."""
+    if not order_by:
+        return [instance for result in results for instance in result]
+    return list(heapq.merge(*results, key=functools.cmp_to_key(functools.partial(_compare, order_by))))
+
+
+@dataclass
+class RebalanceReport:
+    """Outcome of a rebalance run for one model."""
+
+    table: str
+    """Name of the sharded table."""
+    scanned: int = 0
+    """Rows read from every source shard."""
+    moved: dict[str, int] = field(default_factory=dict)
+    """Rows moved, keyed by ``source->target``."""
+
+
+async def rebalance(
+    model: type[ModelT],
+    sources: Iterable[str] | None = None,
+    batch_size: int = 1_000,
+    dry_run: bool = False,
+) -> RebalanceReport:
+    """Move rows to the shard their key hashes to.
+
+    Rows are copied to their target shard, replacing any copy left by an
+    interrupted run, then deleted from the source, one batch at a time, so a
+    run can be stopped and restarted.
+
+    Args:
+        model: A sharded model.
+        sources: Shards to walk, defaults to ``Meta.shards``. Include removed shards to drain them.
+        batch_size: Rows read per batch.
+        dry_run: Only count the rows that would move.
+
+    Returns:
+        The rebalance report.
+    """
+    spec = get_shard_spec(model)
+    if spec is None:
+        raise RepositoryError(f"{model.__name__} is not sharded.")
+    if len(model.pkcolumns) != 1:
+        raise RepositoryError(f"{model.__name__} needs a single column primary key to be rebalanced.")
+
+    table = model.table
+    pk = table.columns[model.pkcolumns[0]]
+    key_column = table.columns[spec.key]
+    report = RebalanceReport(table=table.name)
+
+    for source in dict.fromkeys(sources or spec.shards):
+        database = get_shard_database(source)
+        last_key = None
+        while True:
+            statement = select(table).order_by(pk).limit(batch_size)
+            if last_key is not None:
+                statement = statement.where(pk > last_key)
+            rows = [dict(row._mapping) for row in await database.fetch_all(statement)]
+            if not rows:
+                break
+            report.scanned += len(rows)
+            last_key = rows[-1][pk.name]
+
+            moving: dict[str, list[dict[str, Any]]] = {}
+            for row in rows:
+                target = spec.shard_for(row[key_column.name])
+                if target != source:
+                    moving.setdefault(target, []).append(row)
+
+            for target, target_rows in moving.items():
+                label = f"{source}->{target}"
+                report.moved[label] = report.moved.get(label, 0) + len(target_rows)
+                if dry_run:
+                    continue
+                keys = [row[pk.name] for row in target_rows]
+                target_database = get_shard_database(target)
+                async with target_database.transaction():
+                    await target_database.execute(delete(table).where(pk.in_(keys)))
+                    await target_database.execute(insert(table).values(target_rows))
+                async with database.transaction():
+                    await database.execute(delete(table).where(pk.in_(keys)))
+
+            if len(rows) < batch_size:
+                break
+    return report
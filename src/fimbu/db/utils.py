@@ -5,6 +5,7 @@ from functools import lru_cache
 from urllib.parse import urlencode
 from copy import copy
 from fimbu.conf import settings
+from fimbu.utils import decode_json, encode_json
 from sqlalchemy.orm import InstrumentedAttribute
 from fimbu.core.exceptions import ImproperlyConfigured
 from fimbu.db import Database, Registry
@@ -51,7 +52,32 @@ def get_database(db_settings: dict) -> tuple[str, Database] | None:
         
     except KeyError as exc:
         raise ImproperlyConfigured(f"Invalid database settings {exc}") from exc
-    return db_settings['database'], Database(db_url)
+    return db_settings['database'], Database(db_url, **get_engine_options(backend))
+
+
+def get_engine_options(backend: str) -> dict[str, Any]:
+    """
+    Engine options for a database backend
+
+    On PostgreSQL the asyncpg dialect registers binary ``json``/``jsonb`` codecs
+    on each connection, they go through the engine serializers which are swapped
+    for the msgspec ones here. ``DB_STATEMENT_TIMEOUT`` becomes the connections'
+    ``statement_timeout``, the ceiling below per-request deadlines.
+
+    Args:
+        backend (str): Database engine, e.g. ``postgresql+asyncpg``
+
+    Returns:
+        dict[str, Any]: Keyword arguments for ``Database``
+    """
+    if not backend.startswith("postgres"):
+        return {}
+
+    options: dict[str, Any] = {"json_serializer": encode_json, "json_deserializer": decode_json}
+    statement_timeout = getattr(settings, "DB_STATEMENT_TIMEOUT", None)
+    if statement_timeout and "asyncpg" in backend:
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(int(statement_timeout * 1000))}}
+    return options
 
 
 @lru_cache
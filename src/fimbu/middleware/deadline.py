@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import anyio
+from litestar.enums import ScopeType
+from litestar.middleware.base import AbstractMiddleware
+from litestar.types import Message, Receive, Scope, Send
+
+from fimbu.conf import settings
+from fimbu.db.deadline import deadline
+from fimbu.db.exceptions import DeadlineExceeded
+
+
+__all__ = ["DeadlineMiddleware"]
+
+
+class DeadlineMiddleware(AbstractMiddleware):
+    """Bound each request by a deadline.
+
+    The deadline is read from the ``deadline`` route ``opt``, falling back to
+    ``settings.REQUEST_DEADLINE``. Clients may shorten it, or set one up to
+    ``settings.REQUEST_DEADLINE_MAX``, with the ``settings.REQUEST_DEADLINE_HEADER``
+    header, in seconds. Repository calls made by the request inherit it and
+    the whole request is cancelled with a 504 once it passes.
+    """
+
+    scopes = {ScopeType.HTTP}
+    exclude_opt_key = "exclude_deadline"
+
+    def get_deadline(self, scope: Scope) -> float | None:
+        """Return the deadline of a request, in seconds."""
+        route_handler = scope.get("route_handler")
+        seconds = route_handler.opt.get("deadline") if route_handler is not None else None
+        if seconds is None:
+            seconds = getattr(settings, "REQUEST_DEADLINE", None)
+
+        header_name = getattr(settings, "REQUEST_DEADLINE_HEADER", None)
+        if not header_name:
+            return seconds
+
+        header = header_name.lower().encode("latin-1")
+        value = next((v for k, v in scope.get("headers", ()) if k == header), None)
+        try:
+            requested = float(value) if value is not None else None
+        except ValueError:
+            requested = None
+        if requested is None or requested <= 0:
+            return seconds
+
+        requested = min(requested, getattr(settings, "REQUEST_DEADLINE_MAX", requested))
+        return requested if seconds is None else min(seconds, requested)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        seconds = self.get_deadline(scope)
+        if seconds is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            with deadline(seconds), anyio.fail_after(seconds):
+                await self.app(scope, receive, send_wrapper)
+        except TimeoutError as exc:
+            if started:
+                raise
+            raise DeadlineExceeded(f"Request deadline of {seconds}s exceeded.") from exc
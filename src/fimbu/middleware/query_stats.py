@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from litestar.datastructures import MutableScopeHeaders
+from litestar.enums import ScopeType
+from litestar.middleware.base import AbstractMiddleware
+from litestar.types import Message, Receive, Scope, Send
+from structlog.contextvars import bind_contextvars
+
+from fimbu.db.instrumentation import track_queries
+
+
+__all__ = ["QueryStatsMiddleware"]
+
+
+class QueryStatsMiddleware(AbstractMiddleware):
+    """Account the SQL statements of each request.
+
+    The query count and database time are bound to the structlog context as
+    ``db_queries`` and ``db_time_ms``, so the request log line carries them,
+    and sent to the client in a ``Server-Timing: db`` header. Repeated
+    statements are reported as possible N+1 patterns.
+    """
+
+    scopes = {ScopeType.HTTP}
+    exclude_opt_key = "exclude_query_stats"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        with track_queries(label=scope["path"]) as stats:
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    bind_contextvars(db_queries=stats.count, db_time_ms=round(stats.total_ms, 2))
+                    headers = MutableScopeHeaders.from_message(message)
+                    headers.add(
+                        "server-timing",
+                        f'db;dur={stats.total_ms:.2f};desc="{stats.count} queries"',
+                    )
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
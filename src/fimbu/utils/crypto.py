@@ -2,20 +2,196 @@
 Oya's crypto functions and utilities.
 """
 from __future__ import annotations
-from typing import Sequence, cast
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Sequence, cast
 import hashlib
 import hmac
+import multiprocessing
+import os
 import secrets
 import base64
 import asyncio
 
 from fimbu.conf import settings
+from fimbu.core.exceptions import Saturated
 from fimbu.utils.encoding import force_bytes
 from passlib.context import CryptContext
+from structlog import get_logger
 
 
 
-__all__ = ["PasswordManager"]
+__all__ = ["HasherStats", "PasswordHasher", "PasswordManager", "get_password_hasher"]
+
+
+logger = get_logger()
+
+
+@lru_cache
+def _crypt_context(hash_schemes: tuple[str, ...]) -> CryptContext:
+    return CryptContext(schemes=list(hash_schemes), deprecated="auto")
+
+
+def _warm_up(hash_schemes: tuple[str, ...]) -> None:
+    _crypt_context(hash_schemes)
+
+
+def _hash(hash_schemes: tuple[str, ...], password: str | bytes) -> str:
+    return _crypt_context(hash_schemes).hash(password)
+
+
+def _verify_and_update(
+    hash_schemes: tuple[str, ...], password: str | bytes, password_hash: str | None
+) -> tuple[bool, str | None]:
+    return cast("tuple[bool, str | None]", _crypt_context(hash_schemes).verify_and_update(password, password_hash))
+
+
+@dataclass
+class HasherStats:
+    """Load of a :class:`PasswordHasher`."""
+
+    workers: int
+    """Size of the pool."""
+    running: int
+    """Jobs being hashed."""
+    queued: int
+    """Jobs waiting for a worker."""
+    capacity: int
+    """Jobs accepted at once, running and queued."""
+    completed: int
+    """Jobs done since start."""
+    rejected: int
+    """Jobs refused since start, the pool being saturated."""
+
+
+class PasswordHasher:
+    """Hash and verify passwords in a bounded process pool.
+
+    Password hashes are slow by design, a few of them on the event loop stall
+    every other request of the worker. Jobs run in a pool of ``processes``
+    workers, at most ``max_queue`` wait for one of them and the next are
+    refused at once with :class:`Saturated`, answered with a ``429``, rather
+    than piling up until the client times out.
+    """
+
+    def __init__(
+        self,
+        hash_schemes: Sequence[str],
+        processes: int | None = None,
+        max_queue: int | None = None,
+    ) -> None:
+        """Construct a PasswordHasher.
+
+        Args:
+            hash_schemes: The encryption schemes to use.
+            processes: Size of the pool, defaults to the number of cores. ``0`` hashes in threads instead.
+            max_queue: Jobs waiting for a worker before new ones are refused, defaults to 4 per worker.
+        """
+        self.hash_schemes = tuple(hash_schemes)
+        self.use_processes = processes != 0
+        self.workers = processes or os.cpu_count() or 1
+        self.max_queue = self.workers * 4 if max_queue is None else max_queue
+        self._executor: Executor | None = None
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                # spawned workers, a forked event loop or connection pool is unusable
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fimbu-hasher")
+        return self._executor
+
+    def stats(self) -> HasherStats:
+        """Return the current load of the pool."""
+        return HasherStats(
+            workers=self.workers,
+            running=min(self._in_flight, self.workers),
+            queued=max(self._in_flight - self.workers, 0),
+            capacity=self.capacity,
+            completed=self._completed,
+            rejected=self._rejected,
+        )
+
+    async def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._in_flight >= self.capacity:
+            self._rejected += 1
+            logger.warning("Password hasher saturated, job refused.", **vars(self.stats()))
+            raise Saturated("Too many concurrent password checks, retry shortly.", retry_after=1)
+
+        loop = asyncio.get_running_loop()
+
+        def release(_: Future[Any]) -> None:
+            # the job holds its slot until it leaves the pool, even if its caller was cancelled
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._release)
+
+        self._in_flight += 1
+        try:
+            future = self.executor.submit(fn, self.hash_schemes, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._completed += 1
+
+    async def hash(self, password: str | bytes) -> str:
+        """Hash a password.
+
+        Raises:
+            Saturated: If the pool has no capacity left.
+        """
+        return cast(str, await self._submit(_hash, password))
+
+    async def verify_and_update(self, password: str | bytes, password_hash: str | None) -> tuple[bool, str | None]:
+        """Verify a password and rehash it if the hash is deprecated.
+
+        A ``None`` hash runs a dummy verification, so unknown users take as long as known ones.
+
+        Raises:
+            Saturated: If the pool has no capacity left.
+        """
+        return cast("tuple[bool, str | None]", await self._submit(_verify_and_update, password, password_hash))
+
+    async def start(self) -> None:
+        """Start the workers, so the first logins do not pay for it."""
+        executor = self.executor
+        await asyncio.gather(
+            *(asyncio.wrap_future(executor.submit(_warm_up, self.hash_schemes)) for _ in range(self.workers))
+        )
+
+    async def shutdown(self) -> None:
+        """Stop the workers once the running jobs are done, queued jobs are cancelled."""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: executor.shutdown(wait=True, cancel_futures=True)
+            )
+
+
+@lru_cache
+def get_password_hasher(hash_schemes: tuple[str, ...] = ("argon2",)) -> PasswordHasher:
+    """Get the hasher of ``hash_schemes`` sized by the settings, one pool per process and schemes."""
+    return PasswordHasher(
+        hash_schemes,
+        processes=getattr(settings, "PASSWORD_HASHER_PROCESSES", None),
+        max_queue=getattr(settings, "PASSWORD_HASHER_MAX_QUEUE", None),
+    )
 
 
 class PasswordManager:
@@ -30,6 +206,7 @@ class PasswordManager:
         if hash_schemes is None:
             hash_schemes = ["argon2"]
         self.context = CryptContext(schemes=hash_schemes, deprecated="auto")
+        self.hasher = get_password_hasher(tuple(hash_schemes))
 
     
     @staticmethod
@@ -54,8 +231,10 @@ class PasswordManager:
             password: Plain password
         Returns:
             str: Hashed password
+        Raises:
+            Saturated: If the password hasher has no capacity left.
         """
-        return await asyncio.get_running_loop().run_in_executor(None, self.context.hash, password)
+        return await self.hasher.hash(password)
 
 
     async def verify_password(self, plain_password: str | bytes, hashed_password: str) -> bool:
@@ -67,19 +246,18 @@ class PasswordManager:
 
         Returns:
             bool: True if password matches hash.
+        Raises:
+            Saturated: If the password hasher has no capacity left.
         """
-        valid, _ = await asyncio.get_running_loop().run_in_executor(
-            None,
-            self.context.verify_and_update,
-            plain_password,
-            hashed_password,
-        )
+        valid, _ = await self.hasher.verify_and_update(plain_password, hashed_password)
         return bool(valid)
 
 
     def verify_and_update(self, password: str, password_hash: str | None) -> tuple[bool, str | None]:
         """Verify a password and rehash it if the hash is deprecated.
 
+        Blocks the caller, use :meth:`averify_and_update` on the event loop.
+
         Args:
             password: The password to verify.
             password_hash: The hash to verify against.
@@ -87,6 +265,18 @@ class PasswordManager:
         return cast("tuple[bool, str | None]", self.context.verify_and_update(password, password_hash))
 
 
+    async def averify_and_update(self, password: str, password_hash: str | None) -> tuple[bool, str | None]:
+        """Verify a password and rehash it if the hash is deprecated, in the password hasher pool.
+
+        Args:
+            password: The password to verify.
+            password_hash: The hash to verify against.
+        Raises:
+            Saturated: If the password hasher has no capacity left.
+        """
+        return await self.hasher.verify_and_update(password, password_hash)
+
+
 
 class InvalidAlgorithm(ValueError):
     """Algorithm is not supported by hashlib."""
@@ -104,8 +294,14 @@ def salted_hmac(key_salt, value, secret=None, *, algorithm="sha1"):
     if secret is None:
         secret = settings.SECRET_KEY
 
-    key_salt = force_bytes(key_salt)
-    secret = force_bytes(secret)
+    mac = _keyed_hmac(force_bytes(key_salt), force_bytes(secret), algorithm).copy()
+    mac.update(force_bytes(value))
+    return mac
+
+
+@lru_cache(maxsize=256)
+def _keyed_hmac(key_salt: bytes, secret: bytes, algorithm: str) -> hmac.HMAC:
+    """HMAC keyed for a salt and secret, copied for each message rather than derived again."""
     try:
         hasher = getattr(hashlib, algorithm)
     except AttributeError as e:
@@ -119,7 +315,7 @@ def salted_hmac(key_salt, value, secret=None, *, algorithm="sha1"):
     # line is redundant and could be replaced by key = key_salt + secret, since
     # the hmac module does the same thing for keys longer than the block size.
     # However, we need to ensure that we *always* do this.
-    return hmac.new(key, msg=force_bytes(value), digestmod=hasher)
+    return hmac.new(key, digestmod=hasher)
 
 
 RANDOM_STRING_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"